@@ -0,0 +1,128 @@
+"""
+Content-addressed cache for ElevenLabs audio
+Stores each synthesized MP3 under a hash of its text, voice, model and voice
+settings, so re-renders and repeated segments don't pay for the same
+characters twice
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def cache_key(text, voice_id, model_id, voice_settings):
+    """Hash identifying one synthesis request"""
+    payload = json.dumps({
+        'text': text,
+        'voice_id': voice_id,
+        'model_id': model_id,
+        'voice_settings': voice_settings,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AudioCache:
+    """Size-bounded, least-recently-used on-disk MP3 cache"""
+
+    def __init__(self, directory, max_bytes=500 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._size = 0
+        self._load()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.mp3")
+
+    def _load(self):
+        """Index the existing cache, oldest access first"""
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.mp3'):
+                    continue
+                stat = os.stat(os.path.join(root, name))
+                found.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._size += size
+
+    def get(self, key, filename):
+        """Copy a cached clip to filename; returns True on a hit"""
+        path = self._path(key)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return False
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.bytes_saved += self._entries[key]
+
+        try:
+            shutil.copyfile(path, filename)
+            os.utime(path)
+            return True
+        except OSError:
+            # Removed behind our back; treat as a miss
+            with self._lock:
+                self.hits -= 1
+                self.misses += 1
+                self._size -= self._entries.pop(key, 0)
+            return False
+
+    def put(self, key, filename):
+        """Atomically store a copy of filename under key, evicting old clips"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out, open(filename, 'rb') as src:
+                shutil.copyfileobj(src, out)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        size = os.path.getsize(path)
+        with self._lock:
+            self._size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used clips until the cache fits (lock held)"""
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        """Counters for this process plus the cache's current footprint"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'bytes_saved': self.bytes_saved,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'size_bytes': self._size,
+            }
@@ -0,0 +1,144 @@
+"""
+Episode mixing for Youth Lens Today
+Builds one ffmpeg filter graph that joins any number of parts with silence
+between them, lays intro/outro music under the voices with ducking, and
+normalizes loudness to EBU R128, in a single decode and encode. Parts are fed
+to ffmpeg over pipes.
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+from mp3_tools import mp3_duration
+
+SAMPLE_RATE = 44100
+FORMAT = f"aresample={SAMPLE_RATE},aformat=sample_fmts=fltp:channel_layouts=stereo"
+
+# Podcast loudness targets (LUFS, dBTP, LU)
+LOUDNESS = -16.0
+TRUE_PEAK = -1.5
+LOUDNESS_RANGE = 11.0
+
+# Ducking: music drops by about ratio while the voice is above threshold
+DUCK = "sidechaincompress=threshold=0.02:ratio=8:attack=20:release=500"
+
+
+def _seconds(value):
+    return f"{value:.3f}".rstrip('0').rstrip('.')
+
+
+def build_filter_graph(durations, gap=0.6, intro_music=False, outro_music=False, music_gain=-12.0,
+                       music_lead=3.0, loudness=LOUDNESS, true_peak=TRUE_PEAK):
+    """The -filter_complex graph mixing the parts, with [out] as its output.
+
+    durations are the parts' lengths in seconds, which place the outro music
+    under the last part. Inputs are numbered parts first, then the intro and
+    outro music if given.
+    """
+    count = len(durations)
+    filters = [f"[{index}:a]{FORMAT}[p{index}]" for index in range(count)]
+    pieces = []
+    for index in range(count):
+        pieces.append(f"[p{index}]")
+        if gap and index < count - 1:
+            filters.append(f"anullsrc=r={SAMPLE_RATE}:cl=stereo,atrim=duration={_seconds(gap)},{FORMAT}[g{index}]")
+            pieces.append(f"[g{index}]")
+    voice = f"{''.join(pieces)}concat=n={len(pieces)}:v=0:a=1"
+
+    if not (intro_music or outro_music):
+        filters.append(f"{voice}[mix]")
+    else:
+        lead = music_lead if intro_music else 0
+        filters.append(f"{voice},adelay={round(lead * 1000)}:all=1,asplit=2[voice][key]")
+        beds, music_input = [], count
+        if intro_music:
+            filters.append(f"[{music_input}:a]{FORMAT},volume={music_gain}dB[intro]")
+            beds.append('[intro]')
+            music_input += 1
+        if outro_music:
+            start = lead + sum(durations[:-1]) + gap * (count - 1)
+            filters.append(f"[{music_input}:a]{FORMAT},volume={music_gain}dB,"
+                           f"adelay={round(start * 1000)}:all=1[outro]")
+            beds.append('[outro]')
+        bed = f"{beds[0]}anull" if len(beds) == 1 else f"{''.join(beds)}amix=inputs=2:duration=longest:normalize=0"
+        # The padded key keeps ducking running to the end of the music
+        filters.append("[key]apad[keypad]")
+        filters.append(f"{bed}[bed];[bed][keypad]{DUCK}[ducked]")
+        filters.append("[voice][ducked]amix=inputs=2:duration=longest:normalize=0[mix]")
+
+    filters.append(f"[mix]loudnorm=I={loudness}:TP={true_peak}:LRA={LOUDNESS_RANGE},"
+                   f"aresample={SAMPLE_RATE}[out]")
+    return ';'.join(filters)
+
+
+def _feed(path, fd):
+    """Copy a file into a pipe; ffmpeg closing its end early just ends the copy"""
+    try:
+        with open(fd, 'wb') as pipe, open(path, 'rb') as f:
+            shutil.copyfileobj(f, pipe, 1 << 16)
+    except (BrokenPipeError, ValueError):
+        pass
+
+
+def mix_audio(parts, output_file, ffmpeg='ffmpeg', gap=0.6, intro_music=None, outro_music=None,
+              music_gain=-12.0, music_lead=3.0, loudness=LOUDNESS, true_peak=TRUE_PEAK, bitrate='128k'):
+    """Mix MP3 parts into output_file through one ffmpeg run.
+
+    Returns the encode's wall time, the episode's length in seconds and the
+    speed relative to real time. Raises FileNotFoundError if ffmpeg is
+    missing and CalledProcessError (with ffmpeg's errors) if it fails.
+    """
+    durations = [mp3_duration(part) for part in parts]
+    graph = build_filter_graph(durations, gap=gap, intro_music=bool(intro_music), outro_music=bool(outro_music),
+                               music_gain=music_gain, music_lead=music_lead, loudness=loudness,
+                               true_peak=true_peak)
+
+    # Parts come in over pipes where the platform can pass descriptors
+    feeders, read_ends, inputs = [], [], []
+    for part in parts:
+        if os.name != 'posix':
+            inputs += ['-i', part]
+            continue
+        read_end, write_end = os.pipe()
+        read_ends.append(read_end)
+        feeders.append(threading.Thread(target=_feed, args=(part, write_end), daemon=True))
+        inputs += ['-f', 'mp3', '-i', f'pipe:{read_end}']
+    for music in (intro_music, outro_music):
+        if music:
+            inputs += ['-i', music]
+
+    partial = f"{output_file}.part"
+    cmd = [ffmpeg, '-hide_banner', '-nostdin', '-loglevel', 'error', *inputs,
+           '-filter_complex', graph, '-map', '[out]',
+           '-c:a', 'libmp3lame', '-b:a', str(bitrate), '-f', 'mp3', partial, '-y']
+    started = time.perf_counter()
+    try:
+        for feeder in feeders:
+            feeder.start()
+        process = subprocess.Popen(cmd, pass_fds=read_ends, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except BaseException:
+        for read_end in read_ends:
+            os.close(read_end)
+        raise
+    # ffmpeg has its own copies; closing ours lets the feeders stop if it exits early
+    for read_end in read_ends:
+        os.close(read_end)
+    _, errors = process.communicate()
+    for feeder in feeders:
+        feeder.join()
+    if process.returncode:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise subprocess.CalledProcessError(process.returncode, cmd, stderr=errors.decode(errors='replace'))
+    os.replace(partial, output_file)
+
+    seconds = time.perf_counter() - started
+    audio_seconds = mp3_duration(output_file)
+    return {
+        'seconds': round(seconds, 3),
+        'audio_seconds': round(audio_seconds, 1),
+        'realtime': round(audio_seconds / seconds, 1) if seconds else None,
+    }
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Batch and backfill generation for Youth Lens Today
+Renders many episodes at once (one per date, topic or outline file) on a
+bounded pool, with shared HTTP connections, audio cache and per-API
+concurrency limits, and writes a report of throughput, failures and cost
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from pipeline_state import atomic_write
+from publish_podcast import backfill_time, publish_episode
+from settings import get_setting
+
+USAGE_FIELDS = ('llm_requests', 'prompt_tokens', 'cached_tokens', 'completion_tokens',
+                'tts_requests', 'tts_characters', 'tts_cached_characters', 'script_retries')
+
+
+def parse_dates(values):
+    """Dates from YYYY-MM-DD values and inclusive YYYY-MM-DD..YYYY-MM-DD ranges"""
+    dates = []
+    for value in values:
+        first, _, last = value.partition('..')
+        start = date.fromisoformat(first)
+        end = date.fromisoformat(last) if last else start
+        if end < start:
+            raise ValueError(f"range ends before it starts: {value}")
+        while start <= end:
+            dates.append(start)
+            start += timedelta(days=1)
+    return dates
+
+
+def build_jobs(dates=(), topics=(), outline_files=()):
+    """One job per date, topic and outline file"""
+    jobs = [{'label': day.isoformat(), 'episode_date': day} for day in parse_dates(dates)]
+    jobs += [{'label': f"topic: {topic}", 'topic': topic} for topic in topics]
+    for path in outline_files:
+        with open(path, encoding='utf-8') as f:
+            jobs.append({'label': os.path.basename(path), 'outline': f.read(), 'outline_file': path})
+    for index, job in enumerate(jobs):
+        job['index'] = index
+    return jobs
+
+
+def publish_backfill(audio_file, episode_date):
+    """Move a finished episode into episodes/ and add it to the manifest.
+
+    Backfilled episodes are dated noon UTC on their own day so the feed lists
+    them in date order.
+    """
+    return publish_episode(audio_file, backfill_time(episode_date))
+
+
+def run_job(job, shared, test_mode, publish):
+    """Generate one episode and return its report entry"""
+    from podcast_generator import PodcastGenerator
+    generator = PodcastGenerator(test_mode=test_mode, **shared)
+    result = {
+        'index': job['index'],
+        'label': job['label'],
+        'date': job['episode_date'].isoformat() if job.get('episode_date') else None,
+        'topic': job.get('topic'),
+        'outline_file': job.get('outline_file'),
+    }
+    started = time.monotonic()
+    try:
+        generated = generator.generate_podcast(episode_date=job.get('episode_date'),
+                                               topic=job.get('topic'), outline=job.get('outline'))
+        success, error = generated['status'] == 'ok', generated['error']
+    except Exception as e:
+        success, error = False, str(e)
+
+    if success and publish and not test_mode:
+        try:
+            result['file'] = publish_backfill(generator.final_audio_file, job.get('episode_date'))
+        except (OSError, ValueError) as e:
+            success, error = False, f"publishing failed: {e}"
+    elif success:
+        result['file'] = generator.final_audio_file
+
+    result.update({
+        'status': 'ok' if success else 'failed',
+        'error': error,
+        'run_id': generator.run.run_id if generator.run else None,
+        'seconds': round(time.monotonic() - started, 1),
+        'usage': dict(generator.usage),
+        'cost': generator.estimate_cost(),
+    })
+    return result
+
+
+def summarize(results, wall_seconds, limits):
+    """Totals, throughput and cost per episode for a finished batch"""
+    succeeded = [result for result in results if result['status'] == 'ok']
+    usage = {field: sum(result['usage'][field] for result in results) for field in USAGE_FIELDS}
+    cost = {part: round(sum(result['cost'][part] for result in results), 4) for part in ('llm', 'tts', 'total')}
+    return {
+        'episodes': len(results),
+        'succeeded': len(succeeded),
+        'failed': len(results) - len(succeeded),
+        'wall_seconds': round(wall_seconds, 1),
+        'episodes_per_hour': round(len(succeeded) * 3600 / wall_seconds, 2) if wall_seconds else None,
+        'limits': limits,
+        'usage': usage,
+        'cost': cost,
+        'cost_per_episode': round(cost['total'] / len(succeeded), 4) if succeeded else None,
+    }
+
+
+def run_batch(jobs, episodes=2, openai_concurrency=None, elevenlabs_concurrency=None,
+              test_mode=False, publish=False, report_file=None):
+    """Generate every job, episodes at a time; returns the report dict"""
+    from podcast_generator import api_concurrency, new_api_limits, new_audio_cache, new_key_pool, new_transport
+    limits = {'episodes': episodes, **api_concurrency(openai_concurrency, elevenlabs_concurrency)}
+    shared = {
+        'transport': new_transport(pool_size=limits['openai'] + limits['elevenlabs']),
+        'audio_cache': new_audio_cache(),
+        'api_limits': new_api_limits(limits['openai'], limits['elevenlabs']),
+        'key_pool': new_key_pool(),
+    }
+
+    print(f"📦 Batch of {len(jobs)} episodes: {episodes} at a time, "
+          f"{limits['openai']} OpenAI and {limits['elevenlabs']} ElevenLabs requests in flight")
+    started_at = datetime.now()
+    started = time.monotonic()
+    results = []
+    with ThreadPoolExecutor(max_workers=episodes) as pool:
+        futures = [pool.submit(run_job, job, shared, test_mode, publish) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            mark = '✅' if result['status'] == 'ok' else '❌'
+            print(f"{mark} [{len(results)}/{len(jobs)}] {result['label']}: {result['status']} "
+                  f"in {result['seconds']}s, ~${result['cost']['total']:.2f}"
+                  + (f" ({result['error']})" if result['error'] else ""))
+    shared['transport'].close()
+
+    results.sort(key=lambda result: result['index'])
+    report = {
+        'started': started_at.isoformat(timespec='seconds'),
+        'finished': datetime.now().isoformat(timespec='seconds'),
+        'summary': summarize(results, time.monotonic() - started, limits),
+        'results': results,
+    }
+    if shared['audio_cache']:
+        report['tts_cache'] = shared['audio_cache'].stats()
+    if shared['key_pool']:
+        report['elevenlabs_keys'] = shared['key_pool'].stats()
+
+    report_file = report_file or f"batch_report_{started_at.strftime('%Y%m%d_%H%M%S')}.json"
+    atomic_write(report_file, json.dumps(report, indent=2))
+    print(f"📄 Batch report saved to: {report_file}")
+    return report
+
+
+def add_arguments(parser):
+    """Batch options, shared with the podcast.py batch subcommand"""
+    parser.add_argument('--dates', nargs='+', default=[], metavar='DATE',
+                        help="episode dates (YYYY-MM-DD) or ranges (YYYY-MM-DD..YYYY-MM-DD) to backfill")
+    parser.add_argument('--topics', nargs='+', default=[], metavar='TOPIC', help="one episode per topic")
+    parser.add_argument('--outlines', nargs='+', default=[], metavar='FILE',
+                        help="one episode per outline file, skipping news research")
+    parser.add_argument('--episodes', type=int, default=int(get_setting('BATCH_EPISODES', 2, cast=int)),
+                        help="episodes generated at once")
+    parser.add_argument('--openai-concurrency', type=int, help="OpenAI requests in flight across the batch")
+    parser.add_argument('--elevenlabs-concurrency', type=int, help="ElevenLabs requests in flight across the batch")
+    parser.add_argument('--test', action='store_true', help="generate scripts only (no ElevenLabs calls)")
+    parser.add_argument('--publish', action='store_true', help="move episodes into episodes/ and update the RSS feed")
+    parser.add_argument('--report', help="report file (default: batch_report_<time>.json)")
+
+
+def run(args, parser):
+    """Run a batch from parsed options; returns the report"""
+    try:
+        jobs = build_jobs(args.dates, args.topics, args.outlines)
+    except (OSError, ValueError) as e:
+        print(f"❌ Invalid batch: {e}")
+        sys.exit(2)
+    if not jobs:
+        parser.error("give at least one of --dates, --topics or --outlines")
+
+    report = run_batch(jobs, episodes=max(1, args.episodes),
+                       openai_concurrency=args.openai_concurrency,
+                       elevenlabs_concurrency=args.elevenlabs_concurrency,
+                       test_mode=args.test, publish=args.publish, report_file=args.report)
+    summary = report['summary']
+
+    if args.publish and not args.test and summary['succeeded']:
+        from generate_rss import generate_rss
+        print("📡 Updating RSS feed...")
+        generate_rss()
+
+    print(f"\n📊 {summary['succeeded']}/{summary['episodes']} episodes in {summary['wall_seconds']}s "
+          f"({summary['episodes_per_hour']} per hour)")
+    print(f"   - LLM: {summary['usage']['llm_requests']} requests, "
+          f"{summary['usage']['prompt_tokens'] + summary['usage']['completion_tokens']} tokens")
+    print(f"   - TTS: {summary['usage']['tts_characters']} characters "
+          f"({summary['usage']['tts_cached_characters']} served from cache)")
+    print(f"   - Estimated cost: ${summary['cost']['total']:.2f}"
+          + (f" (${summary['cost_per_episode']:.2f} per episode)" if summary['cost_per_episode'] is not None else ""))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate many Youth Lens Today episodes at once.")
+    add_arguments(parser)
+    report = run(parser.parse_args(), parser)
+    if report['summary']['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
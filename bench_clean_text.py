@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Benchmark and equivalence check for clean_text_for_audio
+Runs the text_cleaner implementation against the original one over the
+checked-in script_2025*.txt files (plus randomized variations of them),
+fails if any output differs, and reports the speedup
+"""
+
+import glob
+import random
+import re
+import sys
+import timeit
+
+from text_cleaner import clean_text_for_audio
+
+
+def legacy_clean_text_for_audio(text):
+    """clean_text_for_audio as it was before text_cleaner, kept verbatim as the reference"""
+
+    # Remove markdown formatting (both ** and * patterns)
+    import re
+    text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)  # Remove **text** -> text
+    text = re.sub(r'\*([^*]+)\*', r'\1', text)      # Remove *text* -> text
+    text = text.replace('**', '').replace('*', '')   # Remove any remaining asterisks
+
+    # Remove bullet points and list formatting
+    text = re.sub(r'^\s*[-*]\s*', '', text, flags=re.MULTILINE)  # Remove "- " or "* " at start of lines
+    text = re.sub(r'^\s*[-*]\s*\*\*([^*]+)\*\*:\s*', r'\1: ', text, flags=re.MULTILINE)  # Remove "- **text**: " -> "text: "
+
+    # Remove source citations - anything in parentheses with https
+    text = re.sub(r'\s*\([^)]*https[^)]*\)', '', text)  # Remove (source links)
+    text = re.sub(r'\s*\[[^\]]*https[^\]]*\]', '', text)  # Remove [source links]
+
+    # Remove HALF 1/HALF 2 markers
+    text = text.replace('HALF 1:', '').replace('HALF 2:', '')
+
+    # Remove section headers and formatting
+    text = text.replace('HOST 1:', '').replace('HOST 2:', '')
+    text = text.replace('SEGMENT 1:', '').replace('SEGMENT 2:', '').replace('SEGMENT 3:', '')
+    text = text.replace('INTRO:', '').replace('OUTRO:', '')
+    text = text.replace('Transition to Segment 2:', '').replace('Transition to Segment 3:', '')
+
+    # Remove any remaining formatting artifacts
+    text = text.replace('===', '').replace('---', '')
+
+    # Remove any lines that are just formatting or headers
+    lines = text.split('\n')
+    cleaned_lines = []
+    for line in lines:
+        line = line.strip()
+        # Skip lines that are just formatting, headers, or empty
+        if (line and 
+            not line.startswith('**') and 
+            not line.startswith('===') and 
+            not line.startswith('---') and
+            not line.startswith('#') and
+            not line.startswith('-') and  # Skip bullet points
+            not line.startswith('*') and  # Skip asterisk bullets
+            not re.match(r'^[A-Z\s]+$', line) and  # Skip ALL CAPS headers
+            not re.match(r'^\*\*[^*]+\*\*$', line)):  # Skip **header** lines
+            cleaned_lines.append(line)
+
+    # Join back together with proper spacing
+    cleaned_text = ' '.join(cleaned_lines)
+
+    # Remove repetition (detect and remove repeated sentences)
+    sentences = re.split(r'[.!?]+', cleaned_text)
+    unique_sentences = []
+    seen_sentences = set()
+
+    for sentence in sentences:
+        sentence = sentence.strip()
+        if sentence and len(sentence) > 10:  # Only consider substantial sentences
+            # Normalize sentence for comparison (remove extra spaces, lowercase)
+            normalized = re.sub(r'\s+', ' ', sentence.lower()).strip()
+            if normalized not in seen_sentences:
+                unique_sentences.append(sentence)
+                seen_sentences.add(normalized)
+
+    # Reconstruct text from unique sentences
+    cleaned_text = '. '.join(unique_sentences) + '.'
+
+    # Final cleanup - remove extra spaces and normalize
+    cleaned_text = re.sub(r'\s+', ' ', cleaned_text).strip()
+
+    return cleaned_text
+
+
+# Formatting the LLM tends to leave behind, mixed into the fuzz cases
+ARTIFACTS = [
+    '**HOST 1:**', '**SEGMENT 2:**', 'HALF 1:', 'HALF 2:', 'INTRO:', 'OUTRO:',
+    '**Transition to Segment 3:**', '===', '---', '# Heading', '## BREAKING NEWS',
+    'US DOMESTIC STORY', '- ', '* ', '  - **Key players**: ', '*italic*', '**bold**',
+    ' (https://example.com/story)', ' [source https://example.org]', '(see www.example.com)',
+    '...', '!!', '?', '', '\n', '\n\n', '\t',
+]
+
+
+def load_corpus():
+    """The checked-in scripts, whole and split into their === sections ==="""
+    documents = []
+    for path in sorted(glob.glob('script_2025*.txt')):
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        documents.append((path, text))
+        for number, section in enumerate(re.split(r'^=== .* ===$', text, flags=re.MULTILINE)):
+            if section.strip():
+                documents.append((f"{path}#section{number}", section))
+    return documents
+
+
+def fuzz_cases(documents, count, seed=2025):
+    """Shuffled corpus lines with artifacts and repeats injected"""
+    rng = random.Random(seed)
+    lines = [line for _, text in documents for line in text.split('\n')]
+    cases = []
+    for number in range(count):
+        picked = rng.sample(lines, min(len(lines), rng.randint(5, 60)))
+        out = []
+        for line in picked:
+            if rng.random() < 0.4:
+                artifact = rng.choice(ARTIFACTS)
+                line = artifact + line if rng.random() < 0.5 else line + artifact
+            out.append(line)
+            if rng.random() < 0.1:
+                out.append(line.upper() if rng.random() < 0.5 else line)
+        cases.append((f"fuzz#{number}", '\n'.join(out)))
+    return cases
+
+
+def check_equivalence(cases):
+    """Return the names of cases where the two implementations disagree"""
+    return [name for name, text in cases
+            if clean_text_for_audio(text) != legacy_clean_text_for_audio(text)]
+
+
+def bench(function, texts, repeat):
+    """Best time in seconds to clean every text once"""
+    timer = timeit.Timer(lambda: [function(text) for text in texts])
+    return min(timer.repeat(repeat=repeat, number=1))
+
+
+def main():
+    repeat = int(sys.argv[sys.argv.index('--repeat') + 1]) if '--repeat' in sys.argv else 20
+    fuzz = int(sys.argv[sys.argv.index('--fuzz') + 1]) if '--fuzz' in sys.argv else 500
+
+    documents = load_corpus()
+    if not documents:
+        print("❌ No script_2025*.txt files found; run from the repository root")
+        sys.exit(1)
+
+    cases = documents + fuzz_cases(documents, fuzz)
+    mismatches = check_equivalence(cases)
+    if mismatches:
+        print(f"❌ Output differs from the original cleaner for {len(mismatches)} of {len(cases)} cases:")
+        for name in mismatches[:20]:
+            print(f"   - {name}")
+        sys.exit(1)
+    print(f"✅ Identical output on {len(cases)} cases ({len(documents)} corpus, {fuzz} fuzz)")
+
+    texts = [text for _, text in documents]
+    characters = sum(len(text) for text in texts)
+    old = bench(legacy_clean_text_for_audio, texts, repeat)
+    new = bench(clean_text_for_audio, texts, repeat)
+    print(f"📊 Corpus: {len(texts)} texts, {characters} characters, best of {repeat}")
+    print(f"   - original:     {old * 1000:.2f} ms ({characters / old / 1e6:.1f} M chars/s)")
+    print(f"   - text_cleaner: {new * 1000:.2f} ms ({characters / new / 1e6:.1f} M chars/s)")
+    print(f"   - speedup:      {old / new:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark for the podcast pipeline
+Starts local stand-ins for the OpenAI chat completions and ElevenLabs
+text-to-speech endpoints (configurable latency, jitter, error rate and
+response size, synthetic but valid MP3 audio), runs publish_podcast (which
+runs generate_podcast and generate_rss) against them in a scratch directory,
+and reports latency percentiles, throughput and memory
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from metrics import STAGES_FILE, peak_rss
+from mp3_tools import BITRATES, MPEG1, SAMPLE_RATES
+from segment_planner import cached_prefix_tokens
+
+WORDS = ("policy budget court vote senate council school student tuition climate energy grid trade "
+         "tariff market inflation wage housing rent transit rail border treaty summit election "
+         "campaign poll survey report agency ruling appeal lawsuit hearing bill reform plan program "
+         "grant city state county region nation minister leader mayor governor judge expert analyst "
+         "community family worker youth voter season record growth decline shift debate question "
+         "answer impact cost benefit risk timeline deadline proposal draft review update response").split()
+
+
+def synthetic_mp3(seconds, bitrate=128, sample_rate=44100):
+    """Silent MPEG-1 Layer III audio of about the given length.
+
+    Each frame is a valid mono header followed by zeroed side information
+    and main data, which decoders play as silence.
+    """
+    bitrate_index = BITRATES[MPEG1].index(bitrate)
+    rate_index = SAMPLE_RATES[MPEG1].index(sample_rate)
+    header = bytes([0xFF, 0xFB, (bitrate_index << 4) | (rate_index << 2), 0xC4])
+    length = 144 * bitrate * 1000 // sample_rate
+    frames = max(1, round(seconds * sample_rate / 1152))
+    return (header + bytes(length - 4)) * frames
+
+
+def synthetic_text(rng, characters):
+    """Paragraphs of random, non-repeating sentences totalling about characters"""
+    paragraphs, total = [], 0
+    while total < characters:
+        sentences = []
+        for _ in range(rng.randint(3, 6)):
+            words = rng.choices(WORDS, k=rng.randint(9, 18))
+            sentences.append(' '.join(words).capitalize() + '.')
+        paragraph = ' '.join(sentences)
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 2
+    return '\n\n'.join(paragraphs)
+
+
+def synthetic_outline(rng):
+    """A structured outline reply, in a code fence as models tend to send it"""
+    def sentence():
+        return ' '.join(rng.choices(WORDS, k=rng.randint(6, 12))).capitalize()
+    stories = [{
+        'kind': kind,
+        'title': sentence(),
+        'summary': sentence() + '.',
+        'facts': [sentence() + '.' for _ in range(4)],
+        'players': [sentence() for _ in range(2)],
+        'dates': [f"2025-07-{rng.randint(10, 28)}: {sentence()}"],
+        'implications': sentence() + '.',
+        'status': sentence() + '.',
+    } for kind in ("US domestic", "International", "Offbeat")]
+    return f"```json\n{json.dumps({'stories': stories}, indent=2)}\n```"
+
+
+class MockAPI:
+    """Local HTTP stand-in for both APIs, on an ephemeral port.
+
+    Each request waits latency +/- jitter seconds; error_rate of them get a
+    429 (with Retry-After) or 500 instead. Story replies are segment_chars of
+    text (a fifth of that for the intro and outro), bad_script_rate of them
+    with markdown left in, written at llm_chars_per_second (0 for instantly), streamed as
+    server-sent events when the request asks for it, and speech is synthetic
+    MP3 at chars_per_second, rendered at tts_chars_per_second (0 for instantly).
+    A system message seen before is reported as cached prompt tokens, as
+    OpenAI would: only from 1,024 tokens on, in steps of 128.
+    """
+
+    def __init__(self, latency=0.05, jitter=0.02, error_rate=0.0, segment_chars=2500,
+                 chars_per_second=15.0, bitrate=128, seed=1, llm_chars_per_second=0.0,
+                 tts_chars_per_second=0.0, bad_script_rate=0.0):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.segment_chars = segment_chars
+        self.bad_script_rate = bad_script_rate
+        self.llm_chars_per_second = llm_chars_per_second
+        self.tts_chars_per_second = tts_chars_per_second
+        self.chars_per_second = chars_per_second
+        self.bitrate = bitrate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'bytes_sent': 0, 'chat': 0, 'speech': 0}
+        self.prefixes = set()
+
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self.reply(200, b'{}', 'application/json')
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                status, payload, content_type = api.handle(self.path, json.loads(body or b'{}'))
+                self.reply(status, payload, content_type)
+
+            def reply(self, status, payload, content_type):
+                if isinstance(payload, list):
+                    return self.reply_events(payload)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                if status == 429:
+                    self.send_header('Retry-After', '0')
+                self.end_headers()
+                self.wfile.write(payload)
+                with api.lock:
+                    api.stats['bytes_sent'] += len(payload)
+
+            def reply_events(self, events):
+                """Send (delay, event) pairs as a chunked text/event-stream"""
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for delay, event in events:
+                    time.sleep(delay)
+                    data = f"data: {event}\n\n".encode()
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+                    with api.lock:
+                        api.stats['bytes_sent'] += len(data)
+                self.wfile.write(b"0\r\n\r\n")
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, path, request):
+        with self.lock:
+            self.stats['requests'] += 1
+            delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+            failed = self.rng.random() < self.error_rate
+            bad = self.rng.random() < self.bad_script_rate
+            rng = random.Random(self.rng.random())
+        time.sleep(delay)
+        if failed:
+            with self.lock:
+                self.stats['errors'] += 1
+            return rng.choice([429, 500]), b'{"error": "injected"}', 'application/json'
+
+        if path.endswith('/chat/completions'):
+            with self.lock:
+                self.stats['chat'] += 1
+            messages = request.get('messages', [])
+            system = messages[0].get('content', '') if messages else ''
+            task = messages[-1].get('content', '') if messages else ''
+            if 'news researcher' in system:
+                content = synthetic_outline(rng)
+            elif "'s introduction" in task:
+                content = f"Welcome to Youth Lens Today. {synthetic_text(rng, self.segment_chars // 5)}"
+            elif "'s outro" in task:
+                content = f"{synthetic_text(rng, self.segment_chars // 5)} Thanks for listening, until next time."
+            else:
+                content = synthetic_text(rng, self.segment_chars)
+            if bad and 'news researcher' not in system:
+                content = f"**{content[:40]}**\n\n{content}"
+            prompt = sum(len(message.get('content', '')) for message in messages)
+            with self.lock:
+                cached = cached_prefix_tokens(len(system) // 4) if system in self.prefixes else 0
+                self.prefixes.add(system)
+            usage = {'prompt_tokens': prompt // 4, 'completion_tokens': len(content) // 4,
+                     'prompt_tokens_details': {'cached_tokens': cached}}
+            rate = self.llm_chars_per_second
+            if request.get('stream'):
+                # About ten words per event, each after the time it takes to write
+                words = content.split(' ')
+                pieces = [' '.join(words[i:i + 10]) + (' ' if i + 10 < len(words) else '')
+                          for i in range(0, len(words), 10)]
+                events = [(len(piece) / rate if rate else 0,
+                           json.dumps({'choices': [{'index': 0, 'delta': {'content': piece}}]}))
+                          for piece in pieces]
+                events.append((0, json.dumps({'choices': [], 'usage': usage})))
+                events.append((0, '[DONE]'))
+                return 200, events, 'text/event-stream'
+            if rate:
+                time.sleep(len(content) / rate)
+            reply = {
+                'choices': [{'message': {'role': 'assistant', 'content': content}}],
+                'usage': usage,
+            }
+            return 200, json.dumps(reply).encode(), 'application/json'
+
+        if '/text-to-speech/' in path:
+            with self.lock:
+                self.stats['speech'] += 1
+            seconds = len(request.get('text', '')) / self.chars_per_second
+            if self.tts_chars_per_second:
+                time.sleep(len(request.get('text', '')) / self.tts_chars_per_second)
+            return 200, synthetic_mp3(seconds, self.bitrate), 'audio/mpeg'
+
+        return 404, b'{"error": "not found"}', 'application/json'
+
+
+def percentile(values, fraction):
+    """Linearly interpolated percentile of values (None if empty)"""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * fraction
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def latency_summary(values):
+    return {
+        'count': len(values),
+        'p50': percentile(values, 0.50),
+        'p90': percentile(values, 0.90),
+        'p99': percentile(values, 0.99),
+        'max': max(values) if values else None,
+    }
+
+
+def run_bench(episodes, api, workdir):
+    """Publish episodes one after another against the mock API; returns the report"""
+    from generate_rss import generate_rss
+    from publish_podcast import publish_podcast
+    from settings import get_setting
+
+    os.environ.update({
+        'OPENAI_BASE_URL': f"{api.url}/v1",
+        'ELEVENLABS_BASE_URL': f"{api.url}/v1",
+        'OPENAI_API_KEY': 'bench',
+        'ELEVENLABS_API_KEY_1': 'bench-1',
+        'ELEVENLABS_API_KEY_2': 'bench-2',
+    })
+    # config_local.py wins over the environment; never benchmark real APIs
+    for name in ('OPENAI_BASE_URL', 'ELEVENLABS_BASE_URL'):
+        if get_setting(name) != f"{api.url}/v1":
+            raise RuntimeError(f"{name} is set in config_local.py; remove it to run the benchmark")
+
+    os.chdir(workdir)
+    durations, memory, failures = [], [], 0
+    started = time.monotonic()
+    for number in range(1, episodes + 1):
+        print(f"🏁 Episode {number}/{episodes}")
+        episode_started = time.monotonic()
+        if publish_podcast()['status'] != 'ok':
+            failures += 1
+        durations.append(time.monotonic() - episode_started)
+        memory.append(peak_rss())
+    wall = time.monotonic() - started
+
+    # An RSS rebuild with nothing new, the steady-state feed job
+    rss_started = time.monotonic()
+    generate_rss()
+    rss_unchanged = time.monotonic() - rss_started
+
+    stages = {}
+    with open(os.path.join(get_setting('METRICS_DIR', 'metrics'), STAGES_FILE), encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            stages.setdefault(record['stage'], []).append(record)
+
+    tts_characters = sum(record['tts_characters'] for record in stages.get('tts_request', []))
+    downloaded = sum(record['bytes_downloaded'] for records in stages.values() for record in records)
+    tokens = {name: sum(record.get(name, 0) for records in stages.values() for record in records)
+              for name in ('prompt_tokens', 'cached_tokens', 'completion_tokens')}
+    return {
+        'episodes': episodes,
+        'failures': failures,
+        'wall_seconds': round(wall, 3),
+        'episodes_per_hour': round(episodes * 3600 / wall, 1) if wall else None,
+        'tts_characters_per_second': round(tts_characters / wall, 1) if wall else None,
+        'megabytes_downloaded_per_second': round(downloaded / wall / 1e6, 2) if wall else None,
+        'episode_seconds': latency_summary(durations),
+        'rss_unchanged_seconds': round(rss_unchanged, 4),
+        'stage_seconds': {stage: latency_summary([record['seconds'] for record in records])
+                          for stage, records in sorted(stages.items())},
+        'retries': sum(record['retries'] for records in stages.values() for record in records),
+        'tokens': tokens,
+        'peak_rss_bytes': memory,
+        'mock': dict(api.stats),
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Regressions against a baseline report, as messages"""
+    regressions = []
+    checks = [('episode p50', report['episode_seconds']['p50'], baseline['episode_seconds']['p50']),
+              ('episode p90', report['episode_seconds']['p90'], baseline['episode_seconds']['p90']),
+              ('peak RSS', report['peak_rss_bytes'][-1], baseline['peak_rss_bytes'][-1])]
+    for stage, summary in report['stage_seconds'].items():
+        if stage in baseline['stage_seconds']:
+            checks.append((f"{stage} p50", summary['p50'], baseline['stage_seconds'][stage]['p50']))
+    for name, value, previous in checks:
+        if value is not None and previous and value > previous * (1 + tolerance):
+            regressions.append(f"{name}: {value:.4g} vs {previous:.4g} (+{(value / previous - 1) * 100:.0f}%)")
+    return regressions
+
+
+def add_arguments(parser):
+    """Benchmark options, shared with the podcast.py bench subcommand"""
+    parser.add_argument('--episodes', type=int, default=3, help="episodes to publish")
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds per mock request")
+    parser.add_argument('--jitter', type=float, default=0.02, help="+/- seconds of random latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered 429/500")
+    parser.add_argument('--segment-chars', type=int, default=2500, help="characters per chat completion")
+    parser.add_argument('--bad-script-rate', type=float, default=0.0,
+                        help="fraction of segments written with markdown, to exercise validation")
+    parser.add_argument('--llm-chars-per-second', type=float, default=0.0,
+                        help="how fast the chat stand-in writes (0 for instant replies)")
+    parser.add_argument('--tts-chars-per-second', type=float, default=0.0,
+                        help="how fast the speech stand-in renders (0 for instant replies)")
+    parser.add_argument('--chars-per-second', type=float, default=15.0, help="speech rate of the synthetic audio")
+    parser.add_argument('--bitrate', type=int, default=128, help="kbps of the synthetic audio")
+    parser.add_argument('--cache', action='store_true', help="keep the TTS cache on (off by default)")
+    parser.add_argument('--stream', action='store_true', help="stream scripts into TTS (PIPELINE_STREAMING)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="write the report as JSON")
+    parser.add_argument('--baseline', help="earlier report to compare against; exit 1 on regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown against the baseline")
+
+
+def run(args):
+    """Run the benchmark from parsed options; returns the report.
+
+    With a baseline, report['regressions'] lists what got slower.
+    """
+    # Retries back off quickly so injected errors don't dominate the timings
+    os.environ.setdefault('HTTP_BACKOFF', '0.05')
+    if not args.cache:
+        os.environ['TTS_CACHE'] = '0'
+    os.environ['PIPELINE_STREAMING'] = '1' if args.stream else '0'
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    api = MockAPI(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                  segment_chars=args.segment_chars, chars_per_second=args.chars_per_second,
+                  bitrate=args.bitrate, seed=args.seed, llm_chars_per_second=args.llm_chars_per_second,
+                  tts_chars_per_second=args.tts_chars_per_second, bad_script_rate=args.bad_script_rate).start()
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory(prefix='podcast-bench-') as workdir:
+            report = run_bench(args.episodes, api, workdir)
+            os.chdir(cwd)
+    finally:
+        os.chdir(cwd)
+        api.stop()
+
+    episode = report['episode_seconds']
+    print(f"\n📊 {report['episodes']} episodes in {report['wall_seconds']:.2f}s "
+          f"({report['episodes_per_hour']} per hour, {report['failures']} failed)")
+    print(f"   - episode: p50 {episode['p50']:.3f}s, p90 {episode['p90']:.3f}s, max {episode['max']:.3f}s")
+    for stage, summary in report['stage_seconds'].items():
+        print(f"   - {stage:<12} x{summary['count']:<4} p50 {summary['p50'] * 1000:8.1f} ms, "
+              f"p90 {summary['p90'] * 1000:8.1f} ms, p99 {summary['p99'] * 1000:8.1f} ms")
+    print(f"   - TTS: {report['tts_characters_per_second']} chars/s, "
+          f"{report['megabytes_downloaded_per_second']} MB/s downloaded, {report['retries']} retries")
+    tokens = report['tokens']
+    print(f"   - LLM: {tokens['prompt_tokens']} prompt tokens ({tokens['cached_tokens']} cached), "
+          f"{tokens['completion_tokens']} completion tokens")
+    print(f"   - unchanged RSS rebuild: {report['rss_unchanged_seconds'] * 1000:.1f} ms")
+    if report['peak_rss_bytes'][-1]:
+        print(f"   - peak RSS: {report['peak_rss_bytes'][-1] / 1e6:.1f} MB")
+    print(f"   - mock: {report['mock']['requests']} requests, {report['mock']['errors']} injected errors")
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Report saved to: {output}")
+
+    if baseline:
+        report['regressions'] = compare(report, baseline, args.tolerance)
+        for regression in report['regressions']:
+            print(f"❌ Regression: {regression}")
+        if not report['regressions']:
+            print(f"✅ No regressions beyond {args.tolerance * 100:.0f}% of the baseline")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline end to end against local API stand-ins.")
+    add_arguments(parser)
+    report = run(parser.parse_args())
+    if report['failures'] or report.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,4 +10,133 @@ ELEVENLABS_API_KEY_2 = "your-elevenlabs-api-key-2-here"
 
 # Voice IDs
 VOICE_ID_1 = "your-voice-id-1-here"
-VOICE_ID_2 = "your-voice-id-2-here" 
\ No newline at end of file
+VOICE_ID_2 = "your-voice-id-2-here" 
+
+# Optional: host roster in speaking order (defaults to the two hosts above).
+# An episode has 5 segments (intro, 3 stories, outro), so with 5 or more hosts
+# some get no segment and are skipped. Every host needs a name and voice_id;
+# api_key is the key tried first for that host's audio and may be left out
+# when ELEVENLABS_API_KEYS is set
+# HOSTS = [
+#     {"name": "Nathan Goldberg", "voice_id": VOICE_ID_1, "api_key": ELEVENLABS_API_KEY_1},
+#     {"name": "Jonah Herman", "voice_id": VOICE_ID_2, "api_key": ELEVENLABS_API_KEY_2},
+# ]
+
+# Optional: number of segment scripts generated at once
+# SCRIPT_WORKERS = 3
+
+# Optional: segments per episode that may be regenerated after failing
+# validation (too short or long, formatting, citations, repetition)
+# SCRIPT_RETRY_BUDGET = 2
+
+# Optional: stream segment scripts from OpenAI and synthesize each paragraph as
+# soon as it is written (also: podcast_generator.py --stream)
+# PIPELINE_STREAMING = False
+
+# Optional: max characters per ElevenLabs request, and parallel requests per key
+# TTS_CHUNK_CHARS = 2500
+# TTS_KEY_CONCURRENCY = 2
+
+# Optional: ElevenLabs keys to spread requests over (defaults to the hosts' keys).
+# Entries can be plain keys or dicts overriding concurrency, rate (requests per
+# second), the voices a key can use, and its characters left
+# ELEVENLABS_API_KEYS = [
+#     "key-one",
+#     {"key": "key-two", "concurrency": 5, "rate": 4, "voices": ["voice-id"], "characters": 100000},
+# ]
+# TTS_KEY_RATE = 2.0
+# Read each key's remaining characters from ElevenLabs before rendering
+# TTS_QUOTA_CHECK = True
+
+# Optional: stream ElevenLabs audio straight to disk (False buffers each response)
+# TTS_STREAMING = True
+# TTS_STREAM_BLOCK = 65536
+
+# Optional: text-to-speech character budget. Scripts are rewritten with the
+# shortest spoken forms of numbers, abbreviations and symbols; host scripts
+# over their budget are trimmed at sentence boundaries, and an episode that
+# would lose more than TTS_MAX_TRIM of a host's text or cost more than
+# TTS_COST_LIMIT (USD) stops before any ElevenLabs request
+# TTS_NORMALIZE = True
+# TTS_HOST_CHAR_BUDGET = 6000
+# TTS_EPISODE_CHAR_BUDGET = 12000
+# TTS_MAX_TRIM = 0.25
+# TTS_COST_LIMIT = 5.00
+# TTS_CHARS_PER_SECOND = 15
+
+# Optional: HTTP timeouts (seconds), retries, and an overall per-episode deadline
+# HTTP_CONNECT_TIMEOUT = 10
+# HTTP_READ_TIMEOUT = 180
+# HTTP_MAX_RETRIES = 4
+# HTTP_BACKOFF = 1.0
+# EPISODE_DEADLINE = 3600
+
+# Optional: cache of synthesized audio, its location and its size limit
+# TTS_CACHE = True
+# TTS_CACHE_DIR = ".tts_cache"
+# TTS_CACHE_MAX_MB = 500
+
+# Optional: similarity (0-1) at which a sentence counts as a repeat (0 = exact
+# repeats only), and how many earlier runs' scripts to check against
+# NEAR_DUP_THRESHOLD = 0.85
+# NEAR_DUP_HISTORY = 0
+
+# Optional: keep each finished run's audio (host parts, chunks, mix) in runs/,
+# and how many finished runs to keep there (0 keeps them all)
+# KEEP_RUN_AUDIO = False
+# RUNS_KEEP = 30
+
+# Optional: episodes in the main RSS feed and per archive page; older ones go
+# to rss-2.xml (the oldest), rss-3.xml, ...
+# FEED_PAGE_SIZE = 50
+
+# Optional: requests in flight at once per API (shared by all episodes in a batch)
+# OPENAI_CONCURRENCY = 4
+# ELEVENLABS_CONCURRENCY = 8
+# BATCH_EPISODES = 2
+
+# Optional: prices used for cost estimates (USD per 1M tokens, per 1K web
+# searches, per 1K TTS characters)
+# PRICE_INPUT_TOKENS = 2.50
+# PRICE_CACHED_INPUT_TOKENS = 1.25
+# PRICE_OUTPUT_TOKENS = 10.00
+# PRICE_WEB_SEARCH = 35.00
+# PRICE_TTS_CHARACTERS = 0.30
+
+# Optional: final mix through one ffmpeg filter graph (EBU R128 loudness,
+# silence between host parts, intro/outro music ducked under the voices);
+# MIX_POSTPROCESS = False joins the parts as they are
+# FFMPEG = "ffmpeg"
+# MIX_POSTPROCESS = True
+# MIX_LOUDNESS = -16.0
+# MIX_TRUE_PEAK = -1.5
+# MIX_GAP_SECONDS = 0.6
+# MIX_INTRO_MUSIC = "music/intro.mp3"
+# MIX_OUTRO_MUSIC = "music/outro.mp3"
+# MIX_MUSIC_GAIN_DB = -12.0
+# MIX_MUSIC_LEAD_SECONDS = 3.0
+# MIX_BITRATE = "128k"
+
+# Optional: encode smaller renditions of each episode when publishing, listed
+# in the feed as podcast:alternateEnclosure (codec is mp3, opus or aac)
+# PUBLISH_RENDITIONS = True
+# RENDITIONS = [
+#     {"name": "64k-mono", "codec": "mp3", "bitrate": "64k", "channels": 1},
+#     {"name": "opus-32k", "codec": "opus", "bitrate": "32k", "channels": 1},
+# ]
+# RENDITION_WORKERS = 2
+
+# Optional: publish schedule for "schedule_podcast.py --daemon" (local time),
+# and how early to start generating before there are runs to judge from
+# PUBLISH_TIMES = "07:00"
+# PUBLISH_DAYS = "daily"
+# PUBLISH_LEAD_MINUTES = 60
+# SCHEDULE_RETRIES = 2
+# SCHEDULER_STATUS_FILE = "scheduler_status.json"
+
+# Optional: where per-stage metrics (stages.jsonl, *.prom, profiles) are written
+# METRICS_DIR = "metrics"
+
+# Optional: API base URLs (e.g. a proxy or a local stand-in)
+# OPENAI_BASE_URL = "https://api.openai.com/v1"
+# ELEVENLABS_BASE_URL = "https://api.elevenlabs.io/v1"
@@ -0,0 +1,228 @@
+"""
+Persistent episode manifest for Youth Lens Today
+One JSON line per published episode (size, publish date, duration, guid),
+so the feed can be built without scanning or stat-ing the archive
+"""
+
+import json
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from mp3_tools import mp3_duration
+
+EPISODES_DIR = 'episodes'
+MANIFEST_FILE = os.path.join(EPISODES_DIR, 'manifest.jsonl')
+BASE_URL = 'https://youthlenstoday.github.io/podcast'
+
+# Held while episodes, the manifest or the feed pages are being changed
+LOCK_FILE = '.publish.lock'
+
+# Local cache of MP3 durations keyed by path, size and mtime
+DURATION_CACHE_FILE = '.duration_cache.json'
+
+# Youth_Lens_Today_X.64k-mono.mp3, a rendition of Youth_Lens_Today_X.mp3
+RENDITION_FILE = re.compile(r'^(.+)\.[\w-]+\.mp3$')
+
+# Youth_Lens_Today_20250723_201642.mp3 -> 2025-07-23 20:16:42
+FILENAME_TIMESTAMP = re.compile(r'(\d{8})_(\d{6})')
+
+
+def load_manifest(path=MANIFEST_FILE):
+    """Episodes in publish order (oldest first); empty if there's no manifest yet"""
+    if not os.path.exists(path):
+        return []
+    episodes = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                episodes.append(json.loads(line))
+    return episodes
+
+
+@contextmanager
+def publish_lock(path=LOCK_FILE):
+    """Hold the lock that serializes changes to episodes/, the manifest and the feed.
+
+    It's a lock on a file, so publishers in other processes (batch runs, the
+    scheduler, a manual publish) wait their turn too, and the OS drops it if
+    the holder dies.
+    """
+    with open(path, 'a+b') as f:
+        if fcntl:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                print("⏳ Waiting for another publish to finish...")
+                fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after 10 seconds
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _publish_date(filename, mtime):
+    """Publish date from the filename's timestamp, else from the file's mtime"""
+    match = FILENAME_TIMESTAMP.search(filename)
+    if match:
+        try:
+            local = datetime.strptime(''.join(match.groups()), '%Y%m%d%H%M%S')
+            return local.astimezone(timezone.utc)
+        except ValueError:
+            pass
+    return datetime.fromtimestamp(mtime, timezone.utc)
+
+
+class DurationCache:
+    """MP3 durations keyed by (path, size, mtime), persisted between feed builds"""
+
+    def __init__(self, path=DURATION_CACHE_FILE):
+        self.path = path
+        self.changed = False
+        try:
+            with open(path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def duration(self, mp3_path, stat=None):
+        """Duration in seconds (None if the file can't be parsed)"""
+        stat = stat or os.stat(mp3_path)
+        key = f"{mp3_path}|{stat.st_size}|{stat.st_mtime_ns}"
+        if key not in self.entries:
+            try:
+                self.entries[key] = round(mp3_duration(mp3_path), 3)
+            except (OSError, ValueError):
+                self.entries[key] = None
+            self.changed = True
+        return self.entries[key]
+
+    def save(self):
+        if not self.changed:
+            return
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.changed = False
+
+
+def make_entry(mp3_path, published=None, duration=None, title=None, durations=None, renditions=None):
+    """Manifest entry for an episode file, with its renditions if it has any"""
+    filename = os.path.basename(mp3_path)
+    stat = os.stat(mp3_path)
+    published = published or _publish_date(filename, stat.st_mtime)
+    if duration is None:
+        duration = (durations or DurationCache()).duration(mp3_path, stat)
+    entry = {
+        'filename': filename,
+        'title': title or os.path.splitext(filename)[0],
+        'size': stat.st_size,
+        'published': published.astimezone(timezone.utc).replace(microsecond=0).isoformat(),
+        'duration': duration,
+        'guid': f"{BASE_URL}/{EPISODES_DIR}/{filename}",
+    }
+    if renditions:
+        entry['renditions'] = renditions
+    return entry
+
+
+def append_entries(entries, path=MANIFEST_FILE):
+    """Append entries to the manifest, one JSON line each"""
+    if not entries:
+        return
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, sort_keys=True) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def record_episode(mp3_path, path=MANIFEST_FILE, **details):
+    """Add a newly published episode to the manifest and return its entry"""
+    entry = make_entry(mp3_path, **details)
+    append_entries([entry], path)
+    return entry
+
+
+def rewrite_manifest(episodes, path=MANIFEST_FILE):
+    """Atomically replace the manifest with the given entries"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        for entry in episodes:
+            f.write(json.dumps(entry, sort_keys=True) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def fill_durations(episodes, durations, directory=EPISODES_DIR, path=MANIFEST_FILE):
+    """Read durations for entries recorded without one and save them to the manifest.
+
+    Entries that already have a duration are skipped, so once every episode is
+    filled in a feed build touches no MP3 files at all. Returns the count filled.
+    """
+    filled = 0
+    for entry in episodes:
+        if entry.get('duration') is not None:
+            continue
+        mp3_path = os.path.join(directory, entry['filename'])
+        if not os.path.exists(mp3_path):
+            continue
+        duration = durations.duration(mp3_path)
+        if duration is not None:
+            entry['duration'] = duration
+            filled += 1
+    if filled:
+        rewrite_manifest(episodes, path)
+    return filled
+
+
+def _is_rendition(name, names):
+    """Whether an MP3 is a rendition of another episode file in the directory"""
+    match = RENDITION_FILE.match(name)
+    return bool(match) and f"{match.group(1)}.mp3" in names
+
+
+def sync_with_directory(episodes, directory=EPISODES_DIR, path=MANIFEST_FILE, durations=None):
+    """Add MP3s that were copied into episodes/ by hand to the manifest.
+
+    Only the directory listing is read; files already in the manifest are not
+    stat-ed, so this stays cheap as the archive grows. Renditions (X.64k-mono.mp3
+    next to X.mp3) are not episodes and are skipped. Returns the new entries.
+    """
+    if not os.path.isdir(directory):
+        return []
+    known = {episode['filename'] for episode in episodes}
+    names = set(os.listdir(directory))
+    new = [name for name in names if name.endswith('.mp3') and name not in known and not _is_rendition(name, names)]
+    durations = durations or DurationCache()
+    entries = [make_entry(os.path.join(directory, name), durations=durations) for name in new]
+    entries.sort(key=lambda entry: entry['published'])
+    append_entries(entries, path)
+    episodes.extend(entries)
+    return entries
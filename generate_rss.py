@@ -1,40 +1,47 @@
 #!/usr/bin/env python3
 """
 Generate RSS feed for Youth Lens Today podcast
-Scans episodes/ directory for .mp3 files and creates rss.xml
+Builds rss.xml from the episode manifest (episodes/manifest.jsonl)
 """
 
-import os
 import glob
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
 from datetime import datetime
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
+from xml.sax.saxutils import escape, quoteattr
 
-def get_file_info(filepath):
-    """Get file creation time and size"""
-    stat = os.stat(filepath)
-    return {
-        'mtime': datetime.fromtimestamp(stat.st_mtime),
-        'size': stat.st_size
-    }
+from episode_manifest import (BASE_URL, EPISODES_DIR, DurationCache, fill_durations, load_manifest, publish_lock,
+                              sync_with_directory)
+from metrics import Metrics, count
+from settings import get_setting
 
-def format_rfc822_date(dt):
-    """Format datetime to RFC 822 format for RSS"""
-    return dt.strftime('%a, %d %b %Y %H:%M:%S %z')
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
-def generate_rss():
-    """Generate RSS feed from MP3 files in episodes/ directory"""
-    
-    # RSS feed template
-    rss_template = '''<?xml version="1.0" encoding="UTF-8"?>
-<rss version="2.0" xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd" xmlns:content="http://purl.org/rss/1.0/modules/content/" xmlns:atom="http://www.w3.org/2005/Atom">
+RSS_FILE = 'rss.xml'
+ETAG_FILE = 'feed-etags.json'
+
+# Archive pages after the main feed, oldest first: rss-2.xml, rss-3.xml, ...
+PAGE_FILE = re.compile(r'^rss-(\d+)\.xml$')
+
+# RFC 5005 feed history namespace, for the <fh:archive/> marking archive pages
+FH_NAMESPACE = 'http://purl.org/syndication/history/1.0'
+
+# RSS feed template, split around the items so they can be streamed out
+RSS_HEADER = '''<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd" xmlns:content="http://purl.org/rss/1.0/modules/content/" xmlns:atom="http://www.w3.org/2005/Atom" xmlns:podcast="https://podcastindex.org/namespace/1.0"{namespaces}>
     <channel>
         <title>Youth Lens Today</title>
         <description>A podcast exploring current events and youth perspectives</description>
         <language>en-us</language>
         <link>https://youthlenstoday.github.io/podcast/</link>
-        <atom:link href="https://youthlenstoday.github.io/podcast/rss.xml" rel="self" type="application/rss+xml"/>
-        <itunes:author>Nathan Goldberg, Jonah Herman</itunes:author>
+{links}        <itunes:author>Nathan Goldberg, Jonah Herman</itunes:author>
         <itunes:explicit>no</itunes:explicit>
         <itunes:category text="News"/>
         <itunes:category text="Politics"/>
@@ -45,47 +52,239 @@ def generate_rss():
             <title>Youth Lens Today</title>
             <link>https://youthlenstoday.github.io/podcast/</link>
         </image>
-        {items}
-    </channel>
+'''
+RSS_FOOTER = '''    </channel>
 </rss>'''
+
+
+def format_rfc822_date(dt):
+    """Format datetime to RFC 822 format for RSS"""
+    return dt.strftime('%a, %d %b %Y %H:%M:%S %z')
+
+
+def format_duration(seconds):
+    """Format seconds as HH:MM:SS for itunes:duration"""
+    seconds = int(round(seconds or 0))
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def render_alternate(rendition, default=False):
+    """podcast:alternateEnclosure for one of an episode's renditions (or, as the
+    default, the episode file itself)"""
+    url = f"{BASE_URL}/{EPISODES_DIR}/{rendition['filename']}"
+    attributes = f' bitrate="{rendition["bitrate"]}"' if rendition.get('bitrate') else ''
+    attributes += f' codecs="{rendition["codec"]}"' if rendition.get('codec') == 'opus' else ''
+    attributes += ' default="true"' if default else ''
+    return (f'            <podcast:alternateEnclosure type={quoteattr(rendition["type"])} '
+            f'length="{rendition["size"]}" title={quoteattr(rendition["name"])}{attributes}>\n'
+            f'                <podcast:source uri={quoteattr(url)}/>\n'
+            f'            </podcast:alternateEnclosure>\n')
+
+
+def render_item(episode):
+    """RSS <item> for one manifest entry"""
+    url = f"{BASE_URL}/{EPISODES_DIR}/{episode['filename']}"
+    published = datetime.fromisoformat(episode['published'])
+    alternates = ''
+    if episode.get('renditions'):
+        original = {'filename': episode['filename'], 'type': 'audio/mpeg', 'size': episode['size'], 'name': 'original'}
+        alternates = render_alternate(original, default=True) + ''.join(
+            render_alternate(rendition) for rendition in episode['renditions'])
+    return f'''        <item>
+            <title>{escape(episode['title'])}</title>
+            <description>Episode of Youth Lens Today podcast</description>
+            <pubDate>{format_rfc822_date(published)}</pubDate>
+            <guid>{escape(episode['guid'])}</guid>
+            <enclosure url={quoteattr(url)} length="{episode['size']}" type="audio/mpeg"/>
+{alternates}            <itunes:duration>{format_duration(episode.get('duration'))}</itunes:duration>
+        </item>
+'''
+
+
+def page_file(page):
+    """Filename of a feed page (1 is the main feed)"""
+    return RSS_FILE if page == 1 else f"rss-{page}.xml"
+
+
+def page_links(page, archives):
+    """atom:link elements for a page: self plus RFC 5005 archive links.
+
+    The main feed links back to the newest archive page and each archive page
+    to the one before it; there are no forward links, so a full archive page
+    never changes.
+    """
+    links = [('self', page)]
+    if page > 1:
+        links.append(('current', 1))
+    previous = archives + 1 if page == 1 else page - 1
+    if previous > 1:
+        links.append(('prev-archive', previous))
+    return ''.join(
+        f'        <atom:link href="{BASE_URL}/{page_file(target)}" rel="{rel}" type="application/rss+xml"/>\n'
+        for rel, target in links)
+
+
+def load_etags(path=ETAG_FILE):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_etags(etags, path=ETAG_FILE):
+    partial = f"{path}.tmp"
+    with open(partial, 'w', encoding='utf-8') as f:
+        json.dump(etags, f, indent=2, sort_keys=True)
+        f.write('\n')
+    os.replace(partial, path)
+
+
+def write_compressed(path, data):
+    """Write .gz (and .br if brotli is installed) siblings of a feed file"""
+    # mtime=0 keeps the gzip bytes identical for identical feeds
+    targets = [(f"{path}.gz", lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli:
+        targets.append((f"{path}.br", lambda: brotli.compress(data, quality=11)))
+    for target, compress in targets:
+        partial = f"{target}.tmp"
+        with open(partial, 'wb') as f:
+            f.write(compress())
+        os.replace(partial, target)
+
+
+def write_feed(episodes, path=RSS_FILE, links=None, etag=None, archive=False):
+    """Stream a feed page to a temp file and atomically rename it into place.
+
+    An archive page (every page but the main feed) is marked <fh:archive/>.
+
+    The content hash is computed while writing; if it equals etag (the hash
+    of what's already on disk) the temp file is dropped and nothing changes.
+    Returns the new hash, or None if the page was unchanged.
+    """
+    if links is None:
+        links = page_links(1, 0)
+    digest = hashlib.sha256()
+    partial = f"{path}.tmp"
+    with open(partial, 'wb') as f:
+        def write(text):
+            data = text.encode('utf-8')
+            digest.update(data)
+            f.write(data)
+        if archive:
+            write(RSS_HEADER.format(namespaces=f' xmlns:fh="{FH_NAMESPACE}"', links=f"{links}        <fh:archive/>\n"))
+        else:
+            write(RSS_HEADER.format(namespaces='', links=links))
+        for episode in episodes:
+            write(render_item(episode))
+        write(RSS_FOOTER)
+        f.flush()
+        os.fsync(f.fileno())
+
+    if digest.hexdigest() == etag and os.path.exists(path):
+        os.remove(partial)
+        if not os.path.exists(f"{path}.gz"):
+            with open(path, 'rb') as f:
+                write_compressed(path, f.read())
+        return None
+    os.replace(partial, path)
+    with open(path, 'rb') as f:
+        write_compressed(path, f.read())
+    return digest.hexdigest()
+
+
+def write_feeds(episodes, page_size):
+    """Write the main feed (newest page_size episodes) and the archive pages.
+
+    Archive pages are filled from the oldest episode: rss-2.xml holds the
+    oldest page_size, rss-3.xml the next, and so on, so publishing only
+    changes the main feed and the newest archive page. Returns the filenames
+    that changed; unchanged pages aren't rewritten, so a rebuild with nothing
+    new leaves the tree untouched.
+    """
+    older = episodes[page_size:][::-1]
+    archives = -(-len(older) // page_size)
+    pages = archives + 1
+    etags = load_etags()
+    changed = []
+    for page in range(1, pages + 1):
+        path = page_file(page)
+        if page == 1:
+            items = episodes[:page_size]
+        else:
+            items = older[(page - 2) * page_size:(page - 1) * page_size][::-1]
+        etag = write_feed(items, path, page_links(page, archives), etags.get(path), archive=page > 1)
+        if etag:
+            etags[path] = etag
+            changed.append(path)
+
+    # Drop pages left over from a larger archive
+    for path in glob.glob('rss-*.xml'):
+        match = PAGE_FILE.match(os.path.basename(path))
+        if match and int(match.group(1)) > pages:
+            for stale in (path, f"{path}.gz", f"{path}.br"):
+                if os.path.exists(stale):
+                    os.remove(stale)
+            etags.pop(path, None)
+            changed.append(path)
+
+    if changed:
+        save_etags(etags)
+    return changed
+
+
+def generate_rss(profile=False):
+    """Generate RSS feed from the episode manifest, recording its stage metrics.
+
+    Returns update_feed()'s result with the stage's seconds added.
+    """
+    metrics = Metrics('rss', directory=get_setting('METRICS_DIR', 'metrics'), profile=profile)
+    try:
+        with metrics.stage('rss') as record, publish_lock():
+            result = update_feed()
+    finally:
+        metrics.flush()
+    result['seconds'] = record['seconds']
+    return result
+
+def update_feed():
+    """Bring the feed pages up to date with the manifest.
+
+    Returns episodes (in the feed), added (found in episodes/ but not yet in
+    the manifest) and changed (the page files rewritten or removed).
+    """
     
-    # Find all MP3 files in episodes directory
-    mp3_files = glob.glob('episodes/*.mp3')
+    # Read the manifest, adding any MP3s dropped into episodes/ by hand and
+    # filling in durations for entries recorded without one
+    episodes = load_manifest()
+    durations = DurationCache()
+    added = sync_with_directory(episodes, durations=durations)
+    if added:
+        print(f"Added {len(added)} new episodes to the manifest")
+    filled = fill_durations(episodes, durations)
+    if filled:
+        print(f"Read durations for {filled} episodes")
+    durations.save()
     
-    if not mp3_files:
+    result = {'status': 'ok', 'episodes': len(episodes), 'added': len(added), 'changed': []}
+    if not episodes:
         print("No MP3 files found in episodes/ directory")
-        return
-    
-    # Sort files by modification time (newest first)
-    mp3_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-    
-    items = []
-    for mp3_file in mp3_files:
-        filename = os.path.basename(mp3_file)
-        episode_name = os.path.splitext(filename)[0]
-        file_info = get_file_info(mp3_file)
-        
-        # Create episode item
-        item = f'''        <item>
-            <title>{episode_name}</title>
-            <description>Episode of Youth Lens Today podcast</description>
-            <pubDate>{format_rfc822_date(file_info['mtime'])}</pubDate>
-            <guid>https://youthlenstoday.github.io/podcast/episodes/{filename}</guid>
-            <enclosure url="https://youthlenstoday.github.io/podcast/episodes/{filename}" length="{file_info['size']}" type="audio/mpeg"/>
-            <itunes:duration>00:00:00</itunes:duration>
-        </item>'''
-        items.append(item)
-    
-    # Generate RSS content
-    items_content = '\n'.join(items)
-    rss_content = rss_template.format(items=items_content)
+        return result
     
-    # Write RSS file
-    with open('rss.xml', 'w', encoding='utf-8') as f:
-        f.write(rss_content)
+    # Newest first, in pages of FEED_PAGE_SIZE
+    episodes.sort(key=lambda episode: episode['published'], reverse=True)
+    page_size = int(get_setting('FEED_PAGE_SIZE', 50, cast=int))
+    changed = write_feeds(episodes, page_size)
+    count(episodes=len(episodes), pages_written=len(changed),
+          bytes_written=sum(os.path.getsize(path) for path in changed if os.path.exists(path)))
     
-    print(f"Generated RSS feed with {len(items)} episodes")
+    result['changed'] = changed
+    if not changed:
+        print(f"RSS feed unchanged ({len(episodes)} episodes)")
+        return result
+    print(f"Generated RSS feed with {len(episodes)} episodes ({len(changed)} pages updated)")
     print("RSS URL: https://youthlenstoday.github.io/podcast/rss.xml")
+    return result
 
 if __name__ == '__main__':
-    generate_rss() 
\ No newline at end of file
+    sys.exit(0 if generate_rss(profile='--profile' in sys.argv)['status'] == 'ok' else 1) 
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""
+Shared HTTP transport for OpenAI and ElevenLabs calls
+One pooled keep-alive session with per-call timeouts, retries with jittered
+exponential backoff (honoring Retry-After) and an overall deadline
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Raised when a request can't finish before the episode deadline"""
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class Transport:
+    """Pooled, retrying HTTP client shared by every API call in a run"""
+
+    def __init__(self, connect_timeout=10, read_timeout=120, max_retries=4,
+                 backoff=1.0, backoff_max=60, pool_size=16):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+
+        # urllib3 keeps one keep-alive pool per host under the adapter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._retries = 0
+        self._lock = threading.Lock()
+
+    @property
+    def retries(self):
+        """Total retries performed by this transport"""
+        return self._retries
+
+    def _timeout(self, timeout, deadline):
+        """(connect, read) timeout for one attempt, capped by the deadline"""
+        connect, read = timeout or (self.connect_timeout, self.read_timeout)
+        if deadline is None:
+            return connect, read
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("episode deadline exceeded")
+        return min(connect, remaining), min(read, remaining)
+
+    def _delay(self, attempt, response=None):
+        """Full-jitter exponential backoff, or the server's Retry-After if given"""
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+
+    def _sleep(self, delay, deadline):
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            raise DeadlineExceeded("episode deadline would pass while backing off")
+        with self._lock:
+            self._retries += 1
+        metrics.count(retries=1)
+        time.sleep(delay)
+
+    def request(self, method, url, timeout=None, deadline=None, retry_statuses=RETRY_STATUSES, **kwargs):
+        """Send a request, retrying transient failures.
+
+        timeout is a (connect, read) tuple overriding the defaults; deadline
+        is a time.monotonic() value after which no attempt is started;
+        retry_statuses lets a caller handle some statuses itself. The final
+        response is returned even if its status is an error, so callers keep
+        using raise_for_status().
+        """
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(
+                    method, url, timeout=self._timeout(timeout, deadline), **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if isinstance(e, DeadlineExceeded) or attempt >= self.max_retries:
+                    raise
+                self._sleep(self._delay(attempt), deadline)
+                attempt += 1
+                continue
+
+            if response.status_code not in retry_statuses or attempt >= self.max_retries:
+                return response
+
+            delay = self._delay(attempt, response)
+            response.close()
+            self._sleep(delay, deadline)
+            attempt += 1
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def close(self):
+        self.session.close()
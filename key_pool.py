@@ -0,0 +1,245 @@
+"""
+ElevenLabs API key pool
+Spreads text-to-speech requests over any number of API keys, each with its
+own concurrency limit and requests-per-second token bucket, tracks the
+characters each key has left, and routes around keys that are throttled,
+out of quota or invalid
+"""
+
+import json
+import threading
+import time
+
+from http_transport import DeadlineExceeded, parse_retry_after
+
+
+class NoKeyAvailable(RuntimeError):
+    """No key in the pool can serve a request (all invalid, exhausted or lacking the voice)"""
+
+
+def parse_keys(value):
+    """Key entries from a setting: a list, JSON, or comma-separated keys"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.strip()
+        value = json.loads(value) if value.startswith('[') else [key for key in value.split(',') if key.strip()]
+    return [{'key': entry.strip()} if isinstance(entry, str) else dict(entry) for entry in value]
+
+
+def _error_status(response):
+    """ElevenLabs' machine-readable error status (e.g. "quota_exceeded"), if any"""
+    try:
+        body = response.json()
+    except ValueError:
+        return None
+    detail = body.get('detail') if isinstance(body, dict) else None
+    if isinstance(detail, dict):
+        return detail.get('status')
+    return None
+
+
+class ApiKey:
+    """One API key's limits and state"""
+
+    def __init__(self, key, concurrency=2, rate=2.0, voices=None, characters=None):
+        self.key = key
+        self.name = f"…{key[-4:]}" if len(key) > 4 else key
+        self.concurrency = concurrency
+        self.rate = rate
+        self.voices = set(voices) if voices else None
+        self.remaining = characters
+        self.in_flight = 0
+        self.tokens = float(max(1, concurrency))
+        self.refilled = time.monotonic()
+        self.cooldown_until = 0.0
+        self.failures = 0
+        self.disabled = None
+        self.unsupported_voices = set()
+        self.requests = 0
+        self.characters = 0
+
+    def _refill(self, now):
+        if self.rate:
+            self.tokens = min(max(1, self.concurrency), self.tokens + (now - self.refilled) * self.rate)
+        else:
+            self.tokens = float(max(1, self.concurrency))
+        self.refilled = now
+
+    def can_serve(self, voice_id, characters):
+        """Whether this key could ever take the request (ignoring momentary limits)"""
+        if self.disabled or voice_id in self.unsupported_voices:
+            return False
+        if self.voices is not None and voice_id not in self.voices:
+            return False
+        return self.remaining is None or self.remaining >= characters
+
+    def wait_time(self, now):
+        """Seconds until the key can start a request (0 if it can now)"""
+        self._refill(now)
+        if self.in_flight >= self.concurrency:
+            return None
+        waits = [self.cooldown_until - now]
+        if self.tokens < 1:
+            waits.append((1 - self.tokens) / self.rate)
+        return max(0.0, *waits)
+
+
+class KeyPool:
+    """Routes requests to whichever usable key has capacity.
+
+    acquire() blocks until a key has a free concurrency slot and a rate
+    token, preferring the given key, then the one with the most room;
+    release() hands the slot back. succeeded() and failed() update quota and
+    health from each response.
+    """
+
+    def __init__(self, keys, concurrency=2, rate=2.0):
+        self.keys = []
+        seen = set()
+        for entry in keys:
+            if entry['key'] in seen:
+                continue
+            seen.add(entry['key'])
+            self.keys.append(ApiKey(entry['key'],
+                                    concurrency=int(entry.get('concurrency', concurrency)),
+                                    rate=float(entry.get('rate', rate)),
+                                    voices=entry.get('voices'),
+                                    characters=entry.get('characters')))
+        if not self.keys:
+            raise ValueError("At least one ElevenLabs API key is required")
+        self._condition = threading.Condition()
+
+    def capacity(self):
+        """Requests the usable keys can run at once"""
+        with self._condition:
+            return sum(key.concurrency for key in self.keys if not key.disabled) or 1
+
+    def acquire(self, voice_id, characters, prefer=None, deadline=None):
+        """Reserve a slot on a key that can render characters of voice_id"""
+        with self._condition:
+            while True:
+                usable = [key for key in self.keys if key.can_serve(voice_id, characters)]
+                if not usable:
+                    raise NoKeyAvailable(f"no ElevenLabs key can render {characters} characters of voice {voice_id}: "
+                                         + ', '.join(f"{key.name} {self._state(key)}" for key in self.keys))
+                now = time.monotonic()
+                ready, wait = [], None
+                for key in usable:
+                    delay = key.wait_time(now)
+                    if delay == 0:
+                        ready.append(key)
+                    elif delay is not None:
+                        wait = delay if wait is None else min(wait, delay)
+                if ready:
+                    key = next((key for key in ready if key.key == prefer), None) or max(
+                        ready, key=lambda key: (key.concurrency - key.in_flight,
+                                                float('inf') if key.remaining is None else key.remaining))
+                    key.in_flight += 1
+                    key.tokens -= 1
+                    return key
+
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise DeadlineExceeded("episode deadline exceeded waiting for an ElevenLabs key")
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._condition.wait(wait)
+
+    def release(self, key):
+        with self._condition:
+            key.in_flight -= 1
+            self._condition.notify_all()
+
+    def succeeded(self, key, characters, headers=None):
+        """Record a finished request, charging the key the characters billed"""
+        cost = characters
+        if headers is not None:
+            try:
+                cost = int(headers.get('character-cost', characters))
+            except (TypeError, ValueError):
+                pass
+        with self._condition:
+            key.requests += 1
+            key.characters += cost
+            key.failures = 0
+            if key.remaining is not None:
+                key.remaining = max(0, key.remaining - cost)
+
+    def failed(self, key, response, voice_id):
+        """Update a key after an error response.
+
+        Returns a short reason if another attempt (on this or another key) is
+        worthwhile, or None if the request itself is at fault.
+        """
+        status = response.status_code
+        error = _error_status(response)
+        with self._condition:
+            if error in ('quota_exceeded', 'insufficient_quota'):
+                key.remaining = 0
+                key.disabled = 'out of quota'
+                reason = key.disabled
+            elif status == 401:
+                key.disabled = 'invalid key'
+                reason = key.disabled
+            elif status == 429:
+                key.failures += 1
+                if error == 'too_many_concurrent_requests':
+                    # The account allows fewer parallel requests than configured
+                    key.concurrency = max(1, key.in_flight - 1)
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                backoff = retry_after if retry_after is not None else min(30.0, 2.0 ** key.failures)
+                key.cooldown_until = time.monotonic() + backoff
+                reason = f"throttled ({error or 429}), cooling down {backoff:.1f}s"
+            elif status in (400, 404) and error in ('voice_not_found', 'voice_does_not_exist'):
+                key.unsupported_voices.add(voice_id)
+                reason = f"voice {voice_id} not available on this key"
+            else:
+                reason = None
+            self._condition.notify_all()
+        return reason
+
+    def refresh_quota(self, transport, base_url):
+        """Read each key's remaining characters from the subscription endpoint.
+
+        Keys whose subscription can't be read keep their current estimate:
+        a key limited to text-to-speech gets a 401 here, so only an
+        invalid_api_key error disables it.
+        """
+        for key in self.keys:
+            if key.disabled:
+                continue
+            try:
+                response = transport.get(f"{base_url}/user/subscription", headers={"xi-api-key": key.key},
+                                         deadline=time.monotonic() + 15)
+                if response.status_code == 401 and _error_status(response) == 'invalid_api_key':
+                    with self._condition:
+                        key.disabled = 'invalid key'
+                        self._condition.notify_all()
+                    continue
+                response.raise_for_status()
+                subscription = response.json()
+                remaining = subscription['character_limit'] - subscription['character_count']
+            except Exception:
+                continue
+            with self._condition:
+                key.remaining = max(0, remaining)
+
+    def _state(self, key):
+        if key.disabled:
+            return key.disabled
+        if key.remaining is not None:
+            return f"{key.remaining} characters left"
+        return "ok"
+
+    def stats(self):
+        """Per-key requests, characters used and characters left"""
+        with self._condition:
+            return [{
+                'key': key.name,
+                'requests': key.requests,
+                'characters': key.characters,
+                'remaining': key.remaining,
+                'concurrency': key.concurrency,
+                'disabled': key.disabled,
+            } for key in self.keys]
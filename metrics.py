@@ -0,0 +1,213 @@
+"""
+Stage instrumentation for Youth Lens Today
+Records wall time, retries, tokens, TTS characters, bytes downloaded and peak
+RSS for each pipeline stage, written as JSON lines and a Prometheus textfile,
+with optional cProfile and tracemalloc dumps per stage
+"""
+
+import cProfile
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from pipeline_state import atomic_write
+
+METRICS_DIR = 'metrics'
+STAGES_FILE = 'stages.jsonl'
+
+# Counters every stage record starts with; count() may add others
+COUNTERS = ('retries', 'prompt_tokens', 'completion_tokens', 'tts_characters', 'bytes_downloaded')
+_counted = set(COUNTERS)
+
+# Stages running on each thread, innermost last, as (record, profiler)
+_local = threading.local()
+_append_lock = threading.Lock()
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes (None where unavailable)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def count(**amounts):
+    """Add to the counters of the innermost stage running on this thread.
+
+    Does nothing outside a stage, so instrumented code also works without one.
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        _counted.update(amounts)
+        record = stack[-1][0]
+        for name, amount in amounts.items():
+            record[name] = record.get(name, 0) + amount
+
+
+def timed(name, labels=None):
+    """Decorator running a method as a stage of self.metrics.
+
+    labels(*args, **kwargs) returns extra fields for the record. A method
+    returning None or False (the usual way of reporting failure here) marks
+    the stage failed.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.stage(name, **(labels(*args, **kwargs) if labels else {})) as record:
+                result = method(self, *args, **kwargs)
+                if result is None or result is False:
+                    record.setdefault('error', 'failed')
+                return result
+        return wrapper
+    return decorator
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+class Metrics:
+    """Stage records for one component (generate, rss) and where they're written.
+
+    With profile set, each stage also gets a cProfile dump and a tracemalloc
+    snapshot under METRICS_DIR/profile/. A stage's profile excludes the
+    stages nested in it on the same thread.
+    """
+
+    def __init__(self, component, directory=METRICS_DIR, profile=False):
+        self.component = component
+        self.directory = directory
+        self.profile = profile
+        self.run_id = None
+        self.records = []
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._written = 0
+        if profile and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name, **labels):
+        """Time a stage; yields its record so callers can add details.
+
+        Setting record['error'] marks a stage failed that handled its own
+        exception; an exception escaping the block does the same.
+        """
+        record = {
+            'component': self.component,
+            'run_id': self.run_id,
+            'stage': name,
+            **labels,
+            'started': datetime.now().isoformat(timespec='milliseconds'),
+            **{counter: 0 for counter in COUNTERS},
+        }
+        stack = _local.__dict__.setdefault('stack', [])
+        profiler = None
+        if self.profile:
+            # Only one profiler can run per thread: pause the enclosing one
+            if stack and stack[-1][1]:
+                stack[-1][1].disable()
+            profiler = cProfile.Profile()
+            profiler.enable()
+        stack.append((record, profiler))
+        started = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record['error'] = str(e) or type(e).__name__
+            raise
+        finally:
+            record['seconds'] = round(time.perf_counter() - started, 4)
+            stack.pop()
+            if profiler:
+                profiler.disable()
+                if stack and stack[-1][1]:
+                    stack[-1][1].enable()
+            record['status'] = 'error' if 'error' in record else 'ok'
+            record['peak_rss_bytes'] = peak_rss()
+            with self._lock:
+                self._sequence += 1
+                record['sequence'] = self._sequence
+                self.records.append(record)
+            if profiler:
+                self._dump_profile(record, profiler)
+
+    def _dump_profile(self, record, profiler):
+        """Write the stage's cProfile stats and a tracemalloc snapshot"""
+        directory = os.path.join(self.directory, 'profile', record['run_id'] or self.component)
+        os.makedirs(directory, exist_ok=True)
+        labels = [str(value) for key, value in record.items()
+                  if key in ('segment', 'host', 'chunk')]
+        base = re.sub(r'[^\w.-]+', '_', '_'.join([f"{record['sequence']:04d}", record['stage']] + labels))
+        profiler.dump_stats(os.path.join(directory, f"{base}.prof"))
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            record['traced_bytes'], record['traced_peak_bytes'] = current, peak
+            tracemalloc.take_snapshot().dump(os.path.join(directory, f"{base}.tracemalloc"))
+
+    def totals(self):
+        """Per-stage sums of calls, errors, seconds and counters"""
+        totals = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            total = totals.setdefault(record['stage'], {'calls': 0, 'errors': 0, 'seconds': 0.0})
+            total['calls'] += 1
+            total['errors'] += record['status'] == 'error'
+            total['seconds'] += record['seconds']
+            for name, value in record.items():
+                if name in _counted:
+                    total[name] = total.get(name, 0) + value
+        return totals
+
+    def prometheus(self):
+        """The totals in Prometheus text exposition format"""
+        totals = self.totals()
+        lines = []
+        metrics = ['calls', 'errors', 'seconds'] + sorted({name for total in totals.values() for name in total} -
+                                                         {'calls', 'errors', 'seconds'})
+        for name in metrics:
+            metric = f"podcast_stage_{name}"
+            lines.append(f"# HELP {metric} Stage {name.replace('_', ' ')} in the last {self.component} run")
+            lines.append(f"# TYPE {metric} gauge")
+            for stage, total in sorted(totals.items()):
+                lines.append(f'{metric}{{component="{_label(self.component)}",stage="{_label(stage)}"}} '
+                             f'{total.get(name, 0)}')
+        rss = peak_rss()
+        if rss is not None:
+            lines.append("# HELP podcast_peak_rss_bytes Peak resident set size of the last run")
+            lines.append("# TYPE podcast_peak_rss_bytes gauge")
+            lines.append(f'podcast_peak_rss_bytes{{component="{_label(self.component)}"}} {rss}')
+        lines.append("# HELP podcast_last_run_timestamp_seconds When the last run finished")
+        lines.append("# TYPE podcast_last_run_timestamp_seconds gauge")
+        lines.append(f'podcast_last_run_timestamp_seconds{{component="{_label(self.component)}"}} {time.time():.0f}')
+        return '\n'.join(lines) + '\n'
+
+    def flush(self):
+        """Append the stage records to stages.jsonl and rewrite podcast_<component>.prom"""
+        with self._lock:
+            records = self.records[self._written:]
+            self._written = len(self.records)
+        for record in records:
+            record['run_id'] = record['run_id'] or self.run_id
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with _append_lock, open(os.path.join(self.directory, STAGES_FILE), 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(record) + '\n' for record in records))
+            atomic_write(os.path.join(self.directory, f"podcast_{self.component}.prom"), self.prometheus())
+        except OSError as e:
+            print(f"⚠️  Warning: could not write metrics: {e}")
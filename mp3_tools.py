@@ -0,0 +1,276 @@
+"""
+MP3 frame tools for Youth Lens Today
+Parses MPEG audio (Layer III) frame headers so parts from ElevenLabs can be
+joined frame by frame, without decoding, and given a correct Xing header
+"""
+
+import mmap
+import os
+import struct
+from array import array
+
+MPEG1, MPEG2, MPEG25 = 3, 2, 0
+LAYER3 = 1
+MONO = 3
+
+BITRATES = {
+    MPEG1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    MPEG2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+BITRATES[MPEG25] = BITRATES[MPEG2]
+
+SAMPLE_RATES = {
+    MPEG1: [44100, 48000, 32000],
+    MPEG2: [22050, 24000, 16000],
+    MPEG25: [11025, 12000, 8000],
+}
+
+XING_FRAMES, XING_BYTES, XING_TOC = 0x1, 0x2, 0x4
+
+
+class Mp3FormatMismatch(ValueError):
+    """Parts differ in MPEG version, sample rate or channels and can't be joined frame by frame"""
+
+
+def parse_header(data, offset):
+    """Decode the 4-byte frame header at offset, or None if it isn't a valid Layer III header"""
+    if offset + 4 > len(data):
+        return None
+    b0, b1, b2, b3 = data[offset], data[offset + 1], data[offset + 2], data[offset + 3]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version = (b1 >> 3) & 3
+    layer = (b1 >> 1) & 3
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 3
+    if version == 1 or layer != LAYER3 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    bitrate = BITRATES[version][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 1
+    coefficient = 144 if version == MPEG1 else 72
+    return {
+        'version': version,
+        'bitrate_index': bitrate_index,
+        'bitrate': bitrate,
+        'rate_index': rate_index,
+        'sample_rate': sample_rate,
+        'channel_mode': b3 >> 6,
+        'mode_byte': b3,
+        'length': coefficient * bitrate // sample_rate + padding,
+        'samples': 1152 if version == MPEG1 else 576,
+    }
+
+
+def side_info_size(header):
+    """Bytes of side information after the header, where a Xing tag begins"""
+    if header['version'] == MPEG1:
+        return 17 if header['channel_mode'] == MONO else 32
+    return 9 if header['channel_mode'] == MONO else 17
+
+
+def id3v2_size(data):
+    """Length of an ID3v2 tag at the start of data (0 if there isn't one)"""
+    if len(data) < 10 or data[:3] != b'ID3':
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def find_first_frame(data, start=0):
+    """Offset and header of the first frame followed by a matching frame"""
+    offset = data.find(b'\xff', start)
+    while offset != -1:
+        header = parse_header(data, offset)
+        if header:
+            following = parse_header(data, offset + header['length'])
+            if offset + header['length'] == len(data) or (
+                    following and following['version'] == header['version']
+                    and following['sample_rate'] == header['sample_rate']):
+                return offset, header
+        offset = data.find(b'\xff', offset + 1)
+    return None, None
+
+
+def vbr_header(data, offset, header):
+    """Parse a Xing/Info or VBRI header in the frame at offset.
+
+    Returns a dict with 'tag' and, when present, 'frames' and 'bytes'; None if
+    the frame is ordinary audio.
+    """
+    xing = offset + 4 + side_info_size(header)
+    tag = bytes(data[xing:xing + 4])
+    if tag in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', data[xing + 4:xing + 8])[0]
+        info = {'tag': tag.decode()}
+        position = xing + 8
+        if flags & XING_FRAMES:
+            info['frames'] = struct.unpack('>I', data[position:position + 4])[0]
+            position += 4
+        if flags & XING_BYTES:
+            info['bytes'] = struct.unpack('>I', data[position:position + 4])[0]
+        return info
+
+    vbri = offset + 4 + 32
+    if bytes(data[vbri:vbri + 4]) == b'VBRI':
+        audio_bytes, frames = struct.unpack('>II', data[vbri + 10:vbri + 18])
+        return {'tag': 'VBRI', 'frames': frames, 'bytes': audio_bytes}
+    return None
+
+
+def scan_frames(data):
+    """Walk the audio frames of an MP3 without decoding.
+
+    Returns a dict with the byte range holding the audio frames (start, end;
+    ID3 tags and any Xing/Info/VBRI frame excluded), each frame's offset
+    relative to start, the first audio frame's header, the set of bitrates
+    seen and the VBR header if there was one. Raises ValueError if no frames
+    are found.
+    """
+    first, header = find_first_frame(data, id3v2_size(data))
+    if first is None:
+        raise ValueError("no MPEG Layer III frames found")
+
+    vbr = vbr_header(data, first, header)
+    if vbr:
+        first, header = first + header['length'], parse_header(data, first + header['length'])
+        if header is None:
+            raise ValueError("no audio frames after the VBR header")
+
+    offsets = array('Q')
+    bitrates = set()
+    offset = first
+    limit = len(data)
+    while offset < limit:
+        frame = parse_header(data, offset)
+        if frame is None or frame['version'] != header['version'] \
+                or frame['sample_rate'] != header['sample_rate'] or offset + frame['length'] > limit:
+            break
+        offsets.append(offset - first)
+        bitrates.add(frame['bitrate_index'])
+        offset += frame['length']
+
+    return {
+        'start': first,
+        'end': offset,
+        'offsets': offsets,
+        'header': header,
+        'bitrates': bitrates,
+        'vbr_header': vbr,
+    }
+
+
+def _stream_key(header):
+    """Parameters that must match for frames to be appended to one stream"""
+    return header['version'], header['sample_rate'], header['channel_mode'] == MONO
+
+
+def _xing_frame(header, frames, total_bytes, frame_offsets, vbr):
+    """Build a Xing (VBR) or Info (CBR) frame describing the joined stream"""
+    needed = 4 + side_info_size(header) + 4 + 4 + 4 + 4 + 100
+    coefficient = 144 if header['version'] == MPEG1 else 72
+    # Start from the audio's own bitrate and step up until the tag fits
+    for bitrate_index in range(header['bitrate_index'], 15):
+        length = coefficient * BITRATES[header['version']][bitrate_index] * 1000 // header['sample_rate']
+        if length >= needed:
+            break
+
+    total = total_bytes + length
+    toc = bytearray(100)
+    if frames:
+        for percent in range(100):
+            frame_offset = frame_offsets[min(frames - 1, percent * frames // 100)]
+            toc[percent] = min(255, (length + frame_offset) * 256 // total)
+
+    b1 = 0xE0 | (header['version'] << 3) | (LAYER3 << 1) | 1
+    b2 = (bitrate_index << 4) | (header['rate_index'] << 2)
+    frame = bytearray(length)
+    frame[0:4] = bytes([0xFF, b1, b2, header['mode_byte']])
+    position = 4 + side_info_size(header)
+    frame[position:position + 4] = b'Xing' if vbr else b'Info'
+    frame[position + 4:position + 16] = struct.pack('>III', XING_FRAMES | XING_BYTES | XING_TOC, frames, total)
+    frame[position + 16:position + 116] = toc
+    return bytes(frame)
+
+
+def join_mp3(input_files, output_file):
+    """Concatenate MP3 files frame by frame into output_file.
+
+    Each part's ID3 tags and Xing/Info/VBRI frame are dropped, its audio frames
+    are copied as one slice straight from an mmap, and a Xing header for the
+    whole result is written first. Raises Mp3FormatMismatch if the parts'
+    MPEG version, sample rate or channel count differ, ValueError if a part
+    isn't an MP3. Returns the number of audio frames written.
+    """
+    handles = []
+    try:
+        parts = []
+        for path in input_files:
+            f = open(path, 'rb')
+            handles.append(f)
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b''
+            handles.append(data)
+            parts.append((data, scan_frames(data)))
+
+        keys = {_stream_key(scan['header']) for _, scan in parts}
+        if len(keys) > 1:
+            raise Mp3FormatMismatch(f"parts have different stream parameters: {sorted(keys)}")
+
+        # Frame offsets across the whole joined stream, for the Xing TOC
+        all_offsets = array('Q')
+        position = 0
+        bitrates = set()
+        for _, scan in parts:
+            all_offsets.extend(offset + position for offset in scan['offsets'])
+            position += scan['end'] - scan['start']
+            bitrates |= scan['bitrates']
+
+        header = parts[0][1]['header']
+        xing = _xing_frame(header, len(all_offsets), position, all_offsets, vbr=len(bitrates) > 1)
+
+        partial = f"{output_file}.part"
+        with open(partial, 'wb') as out:
+            out.write(xing)
+            for data, scan in parts:
+                with memoryview(data) as view:
+                    out.write(view[scan['start']:scan['end']])
+        os.replace(partial, output_file)
+        return len(all_offsets)
+    finally:
+        for handle in reversed(handles):
+            if hasattr(handle, 'close'):
+                handle.close()
+
+
+def audio_range(data):
+    """(start, end) of the audio frames in MP3 bytes, or None if it isn't an MP3"""
+    try:
+        scan = scan_frames(data)
+    except ValueError:
+        return None
+    return scan['start'], scan['end']
+
+
+def mp3_duration(path):
+    """Duration of an MP3 in seconds, read from headers only.
+
+    Uses the frame count in a Xing/Info or VBRI header when there is one,
+    otherwise walks the frame headers. Nothing is decoded.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("empty file")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            first, header = find_first_frame(data, id3v2_size(data))
+            if first is None:
+                raise ValueError("no MPEG Layer III frames found")
+
+            vbr = vbr_header(data, first, header)
+            if vbr and vbr.get('frames'):
+                return vbr['frames'] * header['samples'] / header['sample_rate']
+
+            scan = scan_frames(data)
+            return len(scan['offsets']) * scan['header']['samples'] / scan['header']['sample_rate']
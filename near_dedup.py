@@ -0,0 +1,139 @@
+"""
+Near-duplicate sentence suppression
+Word shingles, MinHash signatures and LSH buckets find sentences that repeat
+an earlier one with small wording changes, in roughly linear time
+"""
+
+import hashlib
+import random
+import re
+
+MERSENNE_PRIME = (1 << 61) - 1
+WORD = re.compile(r"[a-z0-9']+")
+
+
+def _shingle_hash(shingle):
+    """Stable 64-bit hash of one shingle"""
+    return int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def shingles(sentence, size=2):
+    """Hashed word n-grams of a sentence (the whole sentence if it's shorter)"""
+    words = WORD.findall(sentence.lower())
+    if len(words) <= size:
+        return {_shingle_hash(' '.join(words))} if words else set()
+    return {_shingle_hash(' '.join(words[i:i + size])) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _integrate(function, low, high, steps=100):
+    width = (high - low) / steps
+    return sum(function(low + (i + 0.5) * width) for i in range(steps)) * width
+
+
+def choose_bands(num_perm, threshold, false_positive_weight=0.2, false_negative_weight=0.8):
+    """(bands, rows) minimizing the weighted LSH false positive/negative area.
+
+    Candidates are verified with an exact Jaccard afterwards, so a false
+    positive only costs one comparison; misses are weighted more heavily.
+    """
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        false_positive = _integrate(lambda s: 1 - (1 - s ** rows) ** bands, 0.0, threshold)
+        false_negative = _integrate(lambda s: (1 - s ** rows) ** bands, threshold, 1.0)
+        error = false_positive_weight * false_positive + false_negative_weight * false_negative
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class NearDuplicateFilter:
+    """Tracks sentences seen so far and flags new ones too similar to them.
+
+    threshold is the Jaccard similarity of word shingles at or above which a
+    sentence counts as a repeat. Sentences from earlier episodes can be loaded
+    with add_history() so they are matched against without being reported.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=128, shingle_size=2, seed=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME))
+                       for _ in range(num_perm)]
+        self._buckets = [{} for _ in range(self.bands)]
+        self._sentences = []  # (sentence, shingle set, source)
+        self._exact = {}
+        self.dropped = []
+
+    def _signature(self, shingle_set):
+        perms = self._perms
+        rows = [[(a * h + b) % MERSENNE_PRIME for a, b in perms] for h in shingle_set]
+        return list(map(min, zip(*rows)))
+
+    def _band_keys(self, signature):
+        rows = self.rows
+        return [tuple(signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    def _match(self, shingle_set, keys):
+        """Best earlier sentence at or above the threshold, as (index, similarity)"""
+        best = None
+        candidates = set()
+        for bucket, key in zip(self._buckets, keys):
+            candidates.update(bucket.get(key, ()))
+        for index in candidates:
+            similarity = jaccard(shingle_set, self._sentences[index][1])
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (index, similarity)
+        return best
+
+    def _index(self, sentence, normalized, shingle_set, keys, source):
+        index = len(self._sentences)
+        self._sentences.append((sentence, shingle_set, source))
+        self._exact.setdefault(normalized, index)
+        for bucket, key in zip(self._buckets, keys):
+            bucket.setdefault(key, []).append(index)
+
+    def check(self, sentence, source=None):
+        """Return True if the sentence is new (and remember it), False if it's a repeat"""
+        normalized = ' '.join(sentence.lower().split())
+        if normalized in self._exact:
+            match = (self._exact[normalized], 1.0)
+        else:
+            shingle_set = shingles(sentence, self.shingle_size)
+            keys = self._band_keys(self._signature(shingle_set)) if shingle_set else []
+            match = self._match(shingle_set, keys)
+
+        if match:
+            index, similarity = match
+            self.dropped.append({
+                'sentence': sentence,
+                'matches': self._sentences[index][0],
+                'matched_source': self._sentences[index][2],
+                'similarity': round(similarity, 3),
+            })
+            return False
+
+        self._index(sentence, normalized, shingle_set, keys, source)
+        return True
+
+    def add_history(self, sentences, source):
+        """Index sentences from earlier episodes without reporting drops"""
+        for sentence in sentences:
+            normalized = ' '.join(sentence.lower().split())
+            shingle_set = shingles(sentence, self.shingle_size)
+            if normalized in self._exact or not shingle_set:
+                continue
+            keys = self._band_keys(self._signature(shingle_set))
+            self._index(sentence, normalized, shingle_set, keys, source)
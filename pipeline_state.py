@@ -0,0 +1,207 @@
+"""
+Checkpointed run directories for podcast generation
+Each run keeps its outline, scripts, cleaned text, audio parts and final mix
+under runs/<run-id>/ with a manifest, so a failed run can be resumed
+"""
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+
+RUNS_DIR = 'runs'
+MANIFEST = 'manifest.json'
+
+# Audio a run writes on the way to the episode: host parts, their chunks,
+# the mix and any partial files
+AUDIO_FILES = ('*.mp3', '*.part')
+
+
+def hash_inputs(*parts):
+    """Stable hash of a stage's inputs (strings, numbers, lists or dicts)"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def atomic_write(path, data):
+    """Write bytes or text to path via a temp file and rename"""
+    mode = 'wb' if isinstance(data, bytes) else 'w'
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, **({} if mode == 'wb' else {'encoding': 'utf-8'})) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def atomic_copy(source, path):
+    """Copy a file to path via a temp file in the same directory, fsync and rename.
+
+    Readers of path see either nothing or the whole file, never a partial copy.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f, open(source, 'rb') as src:
+            shutil.copyfileobj(src, f, 1024 * 1024)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp makes the file private; give it the source's permissions
+        shutil.copymode(source, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def prune_runs(keep, root=RUNS_DIR):
+    """Delete finished runs beyond the newest keep; returns the run ids removed.
+
+    Runs that haven't finished (in progress, or failed and resumable) are
+    left alone.
+    """
+    finished = []
+    for manifest_path in glob.glob(os.path.join(root, '*', MANIFEST)):
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if manifest.get('finished'):
+            finished.append(os.path.basename(os.path.dirname(manifest_path)))
+    removed = sorted(finished)[:-keep] if keep else []
+    for run_id in removed:
+        shutil.rmtree(os.path.join(root, run_id), ignore_errors=True)
+    return removed
+
+
+class RunState:
+    """Work directory and stage manifest for one podcast run"""
+
+    def __init__(self, run_id, root=RUNS_DIR):
+        self.run_id = run_id
+        self.directory = os.path.join(root, run_id)
+        self._lock = threading.Lock()
+        manifest_path = self.path(MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {'run_id': run_id, 'created': datetime.now().isoformat(), 'stages': {}}
+
+    @classmethod
+    def create(cls, root=RUNS_DIR):
+        """Start a new run directory named after the current time.
+
+        Runs started in the same second get a _2, _3, ... suffix; creating the
+        directory claims the name, so concurrent runs never share one.
+        """
+        os.makedirs(root, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        run_id, attempt = stamp, 1
+        while True:
+            try:
+                os.mkdir(os.path.join(root, run_id))
+                break
+            except FileExistsError:
+                attempt += 1
+                run_id = f"{stamp}_{attempt}"
+        run = cls(run_id, root)
+        run._save()
+        return run
+
+    @classmethod
+    def resume(cls, run_id, root=RUNS_DIR):
+        """Open an existing run; raises FileNotFoundError if it doesn't exist"""
+        run = cls(run_id, root)
+        if not os.path.exists(run.path(MANIFEST)):
+            raise FileNotFoundError(f"No run manifest at {run.path(MANIFEST)}")
+        return run
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def completed(self, stage, input_hash):
+        """The stage's recorded outputs if it finished with the same inputs, else None"""
+        with self._lock:
+            record = self.manifest['stages'].get(stage)
+        if not record or record['input_hash'] != input_hash:
+            return None
+        if not all(os.path.exists(self.path(name)) for name in record['outputs']):
+            return None
+        return record
+
+    def stages(self):
+        """Names of the stages finished so far"""
+        with self._lock:
+            return list(self.manifest['stages'])
+
+    def record(self, stage, input_hash, outputs, **details):
+        """Mark a stage finished with the output files it wrote"""
+        with self._lock:
+            self.manifest['stages'][stage] = {
+                'input_hash': input_hash,
+                'outputs': list(outputs),
+                'completed': datetime.now().isoformat(),
+                **details,
+            }
+            self._save()
+
+    def save_inputs(self, inputs):
+        """Record what the run was asked for (e.g. its date, topic and outline)"""
+        with self._lock:
+            if self.manifest.get('inputs') != inputs:
+                self.manifest['inputs'] = inputs
+                self._save()
+
+    def finish(self):
+        """Mark the run finished and delete its intermediate audio; returns the
+        bytes freed. Text checkpoints stay, so later runs can check against them.
+        """
+        freed = 0
+        for pattern in AUDIO_FILES:
+            for path in glob.glob(self.path(pattern)):
+                try:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                    freed += size
+                except OSError:
+                    pass
+        with self._lock:
+            self.manifest['finished'] = datetime.now().isoformat()
+            self._save()
+        return freed
+
+    def _save(self):
+        atomic_write(self.path(MANIFEST), json.dumps(self.manifest, indent=2))
+
+    def write_text(self, name, text):
+        atomic_write(self.path(name), text)
+        return name
+
+    def read_text(self, name):
+        with open(self.path(name), encoding='utf-8') as f:
+            return f.read()
+
+    def text_stage(self, stage, input_hash, name, produce):
+        """Return a checkpointed text output, calling produce() only if needed"""
+        if self.completed(stage, input_hash):
+            print(f"⏭️  Reusing {stage} from run {self.run_id}")
+            return self.read_text(name)
+        text = produce()
+        if text:
+            self.write_text(name, text)
+            self.record(stage, input_hash, [name], characters=len(text))
+        return text
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Youth Lens Today command line
+One entry point for every stage, run in-process:
+
+    python3 podcast.py generate [--test] [--stream] [--resume RUN_ID] [--date YYYY-MM-DD] [--topic TOPIC]
+    python3 podcast.py publish [--resume RUN_ID]
+    python3 podcast.py rss
+    python3 podcast.py batch --dates 2025-07-01..2025-07-07 --publish
+    python3 podcast.py bench --episodes 3
+    python3 podcast.py schedule [--daemon]
+
+Each stage returns a result dict (printed with --json) and the exit status
+is 1 if it failed. Modules are imported only by the subcommand that needs
+them, so rss and --help don't load the generator or HTTP stack.
+"""
+
+import argparse
+import json
+import sys
+
+
+def generate(args):
+    """podcast_generator.PodcastGenerator.generate_podcast"""
+    from datetime import date
+    from podcast_generator import PodcastGenerator, check_ffmpeg
+
+    outline = None
+    if args.outline:
+        with open(args.outline, encoding='utf-8') as f:
+            outline = f.read()
+    if not args.test:
+        check_ffmpeg()
+    generator = PodcastGenerator(test_mode=args.test, profile=args.profile, streaming=args.stream or None)
+    return generator.generate_podcast(resume=args.resume,
+                                      episode_date=date.fromisoformat(args.date) if args.date else None,
+                                      topic=args.topic, outline=outline)
+
+
+def publish(args):
+    """publish_podcast.publish_podcast"""
+    from podcast_generator import PodcastGenerator, check_ffmpeg
+    from publish_podcast import publish_podcast
+
+    check_ffmpeg()
+    generator = PodcastGenerator(profile=args.profile, streaming=args.stream or None)
+    return publish_podcast(resume=args.resume, generator=generator)
+
+
+def rss(args):
+    """generate_rss.generate_rss"""
+    from generate_rss import generate_rss
+    return generate_rss(profile=args.profile)
+
+
+def batch(args):
+    """batch_podcast.run"""
+    import batch_podcast
+    report = batch_podcast.run(args, args.parser)
+    report['status'] = 'failed' if report['summary']['failed'] else 'ok'
+    return report
+
+
+def bench(args):
+    """bench_pipeline.run"""
+    import bench_pipeline
+    report = bench_pipeline.run(args)
+    report['status'] = 'failed' if report['failures'] or report.get('regressions') else 'ok'
+    return report
+
+
+def schedule(args):
+    """schedule_podcast: one episode now, or the daemon until it is stopped"""
+    import schedule_podcast
+    return schedule_podcast.run_daemon() if args.daemon else schedule_podcast.run_once()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='podcast.py', description="Generate and publish Youth Lens Today.")
+    parser.add_argument('--json', action='store_true', help="print the stage's result as JSON")
+    commands = parser.add_subparsers(dest='command', required=True, metavar='COMMAND')
+
+    command = commands.add_parser('generate', help="generate an episode")
+    command.add_argument('--test', action='store_true', help="stop before the ElevenLabs calls")
+    command.add_argument('--stream', action='store_true', help="synthesize paragraphs as the script is written")
+    command.add_argument('--profile', action='store_true', help="dump cProfile and tracemalloc per stage")
+    command.add_argument('--resume', metavar='RUN_ID', help="resume a failed run from its checkpoints")
+    command.add_argument('--date', help="episode date (YYYY-MM-DD) to research news for")
+    command.add_argument('--topic', help="topic all three stories must relate to")
+    command.add_argument('--outline', metavar='FILE', help="use this outline instead of researching one")
+    command.set_defaults(run=generate)
+
+    command = commands.add_parser('publish', help="generate an episode, publish it and update the feed")
+    command.add_argument('--stream', action='store_true', help="synthesize paragraphs as the script is written")
+    command.add_argument('--profile', action='store_true', help="dump cProfile and tracemalloc per stage")
+    command.add_argument('--resume', metavar='RUN_ID', help="resume a failed run from its checkpoints")
+    command.set_defaults(run=publish)
+
+    command = commands.add_parser('rss', help="rebuild the RSS feed from the episode manifest")
+    command.add_argument('--profile', action='store_true', help="dump cProfile and tracemalloc")
+    command.set_defaults(run=rss)
+
+    import batch_podcast
+    command = commands.add_parser('batch', help="generate many episodes at once")
+    batch_podcast.add_arguments(command)
+    command.set_defaults(run=batch, parser=command)
+
+    import bench_pipeline
+    command = commands.add_parser('bench', help="benchmark the pipeline against local API stand-ins")
+    bench_pipeline.add_arguments(command)
+    command.set_defaults(run=bench)
+
+    command = commands.add_parser('schedule', help="generate on schedule (once, or --daemon)")
+    command.add_argument('--daemon', action='store_true', help="keep running and publish on PUBLISH_TIMES")
+    command.set_defaults(run=schedule)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    result = args.run(args)
+    if args.json:
+        print(json.dumps(result, indent=2, default=str))
+    return 0 if result.get('status') == 'ok' else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
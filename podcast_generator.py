@@ -1,11 +1,85 @@
-import requests
 import os
+import glob
+import json
 import subprocess
-from datetime import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+from datetime import date, datetime
 import re
+import shutil
+
+from segment_planner import (CACHE_MIN_TOKENS, plan_segments, group_segments_by_host, build_segment_prompt,
+                             format_episode_date, parse_outline, prompt_report)
+from script_validator import validate_segment
+from audio_cache import AudioCache, cache_key
+from audio_mixer import LOUDNESS, TRUE_PEAK, mix_audio
+from requests.exceptions import HTTPError
+
+from http_transport import RETRY_STATUSES, Transport
+from key_pool import KeyPool, parse_keys
+from metrics import Metrics, count, timed
+from mp3_tools import Mp3FormatMismatch, join_mp3
+from near_dedup import NearDuplicateFilter
+from pipeline_state import RUNS_DIR, RunState, atomic_copy, hash_inputs, prune_runs
+from settings import get_setting, as_bool
+from text_cleaner import clean_text_for_audio, split_sentences
+from tts_budget import normalize_for_speech, plan_budget
+from tts_engine import TTSEngine
+
+def new_transport(pool_size=16):
+    """HTTP transport configured from the HTTP_* settings"""
+    return Transport(
+        connect_timeout=float(get_setting('HTTP_CONNECT_TIMEOUT', 10, cast=float)),
+        read_timeout=float(get_setting('HTTP_READ_TIMEOUT', 180, cast=float)),
+        max_retries=int(get_setting('HTTP_MAX_RETRIES', 4, cast=int)),
+        backoff=float(get_setting('HTTP_BACKOFF', 1.0, cast=float)),
+        pool_size=pool_size,
+    )
+
+def new_audio_cache():
+    """Audio cache configured from the TTS_CACHE_* settings, or None if disabled"""
+    if not get_setting('TTS_CACHE', True, cast=as_bool):
+        return None
+    max_mb = float(get_setting('TTS_CACHE_MAX_MB', 500, cast=float))
+    return AudioCache(get_setting('TTS_CACHE_DIR', '.tts_cache'), int(max_mb * 1024 * 1024))
+
+def new_key_pool(hosts=None):
+    """ElevenLabs key pool from ELEVENLABS_API_KEYS, else the hosts' keys.
+
+    Returns None if no keys are configured at all.
+    """
+    keys = parse_keys(get_setting('ELEVENLABS_API_KEYS'))
+    if not keys:
+        hosts = hosts or get_setting('HOSTS', cast=json.loads) or []
+        keys = [{'key': host['api_key']} for host in hosts if host.get('api_key')] or [
+            {'key': get_setting(name)} for name in ('ELEVENLABS_API_KEY_1', 'ELEVENLABS_API_KEY_2') if get_setting(name)]
+    if not keys:
+        return None
+    return KeyPool(keys,
+                   concurrency=int(get_setting('TTS_KEY_CONCURRENCY', 2, cast=int)),
+                   rate=float(get_setting('TTS_KEY_RATE', 2.0, cast=float)))
+
+def api_concurrency(openai=None, elevenlabs=None):
+    """Requests allowed in flight per API (OPENAI_CONCURRENCY, ELEVENLABS_CONCURRENCY)"""
+    return {
+        'openai': openai or int(get_setting('OPENAI_CONCURRENCY', 4, cast=int)),
+        'elevenlabs': elevenlabs or int(get_setting('ELEVENLABS_CONCURRENCY', 8, cast=int)),
+    }
+
+def new_api_limits(openai=None, elevenlabs=None):
+    """Semaphores capping concurrent requests to each API"""
+    return {name: threading.BoundedSemaphore(limit)
+            for name, limit in api_concurrency(openai, elevenlabs).items()}
 
 class PodcastGenerator:
-    def __init__(self, test_mode=False):
+    def __init__(self, test_mode=False, transport=None, audio_cache=None, api_limits=None, key_pool=None,
+                 profile=False, streaming=None):
+        """transport, audio_cache, api_limits and key_pool may be shared between
+        generators (see batch_podcast.py); by default each gets its own.
+        profile dumps cProfile and tracemalloc snapshots for every stage.
+        streaming overrides the PIPELINE_STREAMING setting.
+        """
         # Test mode flag
         self.test_mode = test_mode
         
@@ -25,303 +99,527 @@ class PodcastGenerator:
             self.voice_id_1 = os.getenv('VOICE_ID_1', 'iw4PJTWp4tOErnqySu4l')
             self.voice_id_2 = os.getenv('VOICE_ID_2', 'SzvGngFCMygUr9c1lyUW')
         
+        # API endpoints (overridable to point at local stand-ins, see bench_pipeline.py)
+        self.openai_base_url = get_setting('OPENAI_BASE_URL', 'https://api.openai.com/v1').rstrip('/')
+        self.elevenlabs_base_url = get_setting('ELEVENLABS_BASE_URL', 'https://api.elevenlabs.io/v1').rstrip('/')
+        
         # Headers
         self.openai_headers = {
             "Authorization": f"Bearer {self.openai_api_key}",
             "Content-Type": "application/json"
         }
         
-        self.elevenlabs_headers_1 = {
-            "xi-api-key": self.elevenlabs_api_key_1,
-            "Content-Type": "application/json"
+        self.elevenlabs_headers_1 = self.elevenlabs_headers(self.elevenlabs_api_key_1)
+        self.elevenlabs_headers_2 = self.elevenlabs_headers(self.elevenlabs_api_key_2)
+        
+        # Host roster in speaking order; HOSTS in config_local.py (or JSON in
+        # the HOSTS environment variable) replaces the default two hosts
+        self.hosts = get_setting('HOSTS', cast=json.loads) or [
+            {"name": "Nathan Goldberg", "voice_id": self.voice_id_1, "api_key": self.elevenlabs_api_key_1},
+            {"name": "Jonah Herman", "voice_id": self.voice_id_2, "api_key": self.elevenlabs_api_key_2},
+        ]
+        for number, host in enumerate(self.hosts, start=1):
+            missing = [field for field in ('name', 'voice_id') if not (isinstance(host, dict) and host.get(field))]
+            if missing:
+                raise ValueError(f"HOSTS entry {number} has no {' or '.join(missing)}")
+        
+        # Shared keep-alive HTTP transport for every OpenAI and ElevenLabs call
+        self.transport = transport or new_transport()
+        
+        # Content-addressed cache of synthesized audio
+        self.audio_cache = audio_cache if audio_cache is not None else new_audio_cache()
+        
+        # Seconds an episode may take end to end; every request gets the
+        # remaining time as its deadline (None for no limit)
+        self.episode_deadline = get_setting('EPISODE_DEADLINE', 3600, cast=float)
+        self.deadline = None
+        
+        # Jaccard similarity at which a sentence counts as a repeat (0 for exact
+        # matching only), and how many earlier runs to check against
+        self.near_dup_threshold = get_setting('NEAR_DUP_THRESHOLD', 0.85, cast=float)
+        self.near_dup_history = int(get_setting('NEAR_DUP_HISTORY', 0, cast=int))
+        
+        # Finished runs drop their intermediate audio unless KEEP_RUN_AUDIO is
+        # set, and only the newest RUNS_KEEP finished runs are kept (0 for all)
+        self.keep_run_audio = get_setting('KEEP_RUN_AUDIO', False, cast=as_bool)
+        self.runs_keep = get_setting('RUNS_KEEP', 30, cast=int)
+        
+        # Final mix: one ffmpeg filter graph with loudness normalization,
+        # silence between parts and optional ducked intro/outro music; without
+        # MIX_POSTPROCESS (or ffmpeg) the parts are joined frame by frame
+        self.ffmpeg = get_setting('FFMPEG', 'ffmpeg')
+        self.postprocess = get_setting('MIX_POSTPROCESS', True, cast=as_bool)
+        self.mix_options = {
+            'gap': get_setting('MIX_GAP_SECONDS', 0.6, cast=float),
+            'loudness': get_setting('MIX_LOUDNESS', LOUDNESS, cast=float),
+            'true_peak': get_setting('MIX_TRUE_PEAK', TRUE_PEAK, cast=float),
+            'intro_music': get_setting('MIX_INTRO_MUSIC'),
+            'outro_music': get_setting('MIX_OUTRO_MUSIC'),
+            'music_gain': get_setting('MIX_MUSIC_GAIN_DB', -12.0, cast=float),
+            'music_lead': get_setting('MIX_MUSIC_LEAD_SECONDS', 3.0, cast=float),
+            'bitrate': get_setting('MIX_BITRATE', '128k'),
+        }
+        
+        # Checkpointed work directory for the current run
+        self.run = None
+        
+        # Number of segment scripts generated at once
+        self.script_workers = int(get_setting('SCRIPT_WORKERS', 3, cast=int))
+        
+        # Segments regenerated per episode after failing validation
+        self.script_retries = int(get_setting('SCRIPT_RETRY_BUDGET', 2, cast=int))
+        
+        # ElevenLabs keys chunks are spread over (ELEVENLABS_API_KEYS, else the
+        # hosts' keys), each with TTS_KEY_CONCURRENCY parallel requests and
+        # TTS_KEY_RATE requests per second
+        self.key_pool = key_pool or new_key_pool(self.hosts)
+        if self.key_pool is None:
+            raise ValueError("No ElevenLabs API key configured: set ELEVENLABS_API_KEYS, ELEVENLABS_API_KEY_1 "
+                             "or an api_key on the HOSTS entries")
+        self.quota_check = get_setting('TTS_QUOTA_CHECK', True, cast=as_bool)
+        
+        # Chunked text-to-speech: max characters per request
+        self.tts_engine = TTSEngine(self, max_chars=int(get_setting('TTS_CHUNK_CHARS', 2500, cast=int)))
+        
+        # Stream segment scripts from OpenAI and synthesize each paragraph as
+        # soon as it is written, instead of waiting for the whole script
+        self.streaming = get_setting('PIPELINE_STREAMING', False, cast=as_bool) if streaming is None else streaming
+        
+        # Stream ElevenLabs audio to disk in blocks of this many bytes
+        self.tts_streaming = get_setting('TTS_STREAMING', True, cast=as_bool)
+        self.tts_stream_block = int(get_setting('TTS_STREAM_BLOCK', 64 * 1024, cast=int))
+
+        # ElevenLabs bills per character: send the shortest spoken forms, trim
+        # host scripts to TTS_HOST_CHAR_BUDGET / TTS_EPISODE_CHAR_BUDGET, and
+        # refuse episodes over TTS_MAX_TRIM or TTS_COST_LIMIT before any request
+        self.tts_normalize = get_setting('TTS_NORMALIZE', True, cast=as_bool)
+        self.host_char_budget = get_setting('TTS_HOST_CHAR_BUDGET', None, cast=int)
+        self.episode_char_budget = get_setting('TTS_EPISODE_CHAR_BUDGET', None, cast=int)
+        self.tts_max_trim = float(get_setting('TTS_MAX_TRIM', 0.25, cast=float))
+        self.tts_cost_limit = get_setting('TTS_COST_LIMIT', None, cast=float)
+        self.tts_plan = None
+
+        # Requests in flight at once per API, across every generator sharing them
+        self.api_limits = api_limits or new_api_limits()
+        
+        # What this episode is about: its date (default: the day the run
+        # started), an optional topic, and an optional ready-made outline
+        self.episode_date = None
+        self.topic = None
+        self.outline = None
+        self.episode_inputs = {}
+        self.final_audio_file = None
+        self.test_results_file = None
+        self.error = None
+        
+        # Tokens and characters billed for this generator's requests
+        self.usage = {
+            'llm_requests': 0,
+            'prompt_tokens': 0,
+            'cached_tokens': 0,
+            'completion_tokens': 0,
+            'tts_requests': 0,
+            'tts_characters': 0,
+            'tts_cached_characters': 0,
+            'script_retries': 0,
         }
+        self._usage_lock = threading.Lock()
+        self.prompts = None
+        self.speakers = None
         
-        self.elevenlabs_headers_2 = {
-            "xi-api-key": self.elevenlabs_api_key_2,
+        # Per-stage timings and counters, written to metrics/ after each run
+        self.metrics = Metrics('generate', directory=get_setting('METRICS_DIR', 'metrics'), profile=profile)
+
+    def elevenlabs_headers(self, api_key):
+        """Request headers for an ElevenLabs API key"""
+        return {
+            "xi-api-key": api_key,
             "Content-Type": "application/json"
         }
 
+    def count_usage(self, **amounts):
+        with self._usage_lock:
+            for name, amount in amounts.items():
+                self.usage[name] += amount
+        count(**amounts)
+
+    def _count_llm_usage(self, response_json):
+        usage = response_json.get('usage') or {}
+        self.count_usage(llm_requests=1,
+                         prompt_tokens=usage.get('prompt_tokens', 0),
+                         cached_tokens=(usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0),
+                         completion_tokens=usage.get('completion_tokens', 0))
+
+    def estimate_cost(self):
+        """Estimated USD cost of this generator's requests, from the PRICE_* settings"""
+        with self._usage_lock:
+            usage = dict(self.usage)
+        # Cached prompt tokens are billed at their own (lower) rate
+        uncached = usage['prompt_tokens'] - usage['cached_tokens']
+        llm = (uncached * float(get_setting('PRICE_INPUT_TOKENS', 2.50, cast=float))
+               + usage['cached_tokens'] * float(get_setting('PRICE_CACHED_INPUT_TOKENS', 1.25, cast=float))
+               + usage['completion_tokens'] * float(get_setting('PRICE_OUTPUT_TOKENS', 10.00, cast=float))) / 1e6 \
+            + usage['llm_requests'] * float(get_setting('PRICE_WEB_SEARCH', 35.00, cast=float)) / 1000
+        tts = usage['tts_characters'] * float(get_setting('PRICE_TTS_CHARACTERS', 0.30, cast=float)) / 1000
+        return {'llm': round(llm, 4), 'tts': round(tts, 4), 'total': round(llm + tts, 4)}
+
     def generate_script(self):
         """Generate a podcast script using GPT-4 with web search and multi-step approach"""
         
-        # Step 1: Get current news and generate outline
-        print("📰 Step 1: Researching current news and generating outline...")
-        outline = self.generate_outline_with_web_search()
+        # Step 1: Get current news and generate outline (or use the one given)
+        outline = self.get_outline()
         if not outline:
-            print("❌ Failed to generate outline")
             return None
         
-        # Step 2: Generate HALF 1 (Nathan's content)
-        print("🎤 Step 2: Generating Nathan Goldberg's script...")
-        nathan_script = self.generate_nathan_script(outline)
-        if not nathan_script:
-            print("❌ Failed to generate Nathan's script")
-            return None
+        # Step 2: Plan intro, story and outro segments across the host roster
+        print("🗂️ Step 2: Planning segments...")
+        segments = self.plan_segments(outline)
         
-        # Step 3: Generate HALF 2 (Jonah's content)
-        print("🎤 Step 3: Generating Jonah Herman's script...")
-        jonah_script = self.generate_jonah_script(outline)
-        if not jonah_script:
-            print("❌ Failed to generate Jonah's script")
+        # Step 3: Generate every segment concurrently
+        print(f"🎤 Step 3: Generating {len(segments)} segments ({self.script_workers} at a time)...")
+        texts = self.generate_segments(segments)
+        if not texts:
+            print("❌ Failed to generate segments")
             return None
         
-        # Step 4: Combine the scripts
+        # Step 4: Combine the segments into one part per host
         print("🔗 Step 4: Combining scripts...")
-        combined_script = f"HALF 1:\n\n{nathan_script}\n\nHALF 2:\n\n{jonah_script}"
-        
-        return combined_script
+        return self.combine_segments(segments, texts)
+
+    def get_outline(self):
+        """The episode outline: the one given, the run's checkpoint, or fresh research"""
+        print("📰 Step 1: Researching current news and generating outline...")
+        produce = (lambda: self.outline) if self.outline else self.generate_outline_with_web_search
+        if self.run:
+            # Only inputs that were given are hashed, so older runs still resume
+            given = [self.episode_inputs] if self.episode_inputs else []
+            outline = self.run.text_stage('outline', hash_inputs('outline', *given), 'outline.txt', produce)
+        else:
+            outline = produce()
+        if not outline:
+            print("❌ Failed to generate outline")
+        return outline
+
+    def plan_segments(self, outline):
+        """Plan the episode's segments and report the size of their prompts"""
+        segments = plan_segments(outline, self.hosts)
+        # One HALF part per run of segments by the same host, which is who
+        # speaks each part; a large roster can leave some hosts without one
+        self.speakers = [host for host, _ in group_segments_by_host(segments)]
+        idle = [host['name'] for host in self.hosts if not any(host is speaker for speaker in self.speakers)]
+        if idle:
+            print(f"⚠️  Warning: no segment for {', '.join(idle)} ({len(self.hosts)} hosts, {len(segments)} segments)")
+        cached_rate = (float(get_setting('PRICE_CACHED_INPUT_TOKENS', 1.25, cast=float))
+                       / float(get_setting('PRICE_INPUT_TOKENS', 2.50, cast=float)))
+        self.prompts = prompt_report(segments, self.hosts, outline, self.episode_date, cached_rate)
+        saved = self.prompts['saved_tokens']
+        change = f"{abs(saved)} {'fewer' if saved >= 0 else 'more'}"
+        cached = (f"~{self.prompts['cached_tokens']} cacheable" if self.prompts['cached_tokens']
+                  else f"too short to cache (under {CACHE_MIN_TOKENS})")
+        print(f"🧮 Segment prompts: ~{self.prompts['prompt_tokens']} tokens, billed as ~{self.prompts['billed_tokens']}, "
+              f"~{change} than the old two HALF prompts; shared prefix ~{self.prompts['shared_tokens']} tokens, {cached}")
+        return segments
+
+    def combine_segments(self, segments, texts):
+        """The full script: each host's segments under a HALF n: marker"""
+        parts = []
+        for number, (host, host_segments) in enumerate(group_segments_by_host(segments), start=1):
+            body = '\n\n'.join(texts[segment['index']] for segment in host_segments)
+            parts.append(f"HALF {number}:\n\n{body}")
+        return '\n\n'.join(parts)
+
+    def generate_segments(self, segments, stream=None):
+        """Generate segment texts on a bounded worker pool, returned in segment order.
+
+        With a TTSStream as stream, each segment's text is fed to it as it is
+        written. If any segment fails the queued ones are cancelled and None
+        is returned.
+        """
+        cancelled = threading.Event()
 
+        def run(segment):
+            if cancelled.is_set():
+                raise RuntimeError("cancelled")
+            on_text = (lambda text: stream.feed(segment['id'], text)) if stream else None
+            if self.run:
+                prompt_hash = hash_inputs(build_segment_prompt(segments, segment, self.hosts, self.episode_date))
+                text = self.run.text_stage(f"segment:{segment['id']}", prompt_hash, f"segment_{segment['id']}.txt",
+                                           lambda: self.write_segment(segments, segment, on_text=on_text))
+            else:
+                text = self.write_segment(segments, segment, on_text=on_text)
+            if not text:
+                raise RuntimeError(f"no content for segment {segment['id']}")
+            if stream:
+                stream.finish(segment['id'], text)
+            return text
+
+        pool = ThreadPoolExecutor(max_workers=self.script_workers)
+        futures = {pool.submit(run, segment): segment['index'] for segment in segments}
+        done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+
+        failed = [future for future in done if future.exception()]
+        if failed:
+            cancelled.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+            print(f"❌ Segment generation failed: {failed[0].exception()} ({len(pending)} cancelled)")
+            return None
+
+        pool.shutdown()
+        texts = [None] * len(segments)
+        for future in done:
+            texts[futures[future]] = future.result()
+        return texts
+
+    @timed('outline')
     def generate_outline_with_web_search(self):
         """Generate an outline with current news using GPT-4 with web search"""
         
-        prompt = """Research the most recent news from the past 3-7 days and create a detailed outline for a podcast episode.
+        today = format_episode_date(self.episode_date)
+        if self.episode_date and self.episode_date != date.today():
+            period = f"the week before {today}"
+        else:
+            period = "the past 3-7 days"
+        topic = f"\n- All 3 stories must relate to: {self.topic}" if self.topic else ""
+        
+        prompt = f"""Research the most recent news from {period} and create a structured outline for a podcast episode.
 
 REQUIREMENTS:
 - Use web search to find CURRENT news from the past week
-- Focus on 3 main stories: US domestic politics/economics/law, international story, and offbeat policy story
+- Focus on 3 main stories: US domestic politics/economics/law, international story, and offbeat policy story{topic}
 - Include specific dates, names, and details from recent news
-- Provide detailed context and implications for each story
-- Use the current date (July 2024)
-
-OUTLINE FORMAT:
-1. US Domestic Story: [Title] - [Brief description with current details]
-2. International Story: [Title] - [Brief description with current details]  
-3. Offbeat Story: [Title] - [Brief description with current details]
+- Use the current date ({today})
 
-For each story, include:
-- What happened (with specific dates and details)
-- Why it matters
-- Key players involved
-- Potential implications
-- Current status/developments
+OUTLINE FORMAT: reply with JSON only, no other text:
+{{"stories": [
+  {{"kind": "US domestic", "title": "...", "summary": "one sentence",
+    "facts": ["what happened, with specific dates and details", "..."],
+    "players": ["key people and organizations involved"],
+    "dates": ["YYYY-MM-DD: event"],
+    "implications": "why it matters and what could happen next",
+    "status": "current status/developments"}},
+  {{"kind": "International", ...}},
+  {{"kind": "Offbeat", ...}}
+]}}
 
-Make sure all stories are from the past week and include current, specific details."""
+Keep every fact short and specific. Make sure all stories are from the past week."""
 
-        url = "https://api.openai.com/v1/chat/completions"
+        url = f"{self.openai_base_url}/chat/completions"
         
         data = {
             "model": "gpt-4o-search-preview",
             "messages": [
-                {"role": "system", "content": "You are a news researcher. Use web search to find the most recent, current news from the past week."},
+                {"role": "system", "content": "You are a news researcher. Use web search to find the most recent, current news from the past week, and reply in JSON."},
                 {"role": "user", "content": prompt}
             ],
             "max_tokens": 2000
         }
         
         try:
-            response = requests.post(url, headers=self.openai_headers, json=data)
+            with self.api_limits['openai']:
+                response = self.transport.post(url, headers=self.openai_headers, json=data, deadline=self.deadline)
+            count(bytes_downloaded=len(response.content))
             response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
+            result = response.json()
+            self._count_llm_usage(result)
+            outline = result["choices"][0]["message"]["content"]
         except Exception as e:
             print(f"❌ Error generating outline: {e}")
             return None
+        
+        # Store the outline in its normalized form; free text is kept as it is
+        try:
+            structured = parse_outline(outline)
+        except ValueError as e:
+            print(f"⚠️  Warning: {e}, using the outline as free text")
+            return outline
+        if structured is None:
+            print("⚠️  Warning: outline is not JSON, using it as free text")
+            return outline
+        return json.dumps(structured, ensure_ascii=False, indent=1)
 
-    def generate_nathan_script(self, outline):
-        """Generate Nathan Goldberg's script (HALF 1)"""
-        prompt = f"""Write Nathan Goldberg's portion of a podcast script (4,000+ characters) for Youth Lens Today.
+    def write_segment(self, segments, segment, on_text=None):
+        """Generate a segment and validate it, regenerating it while it fails.
 
-CURRENT OUTLINE:
-{outline}
+        Regenerations come out of the episode's SCRIPT_RETRY_BUDGET; once it
+        is spent, or when the text has already been streamed to TTS, a
+        failing segment is kept with a warning.
+        """
+        text = self.generate_segment(segments, segment, on_text=on_text)
+        while text:
+            with self.metrics.stage('validate', segment=segment['id']) as record:
+                problems = validate_segment(segment, text)
+                record['problems'] = problems
+            if not problems:
+                return text
+            summary = '; '.join(problems)
+            if on_text or not self._take_script_retry():
+                print(f"⚠️  Warning: the {segment['id']} segment {summary}")
+                return text
+            print(f"🔁 Regenerating the {segment['id']} segment: {summary}")
+            text = self.generate_segment(segments, segment, problems=problems)
+        return text
 
-REQUIREMENTS:
-- Write as Nathan Goldberg (first person)
-- Brief intro (1 paragraph): welcome listeners, state current date, summarize the 3 stories
-- Cover the FIRST story from the outline in detail (2,000+ chars)
-- Include transition to the second story
-- Use current date (July 2024)
-- Be extremely detailed and thorough
-- NO dialogue format - write as monologue
-- NO stage directions
-- NO markdown formatting (no **bold**, *italic*, or headers)
-- NO section titles or headers
-- NO bullet points or lists (no "-" or "*" at start of lines)
-- NO repetition of sentences or paragraphs
-- NO weather reports or casual content
-- NO source citations or links (no parentheses with URLs)
-- Focus on serious news analysis
-- Include extensive context, background, and implications
-- Use natural, conversational tone
-- Write as flowing narrative without any formatting markers
-- Ensure each sentence is unique and contributes to the story
-- Write in paragraph form only, no lists or bullet points
-
-FORMAT: Write as a flowing narrative that ends with a transition to Jonah's portion. Do not use any formatting, headers, section titles, bullet points, or lists. Write everything in paragraph form."""
-
-        url = "https://api.openai.com/v1/chat/completions"
-        data = {
-            "model": "gpt-4o-search-preview",
-            "messages": [
-                {"role": "system", "content": "You are Nathan Goldberg, a podcast host. Write detailed, engaging content (4,000+ characters)."},
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 5000
-        }
-        
-        try:
-            response = requests.post(url, headers=self.openai_headers, json=data)
-            response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
-        except Exception as e:
-            print(f"❌ Error generating Nathan's script: {e}")
-            return None
+    def _take_script_retry(self):
+        with self._usage_lock:
+            if self.usage['script_retries'] >= self.script_retries:
+                return False
+            self.usage['script_retries'] += 1
+            return True
 
-    def generate_jonah_script(self, outline):
-        """Generate Jonah Herman's script (HALF 2)"""
-        prompt = f"""Write Jonah Herman's portion of a podcast script (4,000+ characters) for Youth Lens Today.
+    @timed('segment', lambda segments, segment, **kwargs: {'segment': segment['id']})
+    def generate_segment(self, segments, segment, on_text=None, problems=None):
+        """Generate the script for one planned segment.
 
-CURRENT OUTLINE:
-{outline}
+        With on_text, the completion is streamed and on_text gets each piece
+        of text as it arrives. problems lists what was wrong with a previous
+        draft, for the model to fix.
+        """
+        system, prompt = build_segment_prompt(segments, segment, self.hosts, self.episode_date)
+        if problems:
+            prompt += (f"\n\nYOUR PREVIOUS DRAFT WAS REJECTED: it {'; it '.join(problems)}. "
+                       "Write the segment again and fix these problems.")
 
-REQUIREMENTS:
-- Write as Jonah Herman (first person)
-- Cover the SECOND and THIRD stories from the outline in detail (2,500+ chars)
-- Include brief outro (1 paragraph): reflect on all stories, ask listeners to follow
-- Use current date (July 2024)
-- Be extremely detailed and thorough
-- NO dialogue format - write as monologue
-- NO stage directions
-- NO markdown formatting (no **bold**, *italic*, or headers)
-- NO section titles or headers
-- NO bullet points or lists (no "-" or "*" at start of lines)
-- NO repetition of sentences or paragraphs
-- NO weather reports or casual content
-- NO source citations or links (no parentheses with URLs)
-- Focus on serious news analysis
-- Include extensive context, background, and implications
-- Use natural, conversational tone
-- End with both hosts signing off
-- Write as flowing narrative without any formatting markers
-- Ensure each sentence is unique and contributes to the story
-- Write in paragraph form only, no lists or bullet points
-
-FORMAT: Write as a flowing narrative that continues from Nathan's portion and concludes the episode. Do not use any formatting, headers, section titles, bullet points, or lists. Write everything in paragraph form."""
-
-        url = "https://api.openai.com/v1/chat/completions"
+        url = f"{self.openai_base_url}/chat/completions"
         data = {
             "model": "gpt-4o-search-preview",
             "messages": [
-                {"role": "system", "content": "You are Jonah Herman, a podcast host. Write detailed, engaging content (4,000+ characters)."},
+                {"role": "system", "content": system},
                 {"role": "user", "content": prompt}
             ],
-            "max_tokens": 5000
+            "max_tokens": 3000 if segment['kind'] == 'story' else 1000
         }
         
         try:
-            response = requests.post(url, headers=self.openai_headers, json=data)
+            if on_text:
+                return self._stream_chat(url, data, on_text)
+            with self.api_limits['openai']:
+                response = self.transport.post(url, headers=self.openai_headers, json=data, deadline=self.deadline)
+            count(bytes_downloaded=len(response.content))
             response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
+            result = response.json()
+            self._count_llm_usage(result)
+            return result["choices"][0]["message"]["content"]
         except Exception as e:
-            print(f"❌ Error generating Jonah's script: {e}")
+            print(f"❌ Error generating {segment['host']['name']}'s {segment['id']} segment: {e}")
             return None
 
-    def clean_text_for_audio(self, text):
+    def _stream_chat(self, url, data, on_text):
+        """Stream a chat completion (server-sent events), passing each piece of
+        text to on_text as it arrives; returns the whole text"""
+        data = {**data, "stream": True, "stream_options": {"include_usage": True}}
+        pieces = []
+        usage = {}
+        with self.api_limits['openai']:
+            with self.transport.post(url, headers=self.openai_headers, json=data, stream=True,
+                                     deadline=self.deadline) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    count(bytes_downloaded=len(line) + 1)
+                    if not line.startswith(b'data:'):
+                        continue
+                    payload = line[5:].strip()
+                    if payload == b'[DONE]':
+                        # Read on to the end so the connection goes back to the pool
+                        continue
+                    event = json.loads(payload)
+                    # The last event carries the token counts and no choices
+                    usage = event.get('usage') or usage
+                    for choice in event.get('choices') or []:
+                        text = (choice.get('delta') or {}).get('content')
+                        if text:
+                            pieces.append(text)
+                            on_text(text)
+        self._count_llm_usage({'usage': usage})
+        return ''.join(pieces)
+
+    @timed('clean')
+    def clean_text_for_audio(self, text, dedup=None):
         """Clean text to remove formatting artifacts and prepare for audio synthesis"""
+        if dedup is None:
+            dedup = self.new_dedup_filter()
+        if self.tts_normalize:
+            text = normalize_for_speech(text)
+        return clean_text_for_audio(text, dedup=dedup)
+
+    def plan_tts(self, cleaned_scripts):
+        """Fit the cleaned host scripts to the character budgets and predict
+        the cost and length of their audio (see tts_budget.plan_budget)"""
+        plan = plan_budget(cleaned_scripts, host_budget=self.host_char_budget,
+                           episode_budget=self.episode_char_budget, max_trim=self.tts_max_trim,
+                           price_per_1k=float(get_setting('PRICE_TTS_CHARACTERS', 0.30, cast=float)),
+                           chars_per_second=float(get_setting('TTS_CHARS_PER_SECOND', 15, cast=float)))
+        if not plan['refused'] and self.tts_cost_limit and plan['cost'] > float(self.tts_cost_limit):
+            plan['refused'] = (f"predicted text-to-speech cost ${plan['cost']:.2f} is over the "
+                               f"${float(self.tts_cost_limit):.2f} limit")
+        for number, host in enumerate(plan['hosts'], start=1):
+            if host['trimmed']:
+                print(f"✂️  Trimmed {host['trimmed']:,} characters from host {number} to fit the character budget")
+        # Cached chunks aren't billed, so the cost is an upper bound
+        print(f"💰 Text-to-speech: {plan['characters']:,} characters, up to ${plan['cost']:.2f}, "
+              f"about {plan['seconds'] / 60:.1f} minutes of speech")
+        self.tts_plan = {name: value for name, value in plan.items() if name != 'texts'}
+        return plan
+
+    def new_dedup_filter(self):
+        """Near-duplicate sentence filter from settings, or None for exact matching.
+
+        With NEAR_DUP_HISTORY set, sentences from that many earlier runs are
+        loaded too, so an episode doesn't repeat the previous ones.
+        """
+        if not self.near_dup_threshold:
+            return None
+        dedup = NearDuplicateFilter(threshold=float(self.near_dup_threshold))
         
-        # Remove markdown formatting (both ** and * patterns)
-        import re
-        text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)  # Remove **text** -> text
-        text = re.sub(r'\*([^*]+)\*', r'\1', text)      # Remove *text* -> text
-        text = text.replace('**', '').replace('*', '')   # Remove any remaining asterisks
-        
-        # Remove bullet points and list formatting
-        text = re.sub(r'^\s*[-*]\s*', '', text, flags=re.MULTILINE)  # Remove "- " or "* " at start of lines
-        text = re.sub(r'^\s*[-*]\s*\*\*([^*]+)\*\*:\s*', r'\1: ', text, flags=re.MULTILINE)  # Remove "- **text**: " -> "text: "
-        
-        # Remove source citations - anything in parentheses with https
-        text = re.sub(r'\s*\([^)]*https[^)]*\)', '', text)  # Remove (source links)
-        text = re.sub(r'\s*\[[^\]]*https[^\]]*\]', '', text)  # Remove [source links]
-        
-        # Remove HALF 1/HALF 2 markers
-        text = text.replace('HALF 1:', '').replace('HALF 2:', '')
-        
-        # Remove section headers and formatting
-        text = text.replace('HOST 1:', '').replace('HOST 2:', '')
-        text = text.replace('SEGMENT 1:', '').replace('SEGMENT 2:', '').replace('SEGMENT 3:', '')
-        text = text.replace('INTRO:', '').replace('OUTRO:', '')
-        text = text.replace('Transition to Segment 2:', '').replace('Transition to Segment 3:', '')
-        
-        # Remove any remaining formatting artifacts
-        text = text.replace('===', '').replace('---', '')
-        
-        # Remove any lines that are just formatting or headers
-        lines = text.split('\n')
-        cleaned_lines = []
-        for line in lines:
-            line = line.strip()
-            # Skip lines that are just formatting, headers, or empty
-            if (line and 
-                not line.startswith('**') and 
-                not line.startswith('===') and 
-                not line.startswith('---') and
-                not line.startswith('#') and
-                not line.startswith('-') and  # Skip bullet points
-                not line.startswith('*') and  # Skip asterisk bullets
-                not re.match(r'^[A-Z\s]+$', line) and  # Skip ALL CAPS headers
-                not re.match(r'^\*\*[^*]+\*\*$', line)):  # Skip **header** lines
-                cleaned_lines.append(line)
-        
-        # Join back together with proper spacing
-        cleaned_text = ' '.join(cleaned_lines)
-        
-        # Remove repetition (detect and remove repeated sentences)
-        sentences = re.split(r'[.!?]+', cleaned_text)
-        unique_sentences = []
-        seen_sentences = set()
-        
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if sentence and len(sentence) > 10:  # Only consider substantial sentences
-                # Normalize sentence for comparison (remove extra spaces, lowercase)
-                normalized = re.sub(r'\s+', ' ', sentence.lower()).strip()
-                if normalized not in seen_sentences:
-                    unique_sentences.append(sentence)
-                    seen_sentences.add(normalized)
-        
-        # Reconstruct text from unique sentences
-        cleaned_text = '. '.join(unique_sentences) + '.'
-        
-        # Final cleanup - remove extra spaces and normalize
-        cleaned_text = re.sub(r'\s+', ' ', cleaned_text).strip()
-        
-        return cleaned_text
-
-    def split_script_for_hosts(self, script):
-        """Split the script into two parts for the two hosts using HALF 1/HALF 2 markers"""
-
-        # Look for the HALF 1 and HALF 2 markers
-        if "HALF 1:" in script and "HALF 2:" in script:
-            # Split on the HALF 2 marker
-            parts = script.split("HALF 2:")
-            if len(parts) == 2:
-                # Extract HALF 1 content (remove the "HALF 1:" prefix)
-                host1_script = parts[0].replace("HALF 1:", "").strip()
-                # Extract HALF 2 content
-                host2_script = parts[1].strip()
-
-                return host1_script, host2_script
+        if self.near_dup_history:
+            current = self.run.run_id if self.run else None
+            previous = sorted(run_id for run_id in os.listdir(RUNS_DIR) if run_id != current) \
+                if os.path.isdir(RUNS_DIR) else []
+            for run_id in previous[-int(self.near_dup_history):]:
+                for path in sorted(glob.glob(os.path.join(RUNS_DIR, run_id, 'host_*.clean.txt'))):
+                    with open(path, encoding='utf-8') as f:
+                        dedup.add_history(split_sentences(f.read()), source=run_id)
+        return dedup
+
+    def split_script_for_hosts(self, script, speakers=None):
+        """Split the script into one part per speaker (default: every host)
+        using the HALF 1/HALF 2/... markers"""
+        speakers = speakers or self.hosts
+
+        # Look for one HALF marker per speaker
+        parts = re.split(r'HALF \d+:', script)
+        if len(parts) == len(speakers) + 1:
+            return [part.strip() for part in parts[1:]]
 
         # Fallback: if markers aren't found, use the old method
-        print("⚠️  Warning: HALF 1/HALF 2 markers not found, using fallback splitting method")
+        print("⚠️  Warning: HALF markers not found, using fallback splitting method")
 
         lines = script.split('\n')
-        first_part_end = len(lines) // 2
-        second_part_start = first_part_end
-        
-        host1_script = '\n'.join(lines[:first_part_end])
-        host2_script = '\n'.join(lines[second_part_start:])
-        
-        host1_script = host1_script.strip()
-        host2_script = host2_script.strip()
+        count = len(speakers)
+        bounds = [len(lines) * i // count for i in range(count + 1)]
         
-        return host1_script, host2_script
+        return ['\n'.join(lines[start:end]).strip() for start, end in zip(bounds, bounds[1:])]
 
+    @timed('audio', lambda text, voice_id, api_key, headers, filename: {'chunk': os.path.basename(filename)})
     def generate_audio(self, text, voice_id, api_key, headers, filename):
         """Generate audio using ElevenLabs API"""
         
         # Clean the text for audio
         cleaned_text = self.clean_text_for_audio(text)
         
-        url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+        return self.synthesize_speech(cleaned_text, voice_id, headers, filename)
+
+    @timed('tts_request', lambda cleaned_text, voice_id, headers, filename, **kwargs: {
+        'chunk': os.path.basename(filename)})
+    def synthesize_speech(self, cleaned_text, voice_id, headers, filename, previous_text=None, next_text=None,
+                          api_key=None):
+        """Send already-cleaned text to ElevenLabs and save the MP3.
+
+        previous_text/next_text give the voice model the surrounding chunks so
+        intonation carries across chunk boundaries. With headers None the
+        request goes through the key pool, preferring api_key.
+        """
+        
+        url = f"{self.elevenlabs_base_url}/text-to-speech/{voice_id}"
         
         data = {
             "text": cleaned_text,
@@ -331,168 +629,551 @@ FORMAT: Write as a flowing narrative that continues from Nathan's portion and co
                 "similarity_boost": 0.5
             }
         }
+        if previous_text:
+            data["previous_text"] = previous_text
+        if next_text:
+            data["next_text"] = next_text
+        
+        # Serve identical text/voice/settings from the audio cache
+        key = None
+        if self.audio_cache:
+            key = cache_key(cleaned_text, voice_id, data["model_id"], data["voice_settings"])
+            if self.audio_cache.get(key, filename):
+                self.count_usage(tts_cached_characters=len(cleaned_text))
+                return True
         
+        self.api_limits['elevenlabs'].acquire()
         try:
-            response = requests.post(url, headers=headers, json=data)
+            if headers is None:
+                self._request_speech_pooled(url, voice_id, data, filename, prefer=api_key)
+            else:
+                self._request_speech(url, headers, data, filename)
+            
+        except Exception as e:
+            print(f"❌ Error generating audio: {e}")
+            try:
+                os.remove(f"{filename}.part")
+            except OSError:
+                pass
+            return False
+        finally:
+            self.api_limits['elevenlabs'].release()
+        
+        self.count_usage(tts_requests=1, tts_characters=len(cleaned_text))
+        if key:
+            try:
+                self.audio_cache.put(key, filename)
+            except OSError as e:
+                print(f"⚠️  Warning: could not cache audio: {e}")
+        return True
+
+    def _request_speech(self, url, headers, data, filename, retry_statuses=RETRY_STATUSES):
+        """POST one speech request and write the MP3; returns the response headers.
+
+        Raises HTTPError (with the error body read) on a failed request.
+        """
+        if self.tts_streaming:
+            # Write the MP3 to disk as it arrives instead of buffering it all
+            with self.transport.post(f"{url}/stream", headers=headers, json=data, stream=True,
+                                     deadline=self.deadline, retry_statuses=retry_statuses) as response:
+                if response.status_code >= 400:
+                    # Read the error body of the streamed response now, while it is
+                    # open, so failed() can parse its JSON from the HTTPError
+                    response.content
+                response.raise_for_status()
+                partial = f"{filename}.part"
+                with open(partial, 'wb') as f:
+                    for block in response.iter_content(chunk_size=self.tts_stream_block):
+                        f.write(block)
+                        count(bytes_downloaded=len(block))
+                os.replace(partial, filename)
+        else:
+            response = self.transport.post(url, headers=headers, json=data, deadline=self.deadline,
+                                           retry_statuses=retry_statuses)
             response.raise_for_status()
+            count(bytes_downloaded=len(response.content))
             
             with open(filename, 'wb') as f:
                 f.write(response.content)
-            
+        return response.headers
+
+    def _request_speech_pooled(self, url, voice_id, data, filename, prefer=None):
+        """Send a speech request on a pooled key, failing over to other keys.
+
+        A 429 is left to the pool (which cools the key down and routes around
+        it) rather than retried on the same key.
+        """
+        characters = len(data['text'])
+        attempts = 3 * len(self.key_pool.keys)
+        for attempt in range(attempts):
+            key = self.key_pool.acquire(voice_id, characters, prefer=prefer, deadline=self.deadline)
+            try:
+                response_headers = self._request_speech(url, self.elevenlabs_headers(key.key), data, filename,
+                                                        retry_statuses=RETRY_STATUSES - {429})
+            except HTTPError as e:
+                reason = self.key_pool.failed(key, e.response, voice_id)
+                if reason is None or attempt + 1 == attempts:
+                    raise
+                print(f"🔀 ElevenLabs key {key.name}: {reason}, rerouting")
+                continue
+            finally:
+                self.key_pool.release(key)
+            self.key_pool.succeeded(key, characters, response_headers)
+            return
+
+    @timed('combine', lambda input_files, output_file: {'parts': len(input_files)})
+    def combine_audio_files(self, input_files, output_file):
+        """Combine audio files, in order: mixed through ffmpeg when post-processing,
+        otherwise frame by frame without re-encoding"""
+        
+        if self.postprocess:
+            if shutil.which(self.ffmpeg):
+                return self.mix_audio_files(input_files, output_file)
+            print("⚠️  ffmpeg is not installed, joining parts without loudness normalization, gaps or music")
+        
+        try:
+            join_mp3(input_files, output_file)
             return True
-        except Exception as e:
-            print(f"❌ Error generating audio: {e}")
+        except Mp3FormatMismatch as e:
+            # Different sample rates or channel counts need a real decode
+            print(f"⚠️  {e}, falling back to ffmpeg")
+        except (ValueError, OSError) as e:
+            print(f"❌ Error combining audio files: {e}")
             return False
+        
+        return self.ffmpeg_concat(input_files, output_file)
+
+    def mix_audio_files(self, input_files, output_file):
+        """Mix the parts in one ffmpeg pass, reporting how long the encode took"""
+        
+        try:
+            mix = mix_audio(input_files, output_file, ffmpeg=self.ffmpeg, **self.mix_options)
+        except subprocess.CalledProcessError as e:
+            print(f"❌ Error mixing audio files: {e.stderr.strip() or e}")
+            return False
+        except (ValueError, OSError) as e:
+            print(f"❌ Error mixing audio files: {e}")
+            return False
+        
+        count(encode_seconds=mix['seconds'], audio_seconds=mix['audio_seconds'])
+        print(f"🎚️ Mixed {len(input_files)} parts in {mix['seconds']:.1f}s: {mix['audio_seconds']:.0f}s of audio "
+              f"at {self.mix_options['loudness']:g} LUFS ({mix['realtime']}x real time)")
+        return True
 
-    def combine_audio_files(self, file1, file2, output_file):
-        """Combine two audio files using ffmpeg"""
+    def ffmpeg_concat(self, input_files, output_file):
+        """Combine audio files using ffmpeg, decoding and re-encoding them"""
         
         try:
-            cmd = [
-                'ffmpeg', '-i', file1, '-i', file2,
-                '-filter_complex', '[0:0][1:0]concat=n=2:v=0:a=1[out]',
+            cmd = [self.ffmpeg]
+            for input_file in input_files:
+                cmd += ['-i', input_file]
+            streams = ''.join(f'[{i}:0]' for i in range(len(input_files)))
+            cmd += [
+                '-filter_complex', f'{streams}concat=n={len(input_files)}:v=0:a=1[out]',
                 '-map', '[out]', output_file, '-y'
             ]
             
             subprocess.run(cmd, check=True, capture_output=True)
             return True
+        except FileNotFoundError:
+            print("❌ Error combining audio files: ffmpeg is not installed")
+            return False
         except subprocess.CalledProcessError as e:
             print(f"❌ Error combining audio files: {e}")
             return False
 
-    def generate_podcast(self):
-        """Generate a complete podcast episode"""
+    def generate_streamed(self):
+        """Write the script and synthesize it at the same time.
+
+        Segments are streamed from OpenAI and every finished paragraph is
+        cleaned and sent to ElevenLabs straight away, so audio is ready soon
+        after the last segment is written. Records the same checkpoints as
+        the staged pipeline; returns the audio input hashes, or None.
+        """
+        outline = self.get_outline()
+        if not outline:
+            return None
+        segments = self.plan_segments(outline)
+        groups = group_segments_by_host(segments)
+        
+        jobs = []
+        for number, (host, host_segments) in enumerate(groups, start=1):
+            jobs.append({
+                'stage': f'audio:{number}',
+                'output': f'host_{number}.mp3',
+                'segments': [segment['id'] for segment in host_segments],
+                'voice_id': host['voice_id'],
+                'api_key': host.get('api_key'),
+                'filename': self.run.path(f'host_{number}.mp3'),
+            })
+        
+        if self.quota_check:
+            self.key_pool.refresh_quota(self.transport, self.elevenlabs_base_url)
+        dedup = self.new_dedup_filter()
+        print(f"🎤 Generating {len(segments)} segments ({self.script_workers} at a time) "
+              f"and synthesizing them as they are written...")
+        with self.metrics.stage('stream', hosts=len(jobs)) as record:
+            stream = self.tts_engine.stream(jobs, dedup=dedup)
+            texts = self.generate_segments(segments, stream=stream)
+            if texts is None:
+                stream.abort("script generation failed")
+                rendered = False
+            else:
+                rendered = stream.join()
+            if not rendered:
+                record['error'] = 'failed'
+        if not rendered:
+            self.error = "Failed to generate host audio"
+            return None
+        
+        # Checkpoint the script, host parts, cleaned text and audio as the
+        # staged pipeline would, so a resumed run reuses them
+        script = self.combine_segments(segments, texts)
+        print(f"📄 Script length: {len(script)} characters")
+        self.run.text_stage('script', hash_inputs(script), 'script.txt', lambda: script)
+        audio_hashes = []
+        for number, (job, cleaned_text) in enumerate(zip(jobs, stream.cleaned_texts()), start=1):
+            host_script = '\n\n'.join(texts[segment['index']] for segment in groups[number - 1][1])
+            self.run.text_stage(f'host:{number}', hash_inputs(script, number), f'host_{number}.txt',
+                                lambda: host_script)
+            name = self.run.write_text(f'host_{number}.clean.txt', cleaned_text)
+            self.run.record(f'clean:{number}', hash_inputs(host_script), [name], characters=len(cleaned_text))
+            if not cleaned_text:
+                # Nothing was sent for this host, so its part is empty: leave it out
+                os.remove(job['filename'])
+                audio_hashes.append(None)
+                continue
+            input_hash = hash_inputs(cleaned_text, job['voice_id'], self.tts_engine.max_chars)
+            self.run.record(job['stage'], input_hash, [job['output']])
+            audio_hashes.append(input_hash)
+        if dedup and dedup.dropped:
+            print(f"✂️  Dropped {len(dedup.dropped)} near-duplicate sentences")
+            self.run.write_text('dedup.json', json.dumps(dedup.dropped, indent=2))
+        return audio_hashes
+
+    def generate_podcast(self, resume=None, episode_date=None, topic=None, outline=None):
+        """Generate a complete podcast episode; returns a result dict (see result()).
+
+        Every stage checkpoints its output under runs/<run-id>/; pass a run id
+        as resume to skip the stages that already finished in that run.
+        episode_date (a date) backdates the episode, topic steers the news
+        research, and outline skips research and uses the given outline text.
+        Stage metrics are written to metrics/ whether or not the run succeeds.
+        """
+        started = time.monotonic()
+        try:
+            with self.metrics.stage('episode') as record:
+                success = self._generate_podcast(resume, episode_date, topic, outline)
+                if not success:
+                    record['error'] = self.error or 'failed'
+        finally:
+            self.metrics.flush()
+        return self.result(success, time.monotonic() - started)
+
+    def result(self, success, seconds=None):
+        """What a generate_podcast call produced.
+
+        status is "ok" or "failed" (with error); file is the finished MP3
+        (None in test mode, where test_results is the script report),
+        artifacts lists what the run wrote, stages maps each stage to its
+        total seconds, and tts_plan is the character budget's prediction.
+        """
+        return {
+            'status': 'ok' if success else 'failed',
+            'error': None if success else (self.error or 'generation failed'),
+            'run_id': self.run.run_id if self.run else None,
+            'test_mode': self.test_mode,
+            'file': self.final_audio_file,
+            'test_results': self.test_results_file,
+            'artifacts': self.artifacts(),
+            'seconds': round(seconds, 1) if seconds is not None else None,
+            'stages': {stage: round(total['seconds'], 3) for stage, total in self.metrics.totals().items()},
+            'usage': dict(self.usage),
+            'prompts': self.prompts,
+            'tts_plan': self.tts_plan,
+            'cost': self.estimate_cost(),
+        }
+
+    def artifacts(self):
+        """Paths of the files in this run's work directory, by kind"""
+        if not self.run:
+            return {}
+        def existing(name):
+            path = self.run.path(name)
+            return path if os.path.exists(path) else None
+        return {
+            'run_dir': self.run.directory,
+            'outline': existing('outline.txt'),
+            'script': existing('script.txt'),
+            'host_texts': sorted(glob.glob(self.run.path('host_*.clean.txt'))),
+            'host_audio': sorted(glob.glob(self.run.path('host_*.mp3'))),
+            'mix': existing('final.mp3'),
+            'episode': self.final_audio_file,
+        }
+
+    def fail(self, message, resumable=False):
+        """Report why the run stopped; returns False for the caller to pass on"""
+        self.error = message
+        print(f"❌ {message}")
+        if resumable:
+            print(f"⏯️ Resume with: --resume {self.run.run_id}")
+        return False
+
+    def _generate_podcast(self, resume, episode_date, topic, outline):
         
         print("🎙️ Starting podcast generation...")
+        if resume:
+            try:
+                self.run = RunState.resume(resume)
+            except FileNotFoundError as e:
+                return self.fail(f"Cannot resume: {e}")
+            print(f"⏯️ Resuming run {self.run.run_id}")
+        else:
+            self.run = RunState.create()
+            print(f"🗃️ Run {self.run.run_id}: checkpoints in {self.run.directory}")
+        self.metrics.run_id = self.run.run_id
+        # The date, topic and outline are saved with the run, so resuming it
+        # without them gives the same episode; ones given again take precedence
+        saved = self.run.manifest.get('inputs', {})
+        if episode_date is None and saved.get('date'):
+            episode_date = date.fromisoformat(saved['date'])
+        topic = topic or saved.get('topic')
+        outline = outline or saved.get('outline')
+        self.episode_date = episode_date or datetime.fromisoformat(self.run.manifest['created']).date()
+        self.topic = topic
+        self.outline = outline
+        self.episode_inputs = {name: value for name, value in (
+            ('date', episode_date.isoformat() if episode_date else None),
+            ('topic', topic), ('outline', outline)) if value}
+        self.run.save_inputs(self.episode_inputs)
+        if self.episode_deadline:
+            self.deadline = time.monotonic() + float(self.episode_deadline)
+        
+        # Streaming overlaps script writing and synthesis; a resumed run goes
+        # through the stages one by one to reuse its checkpoints, and so does
+        # one with a character budget, which needs whole host scripts to trim
+        budgeted = self.host_char_budget or self.episode_char_budget or self.tts_cost_limit
+        if self.streaming and not self.test_mode and not self.run.stages() and not budgeted:
+            print("📝 Generating script and audio together...")
+            audio_hashes = self.generate_streamed()
+            if audio_hashes is None:
+                return self.fail(self.error or "Failed to generate script", resumable=True)
+            return self.finish_episode(audio_hashes)
         
         # Step 1: Generate script
         print("📝 Generating script...")
-        script = self.generate_script()
+        with self.metrics.stage('script') as record:
+            script = self.generate_script()
+            if not script:
+                record['error'] = 'failed'
         
         if not script:
-            print("❌ Failed to generate script")
-            return False
+            return self.fail("Failed to generate script")
         
         print("✅ Script generated successfully")
         print(f"📄 Script length: {len(script)} characters")
+        self.run.text_stage('script', hash_inputs(script), 'script.txt', lambda: script)
         
-        # Step 2: Split script for hosts
-        print("👥 Splitting script for two hosts...")
-        host1_script, host2_script = self.split_script_for_hosts(script)
+        # Step 2: Split script into one part per speaker (see plan_segments)
+        speakers = self.speakers or self.hosts
+        print(f"👥 Splitting script for {len(speakers)} hosts...")
+        host_scripts = self.split_script_for_hosts(script, speakers)
+        for number, host_script in enumerate(host_scripts, start=1):
+            self.run.text_stage(f'host:{number}', hash_inputs(script, number), f'host_{number}.txt',
+                                lambda: host_script)
         
-        print(f"🎤 Host 1 script length: {len(host1_script)} characters")
-        print(f"🎤 Host 2 script length: {len(host2_script)} characters")
+        for host, host_script in zip(speakers, host_scripts):
+            print(f"🎤 {host['name']} script length: {len(host_script)} characters")
         
         # Test mode: Stop before expensive API calls
         if self.test_mode:
+            total = sum(len(host_script) for host_script in host_scripts) or 1
             print("\n🧪 TEST MODE: Stopping before ElevenLabs API calls")
             print("✅ Script generation and splitting completed successfully!")
             print("📊 Analysis:")
             print(f"   - Total script length: {len(script)} characters")
-            print(f"   - Nathan Goldberg content: {len(host1_script)} characters")
-            print(f"   - Jonah Herman content: {len(host2_script)} characters")
-            print(f"   - Split ratio: {len(host1_script)/(len(host1_script)+len(host2_script))*100:.1f}% / {len(host2_script)/(len(host1_script)+len(host2_script))*100:.1f}%")
+            for host, host_script in zip(speakers, host_scripts):
+                print(f"   - {host['name']} content: {len(host_script)} characters")
+            print(f"   - Split ratio: {' / '.join(f'{len(s)/total*100:.1f}%' for s in host_scripts)}")
             
             # Save test results
-            test_file = f"test_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+            test_file = f"test_results_{self.run.run_id}.txt"
             with open(test_file, 'w') as f:
                 f.write("=== TEST RESULTS ===\n\n")
                 f.write(f"Script Length: {len(script)} characters\n")
-                f.write(f"Nathan Goldberg Length: {len(host1_script)} characters\n")
-                f.write(f"Jonah Herman Length: {len(host2_script)} characters\n\n")
-                f.write("=== FULL SCRIPT ===\n\n")
+                for host, host_script in zip(speakers, host_scripts):
+                    f.write(f"{host['name']} Length: {len(host_script)} characters\n")
+                f.write("\n=== FULL SCRIPT ===\n\n")
                 f.write(script)
-                f.write("\n\n=== NATHAN GOLDBERG SCRIPT ===\n\n")
-                f.write(host1_script)
-                f.write("\n\n=== JONAH HERMAN SCRIPT ===\n\n")
-                f.write(host2_script)
+                for host, host_script in zip(speakers, host_scripts):
+                    f.write(f"\n\n=== {host['name'].upper()} SCRIPT ===\n\n")
+                    f.write(host_script)
             
             print(f"📄 Test results saved to: {test_file}")
+            self.test_results_file = test_file
             return True
         
         # Production mode: Continue with audio generation
-        print("🎵 Generating audio for Nathan Goldberg...")
-        current_time = datetime.now().strftime('%Y%m%d_%H%M%S')
-        nathan_audio_file = f"Nathan_Goldberg_{current_time}.mp3"
-        success1 = self.generate_audio(
-            host1_script, 
-            self.voice_id_1, 
-            self.elevenlabs_api_key_1, 
-            self.elevenlabs_headers_1, 
-            nathan_audio_file
-        )
-        
-        if not success1:
-            print("❌ Failed to generate Nathan Goldberg audio")
-            return False
+        # One filter across all hosts, so a host doesn't repeat another; cleaning
+        # is cheap, so it always reruns to rebuild the filter's state
+        print("🧽 Cleaning scripts for audio...")
+        dedup = self.new_dedup_filter()
+        cleaned_scripts = []
+        for number, host_script in enumerate(host_scripts, start=1):
+            dropped = len(dedup.dropped) if dedup else 0
+            cleaned_scripts.append(self.clean_text_for_audio(host_script, dedup=dedup))
+            if dedup and len(dedup.dropped) > dropped:
+                print(f"✂️  Dropped {len(dedup.dropped) - dropped} near-duplicate sentences from host {number}")
+        if dedup and dedup.dropped:
+            self.run.write_text('dedup.json', json.dumps(dedup.dropped, indent=2))
+
+        # Fit the character budget and check the cost before any request
+        plan = self.plan_tts(cleaned_scripts)
+        if plan['refused']:
+            return self.fail(f"Over the text-to-speech budget: {plan['refused']}", resumable=True)
+        cleaned_scripts = plan['texts']
+        for number, (host_script, cleaned_text) in enumerate(zip(host_scripts, cleaned_scripts), start=1):
+            name = self.run.write_text(f'host_{number}.clean.txt', cleaned_text)
+            self.run.record(f'clean:{number}', hash_inputs(host_script), [name], characters=len(cleaned_text))
+
+        jobs = []
+        audio_hashes = []
+        for number, (host, cleaned_text) in enumerate(zip(speakers, cleaned_scripts), start=1):
+            if not cleaned_text:
+                # Nothing left to say: no part, which join_mp3 would reject empty
+                print(f"⏭️  Skipping {host['name']}: no text left after cleaning")
+                audio_hashes.append(None)
+                continue
+            stage = f'audio:{number}'
+            input_hash = hash_inputs(cleaned_text, host['voice_id'], self.tts_engine.max_chars)
+            audio_hashes.append(input_hash)
+            if self.run.completed(stage, input_hash):
+                print(f"⏭️  Reusing {host['name']} audio from run {self.run.run_id}")
+                continue
+            filename = f'host_{number}.mp3'
+            if os.path.exists(self.run.path(filename)):
+                os.remove(self.run.path(filename))
+            jobs.append({
+                'stage': stage,
+                'input_hash': input_hash,
+                'output': filename,
+                'cleaned_text': cleaned_text,
+                'voice_id': host['voice_id'],
+                'api_key': host.get('api_key'),
+                'filename': self.run.path(filename),
+            })
         
-        # Step 4: Generate audio for Jonah Herman
-        print("🎵 Generating audio for Jonah Herman...")
-        jonah_audio_file = f"Jonah_Herman_{current_time}.mp3"
-        success2 = self.generate_audio(
-            host2_script, 
-            self.voice_id_2, 
-            self.elevenlabs_api_key_2, 
-            self.elevenlabs_headers_2, 
-            jonah_audio_file
-        )
-        
-        if not success2:
-            print("❌ Failed to generate Jonah Herman audio")
-            return False
+        if jobs:
+            print(f"🎵 Generating audio for {len(jobs)} hosts...")
+            if self.quota_check:
+                self.key_pool.refresh_quota(self.transport, self.elevenlabs_base_url)
+            with self.metrics.stage('tts', hosts=len(jobs)) as record:
+                rendered = self.tts_engine.render(jobs)
+                if not rendered:
+                    record['error'] = 'failed'
+            # Keep every host that finished, even if another one failed
+            for job in jobs:
+                if os.path.exists(job['filename']):
+                    self.run.record(job['stage'], job['input_hash'], [job['output']])
+            if not rendered:
+                return self.fail("Failed to generate host audio", resumable=True)
+        return self.finish_episode(audio_hashes)
+
+    def finish_episode(self, audio_hashes):
+        """Mix the rendered host parts into the final episode file.
+
+        audio_hashes has one entry per host, None for a host with nothing to
+        say, whose part is left out.
+        """
+        audio_files = [self.run.path(f'host_{number}.mp3')
+                       for number, audio_hash in enumerate(audio_hashes, start=1) if audio_hash]
+        if not audio_files:
+            return self.fail("No host has any text left to synthesize after cleaning")
+        if self.audio_cache:
+            stats = self.audio_cache.stats()
+            print(f"♻️ TTS cache: {stats['hits']} hits, {stats['misses']} misses, "
+                  f"{stats['bytes_saved']} bytes reused, {stats['evictions']} evicted")
+        for key in self.key_pool.stats():
+            if key['requests'] or key['disabled']:
+                left = '' if key['remaining'] is None else f", {key['remaining']} left"
+                print(f"🔑 ElevenLabs key {key['key']}: {key['requests']} requests, {key['characters']} characters"
+                      f"{left}{', ' + key['disabled'] if key['disabled'] else ''}")
         
         # Step 5: Combine audio files
-        print("🔗 Combining audio files...")
-        final_audio_file = f"Youth_Lens_Today_{current_time}.mp3"
-        success3 = self.combine_audio_files(nathan_audio_file, jonah_audio_file, final_audio_file)
+        mix_hash = hash_inputs(audio_hashes, self.mix_options) if self.postprocess else hash_inputs(audio_hashes)
+        if self.run.completed('mix', mix_hash):
+            print(f"⏭️  Reusing final mix from run {self.run.run_id}")
+        else:
+            print("🔗 Combining audio files...")
+            if not self.combine_audio_files(audio_files, self.run.path('final.mp3')):
+                return self.fail("Failed to combine audio files", resumable=True)
+            self.run.record('mix', mix_hash, ['final.mp3'])
         
-        if not success3:
-            print("❌ Failed to combine audio files")
-            return False
+        # Named after the run, which is unique, so concurrent runs never
+        # write the same episode file
+        final_audio_file = f"Youth_Lens_Today_{self.run.run_id}.mp3"
+        atomic_copy(self.run.path('final.mp3'), final_audio_file)
+        self.final_audio_file = final_audio_file
+        
+        # The episode is out: drop the run's audio (KEEP_RUN_AUDIO keeps it)
+        # and whole finished runs beyond the newest RUNS_KEEP
+        if not self.keep_run_audio:
+            freed = self.run.finish()
+            print(f"🧹 Removed {freed / 1e6:.1f} MB of intermediate audio from {self.run.directory}")
+        if self.runs_keep:
+            removed = prune_runs(int(self.runs_keep))
+            if removed:
+                print(f"🧹 Removed {len(removed)} old runs")
         
         print("✅ Podcast generated successfully!")
         print(f"📁 Final audio file: {final_audio_file}")
         
-        # Clean up individual files
-        try:
-            os.remove(nathan_audio_file)
-            os.remove(jonah_audio_file)
-            print("🧹 Cleaned up temporary audio files")
-        except:
-            pass
-        
         return True
 
+def check_ffmpeg():
+    """Warn if ffmpeg is missing; it mixes the final episode (loudness, gaps, music)"""
+    try:
+        subprocess.run([get_setting('FFMPEG', 'ffmpeg'), '-version'], capture_output=True, check=True)
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        print("⚠️  ffmpeg is not installed; episodes are joined without loudness normalization, gaps or music,")
+        print("   and audio parts with different formats can't be combined.")
+        print("   macOS: brew install ffmpeg")
+        print("   Ubuntu: sudo apt-get install ffmpeg")
+
 def main():
     """Main function to run the podcast generator"""
     
     # Check for test mode argument
     import sys
     test_mode = "--test" in sys.argv
+    profile = "--profile" in sys.argv
+    streaming = True if "--stream" in sys.argv else None
+    resume = None
+    if "--resume" in sys.argv:
+        index = sys.argv.index("--resume")
+        if index + 1 >= len(sys.argv):
+            print("❌ Usage: python3 podcast_generator.py [--test] [--profile] [--stream] [--resume <run-id>]")
+            sys.exit(2)
+        resume = sys.argv[index + 1]
     
     if test_mode:
         print("🧪 Running in TEST MODE - will stop before ElevenLabs API calls")
     else:
-        # Check if ffmpeg is installed (only needed for production mode)
-        try:
-            subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            print("❌ ffmpeg is not installed. Please install ffmpeg to generate podcasts.")
-            print("   macOS: brew install ffmpeg")
-            print("   Ubuntu: sudo apt-get install ffmpeg")
-            return
+        check_ffmpeg()
     
     # Generate podcast
-    generator = PodcastGenerator(test_mode=test_mode)
-    success = generator.generate_podcast()
+    generator = PodcastGenerator(test_mode=test_mode, profile=profile, streaming=streaming)
+    result = generator.generate_podcast(resume=resume)
     
-    if success:
+    if result['status'] == 'ok':
         print("\n🎉 Podcast generation completed successfully!")
         if test_mode:
             print("🧪 Test completed successfully!")
             print("📁 Check the current directory for test results.")
     else:
         print("\n❌ Podcast generation failed.")
+    return result
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    import sys
+    sys.exit(0 if main()['status'] == 'ok' else 1) 
\ No newline at end of file
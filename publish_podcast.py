@@ -4,54 +4,119 @@ Publish a podcast episode to the episodes/ directory
 This script combines podcast generation with publishing
 """
 
+import json
 import os
-import shutil
-from datetime import datetime
-from podcast_generator import PodcastGenerator
+import sys
+from datetime import date, datetime, time, timezone
+from episode_manifest import publish_lock, record_episode
+from pipeline_state import atomic_copy
+from settings import as_bool, get_setting
 
-def publish_podcast():
-    """Generate and publish a podcast episode"""
-    
-    print("🎙️ Starting podcast generation and publishing...")
+def backfill_time(episode_date):
+    """When to date an episode for episode_date: now for today (or no date),
+    else noon UTC on that day, so backfilled episodes sort by date in the feed"""
+    if episode_date and episode_date != date.today():
+        return datetime.combine(episode_date, time(12), tzinfo=timezone.utc)
+    return datetime.now(timezone.utc)
+
+def publish_episode(audio_file, published=None):
+    """Move a finished episode into episodes/ and add it to the manifest.
+
+    The episode is copied to a temp file in episodes/, fsynced and renamed
+    into place, so the feed never sees a partial file, and the publish lock
+    keeps concurrent publishers from interleaving manifest updates. An
+    episode that is already published is never overwritten. With
+    PUBLISH_RENDITIONS, the RENDITIONS are encoded first and renamed into
+    place next to it.
+    """
     
-    # Generate the podcast
-    generator = PodcastGenerator(test_mode=False)
-    success = generator.generate_podcast()
+    # Create episodes directory if it doesn't exist
+    os.makedirs('episodes', exist_ok=True)
     
-    if not success:
-        print("❌ Podcast generation failed")
-        return False
+    filename = os.path.basename(audio_file)
+    dest_path = os.path.join('episodes', filename)
+    if os.path.exists(dest_path):
+        raise FileExistsError(f"{dest_path} is already published")
     
-    # Find the generated podcast file
-    podcast_files = [f for f in os.listdir('.') if f.startswith('Youth_Lens_Today_') and f.endswith('.mp3')]
+    renditions = []
+    if get_setting('PUBLISH_RENDITIONS', False, cast=as_bool):
+        from renditions import DEFAULT_RENDITIONS, make_renditions
+        specs = get_setting('RENDITIONS', cast=json.loads) or DEFAULT_RENDITIONS
+        print(f"🎛️ Encoding {len(specs)} renditions...")
+        renditions = make_renditions(audio_file, 'episodes', filename, specs,
+                                     ffmpeg=get_setting('FFMPEG', 'ffmpeg'),
+                                     workers=get_setting('RENDITION_WORKERS', cast=int))
     
-    if not podcast_files:
-        print("❌ No podcast file found")
-        return False
+    try:
+        with publish_lock():
+            if os.path.exists(dest_path):
+                raise FileExistsError(f"{dest_path} is already published")
+            atomic_copy(audio_file, dest_path)
+            for rendition in renditions:
+                os.replace(rendition.pop('partial'), os.path.join('episodes', rendition['filename']))
+            record_episode(dest_path, published=published or datetime.now(timezone.utc),
+                           renditions=renditions or None)
+    finally:
+        for rendition in renditions:
+            if 'partial' in rendition and os.path.exists(rendition['partial']):
+                os.remove(rendition['partial'])
+    os.remove(audio_file)
+    return dest_path
+
+def publish_podcast(resume=None, generator=None):
+    """Generate and publish a podcast episode, optionally resuming a failed run.
+
+    Returns a result dict: status ("ok" or "failed"), stage (the one that
+    failed: "generate" or "publish"), error, file (the published episode),
+    and the generate and rss stage results.
+    """
+    from generate_rss import generate_rss
+    from podcast_generator import PodcastGenerator
     
-    # Get the most recent podcast file
-    latest_podcast = max(podcast_files, key=os.path.getctime)
+    print("🎙️ Starting podcast generation and publishing...")
     
-    # Create episodes directory if it doesn't exist
-    os.makedirs('episodes', exist_ok=True)
+    # Generate the podcast
+    generator = generator or PodcastGenerator(test_mode=False)
+    generated = generator.generate_podcast(resume=resume)
+    result = {'status': 'failed', 'stage': None, 'error': None, 'file': None, 'generate': generated, 'rss': None}
     
-    # Move the podcast to episodes directory
-    source_path = latest_podcast
-    dest_path = os.path.join('episodes', latest_podcast)
+    if generated['status'] != 'ok':
+        print("❌ Podcast generation failed")
+        result.update(stage='generate', error=generated['error'])
+        return result
     
-    shutil.move(source_path, dest_path)
+    # Move the podcast to episodes directory, dated on its backfill day if
+    # the run was for one (also when resumed)
+    backfill = generator.episode_inputs.get('date')
+    episode_date = date.fromisoformat(backfill) if backfill else None
+    try:
+        dest_path = publish_episode(generated['file'], backfill_time(episode_date))
+    except OSError as e:
+        # FileExistsError (the episode is already published) is an OSError too
+        print(f"❌ Error publishing episode: {e}")
+        result.update(stage='publish', error=str(e))
+        return result
+    result['file'] = dest_path
     
     print(f"✅ Podcast published: {dest_path}")
     
     # Generate RSS feed
     print("📡 Updating RSS feed...")
-    os.system('python3 generate_rss.py')
+    result['rss'] = generate_rss()
     
     print("🎉 Podcast published successfully!")
     print(f"📁 Episode: {dest_path}")
     print("📡 RSS URL: https://youthlenstoday.github.io/podcast/rss.xml")
     
-    return True
+    result['status'] = 'ok'
+    return result
 
 if __name__ == '__main__':
-    publish_podcast() 
\ No newline at end of file
+    resume = None
+    if '--resume' in sys.argv:
+        index = sys.argv.index('--resume')
+        if index + 1 >= len(sys.argv):
+            print("❌ Usage: python3 publish_podcast.py [--resume <run-id>]")
+            sys.exit(1)
+        resume = sys.argv[index + 1]
+    sys.exit(0 if publish_podcast(resume=resume)['status'] == 'ok' else 1)
@@ -0,0 +1,115 @@
+"""
+Episode renditions for Youth Lens Today
+Encodes smaller versions of a finished episode (e.g. 64k mono MP3 and Opus)
+side by side, so the feed can offer them as alternate enclosures
+"""
+
+import mmap
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from mp3_tools import MONO, find_first_frame, id3v2_size, mp3_duration
+
+# encoder, container format, file extension and MIME type per codec
+CODECS = {
+    'mp3': ('libmp3lame', 'mp3', 'mp3', 'audio/mpeg'),
+    'opus': ('libopus', 'ogg', 'opus', 'audio/ogg'),
+    'aac': ('aac', 'ipod', 'm4a', 'audio/mp4'),
+}
+
+DEFAULT_RENDITIONS = [
+    {'name': '64k-mono', 'codec': 'mp3', 'bitrate': '64k', 'channels': 1},
+    {'name': 'opus-32k', 'codec': 'opus', 'bitrate': '32k', 'channels': 1},
+]
+
+
+def bits_per_second(bitrate):
+    """64000 from "64k" (or a plain number)"""
+    bitrate = str(bitrate).strip().lower()
+    return int(float(bitrate[:-1]) * 1000) if bitrate.endswith('k') else int(bitrate)
+
+
+def mp3_format(path):
+    """(bits per second, channels) of an MP3's first frame, or None if it isn't one"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            _, header = find_first_frame(data, id3v2_size(data))
+    if header is None:
+        return None
+    return header['bitrate'], 1 if header['channel_mode'] == MONO else 2
+
+
+def rendition_filename(filename, spec):
+    """Youth_Lens_Today_X.64k-mono.mp3 for Youth_Lens_Today_X.mp3"""
+    return f"{os.path.splitext(filename)[0]}.{spec['name']}.{CODECS[spec['codec']][2]}"
+
+
+def transcode(source, output, spec, ffmpeg='ffmpeg'):
+    """Encode one rendition of source into output + ".part", flushed to disk.
+
+    Returns the partial file's path; the caller renames it into place.
+    """
+    encoder, container, _, _ = CODECS[spec['codec']]
+    partial = f"{output}.part"
+    cmd = [ffmpeg, '-hide_banner', '-nostdin', '-loglevel', 'error', '-i', source, '-vn',
+           '-ac', str(spec.get('channels', 2)), '-c:a', encoder, '-b:a', str(spec['bitrate']),
+           '-f', container, partial, '-y']
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+        with open(partial, 'rb') as f:
+            os.fsync(f.fileno())
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return partial
+
+
+def make_renditions(source, directory, filename, specs, ffmpeg='ffmpeg', workers=None):
+    """Encode every rendition of source at once, each in its own ffmpeg process.
+
+    Returns one manifest record per rendition that succeeded (name, filename,
+    type, bitrate, channels, size, duration) with 'partial' holding the file
+    to rename into directory. Renditions that would copy the source (an MP3
+    at its bitrate and channels) aren't encoded, and failed ones are
+    reported; both are skipped.
+    """
+    source_duration = round(mp3_duration(source), 3)
+    source_format = mp3_format(source)
+    duplicates = [spec for spec in specs if spec['codec'] == 'mp3' and source_format ==
+                  (bits_per_second(spec['bitrate']), spec.get('channels', 2))]
+    for spec in duplicates:
+        print(f"⏭️  Skipping the {spec['name']} rendition: it would be a copy of the episode")
+    specs = [spec for spec in specs if spec not in duplicates]
+    if not specs:
+        return []
+
+    def encode(spec):
+        output = os.path.join(directory, rendition_filename(filename, spec))
+        partial = transcode(source, output, spec, ffmpeg)
+        return {
+            'name': spec['name'],
+            'filename': os.path.basename(output),
+            'type': CODECS[spec['codec']][3],
+            'codec': spec['codec'],
+            'bitrate': bits_per_second(spec['bitrate']),
+            'channels': spec.get('channels', 2),
+            'size': os.path.getsize(partial),
+            'duration': round(mp3_duration(partial), 3) if spec['codec'] == 'mp3' else source_duration,
+            'partial': partial,
+        }
+
+    renditions = []
+    with ThreadPoolExecutor(max_workers=workers or min(len(specs), os.cpu_count() or 1) or 1) as pool:
+        for spec, future in [(spec, pool.submit(encode, spec)) for spec in specs]:
+            try:
+                renditions.append(future.result())
+            except subprocess.CalledProcessError as e:
+                errors = e.stderr.decode(errors='replace').strip().splitlines()
+                print(f"⚠️  Warning: {spec['name']} rendition failed: {errors[-1] if errors else e}")
+            except (ValueError, OSError) as e:
+                print(f"⚠️  Warning: {spec['name']} rendition failed: {e}")
+    return renditions
@@ -1,14 +1,20 @@
 #!/usr/bin/env python3
 """
 Podcast Automation Scheduler
-Run this script to generate a podcast episode on schedule
+Run this script to generate a podcast episode on schedule, either once (from
+cron) or with --daemon as a long-running process with a built-in schedule
 """
 
 import os
 import sys
+import json
+import signal
 import logging
-from datetime import datetime
-from podcast_generator import PodcastGenerator
+import threading
+import time
+from datetime import datetime, time as day_time, timedelta
+from pipeline_state import atomic_write
+from settings import get_setting
 
 # Set up logging
 logging.basicConfig(
@@ -20,19 +26,251 @@ logging.basicConfig(
     ]
 )
 
-def main():
-    """Main function for scheduled podcast generation"""
-    
+DAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+STATUS_FILE = 'scheduler_status.json'
+
+# Generation time to plan for is this multiple of the slowest recent run,
+# and never less than MIN_LEAD
+LEAD_SAFETY = 1.5
+RECENT_RUNS = 5
+MIN_LEAD = timedelta(minutes=10)
+
+def parse_schedule(times, days):
+    """[(hour, minute)] and weekday numbers from "07:00,19:00" and "mon,wed,fri" (or "daily")"""
+    slots = []
+    for value in str(times).split(','):
+        hour, minute = value.strip().split(':')
+        slots.append((int(hour), int(minute)))
+    if str(days).strip().lower() in ('', 'daily', '*'):
+        weekdays = set(range(7))
+    else:
+        weekdays = {DAYS.index(day.strip().lower()[:3]) for day in str(days).split(',')}
+    return sorted(slots), weekdays
+
+def next_slots(times, weekdays, after, count=3):
+    """The next count publish times after the given datetime"""
+    slots = []
+    day = after.date()
+    while len(slots) < count:
+        if day.weekday() in weekdays:
+            for hour, minute in times:
+                slot = datetime.combine(day, day_time(hour, minute))
+                if slot > after:
+                    slots.append(slot)
+        day += timedelta(days=1)
+    return slots[:count]
+
+class SchedulerDaemon:
+    """Generates an episode ahead of each publish time and publishes it on the slot.
+
+    One HTTP transport, audio cache, key pool and set of API limits is kept for the life
+    of the process. Generation starts early enough to finish before the slot
+    (judged from recent runs), and what is running, what is queued and the
+    next deadline are kept in a JSON status file.
+    """
+
+    def __init__(self, status_file=STATUS_FILE):
+        from podcast_generator import new_api_limits, new_audio_cache, new_key_pool, new_transport
+        self.status_file = status_file
+        self.times, self.weekdays = parse_schedule(get_setting('PUBLISH_TIMES', '07:00'),
+                                                   get_setting('PUBLISH_DAYS', 'daily'))
+        self.default_lead = timedelta(minutes=float(get_setting('PUBLISH_LEAD_MINUTES', 60, cast=float)))
+        self.retries = int(get_setting('SCHEDULE_RETRIES', 2, cast=int))
+        self.shared = {
+            'transport': new_transport(),
+            'audio_cache': new_audio_cache(),
+            'api_limits': new_api_limits(),
+            'key_pool': new_key_pool(),
+        }
+        self.stopping = threading.Event()
+
+        previous = {}
+        try:
+            with open(status_file, encoding='utf-8') as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            pass
+        self.status = {
+            'pid': os.getpid(),
+            'started': datetime.now().isoformat(timespec='seconds'),
+            'state': 'idle',
+            'current': previous.get('current'),
+            'next': None,
+            'queue': [],
+            'last': previous.get('last'),
+            'durations': previous.get('durations', []),
+        }
+
+    def write_status(self, **changes):
+        self.status.update(changes)
+        self.status['updated'] = datetime.now().isoformat(timespec='seconds')
+        atomic_write(self.status_file, json.dumps(self.status, indent=2))
+
+    def lead(self):
+        """How long before a slot generation should start"""
+        recent = self.status['durations'][-RECENT_RUNS:]
+        if not recent:
+            return self.default_lead
+        return max(MIN_LEAD, timedelta(seconds=max(recent) * LEAD_SAFETY))
+
+    def warm_up(self, generator):
+        """Open connections to both APIs so the first real requests skip the handshakes"""
+        transport = self.shared['transport']
+        for url, headers in ((f"{generator.openai_base_url}/models", generator.openai_headers),
+                             (f"{generator.elevenlabs_base_url}/user", generator.elevenlabs_headers_1)):
+            try:
+                transport.get(url, headers=headers, deadline=time.monotonic() + 10).close()
+            except Exception as e:
+                logging.warning(f"⚠️  Warm-up request to {url} failed: {e}")
+
+    def generate(self, slot, run_id=None):
+        """Generate the episode for a slot, resuming its run after a failure.
+
+        Returns the generator holding the finished episode, or None.
+        """
+        from podcast_generator import PodcastGenerator
+        for attempt in range(self.retries + 1):
+            generator = PodcastGenerator(**self.shared)
+            if attempt == 0:
+                self.warm_up(generator)
+            result = {}
+
+            def work():
+                try:
+                    result['success'] = generator.generate_podcast(resume=run_id)['status'] == 'ok'
+                except Exception as e:
+                    logging.error(f"❌ Error during podcast generation: {e}")
+                    result['success'] = False
+
+            # A daemon thread, so stopping doesn't wait for the run; its
+            # checkpoints let the next start resume it
+            worker = threading.Thread(target=work, daemon=True)
+            worker.start()
+            while worker.is_alive():
+                if generator.run:
+                    run_id = generator.run.run_id
+                    self.write_status(current={'slot': slot.isoformat(), 'run_id': run_id,
+                                               'attempt': attempt + 1, 'stages': generator.run.stages()})
+                worker.join(10)
+                if self.stopping.is_set():
+                    return None
+
+            if generator.run:
+                run_id = generator.run.run_id
+            if result['success']:
+                return generator
+            if datetime.now() >= slot or attempt == self.retries:
+                break
+            logging.warning(f"⚠️  Generation failed, retrying run {run_id} in a minute")
+            if self.stopping.wait(60):
+                return None
+        return None
+
+    def run_slot(self, slot):
+        """Generate, wait for the slot, then publish"""
+        from generate_rss import generate_rss
+        from publish_podcast import publish_episode
+
+        # Pick up a run for this slot that an earlier daemon didn't finish
+        current = self.status['current']
+        run_id = current['run_id'] if current and current.get('slot') == slot.isoformat() else None
+
+        logging.info(f"🎙️ Generating episode for {slot:%Y-%m-%d %H:%M}...")
+        self.write_status(state='generating', current={'slot': slot.isoformat(), 'run_id': run_id, 'stages': []})
+        started = time.monotonic()
+        generator = self.generate(slot, run_id)
+        if self.stopping.is_set():
+            return
+
+        if generator is None:
+            logging.error(f"❌ Podcast generation for {slot:%Y-%m-%d %H:%M} failed!")
+            self.write_status(state='idle', current=None,
+                              last={'slot': slot.isoformat(), 'status': 'failed',
+                                    'run_id': self.status['current'] and self.status['current'].get('run_id')})
+            return
+
+        seconds = round(time.monotonic() - started, 1)
+        self.status['durations'] = (self.status['durations'] + [seconds])[-RECENT_RUNS:]
+        logging.info(f"✅ Episode ready in {seconds}s, publishing at {slot:%H:%M}")
+        self.write_status(state='waiting')
+        while not self.stopping.is_set() and datetime.now() < slot:
+            self.stopping.wait(min(60, (slot - datetime.now()).total_seconds()))
+        if self.stopping.is_set():
+            return
+
+        # A failed publish is recorded and the daemon carries on with the next slot
+        self.write_status(state='publishing')
+        dest_path = None
+        try:
+            dest_path = publish_episode(generator.final_audio_file)
+            generate_rss()
+        except Exception as e:
+            stage = 'rss' if dest_path else 'publish'
+            logging.error(f"❌ Error publishing episode for {slot:%Y-%m-%d %H:%M} ({stage}): {e}")
+            self.write_status(state='idle', current=None,
+                              last={'slot': slot.isoformat(), 'status': 'failed', 'stage': stage, 'error': str(e),
+                                    'run_id': generator.run.run_id, 'file': dest_path, 'seconds': seconds})
+            return
+        logging.info(f"✅ Podcast published: {dest_path}")
+        self.write_status(state='idle', current=None,
+                          last={'slot': slot.isoformat(), 'status': 'published',
+                                'run_id': generator.run.run_id, 'file': dest_path, 'seconds': seconds})
+
+    def run(self):
+        """Loop until SIGTERM/SIGINT, handling one slot at a time"""
+        logging.info(f"🕰️ Scheduler daemon started (pid {os.getpid()}), status in {self.status_file}")
+        handled = None
+        while not self.stopping.is_set():
+            now = datetime.now()
+            slots = next_slots(self.times, self.weekdays, max(now, handled) if handled else now)
+            slot, start_at = slots[0], slots[0] - self.lead()
+            self.write_status(next={'slot': slot.isoformat(), 'start_at': start_at.isoformat(timespec='seconds')},
+                              queue=[s.isoformat() for s in slots[1:]])
+            if now < start_at:
+                self.stopping.wait(min(60, (start_at - now).total_seconds()))
+                continue
+            self.run_slot(slot)
+            handled = slot
+
+        self.write_status(state='stopped')
+        self.shared['transport'].close()
+        logging.info("🛑 Scheduler daemon stopped")
+
+    def stop(self, *args):
+        self.stopping.set()
+
+def run_daemon():
+    """Run the scheduler as a long-lived process until SIGTERM/SIGINT.
+
+    Returns a result dict: status ("failed" if the last slot failed, else
+    "ok"), last (the last slot's result) and the daemon's final status.
+    """
+    daemon = SchedulerDaemon(get_setting('SCHEDULER_STATUS_FILE', STATUS_FILE))
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.run()
+    last = daemon.status['last']
+    return {
+        'status': 'failed' if last and last.get('status') == 'failed' else 'ok',
+        'last': last,
+        'daemon': daemon.status,
+    }
+
+def run_once():
+    """Generate one episode now; returns the generator's result dict
+    (status "failed" with the error if it raised)"""
     try:
         logging.info("🎙️ Starting scheduled podcast generation...")
         
+        from podcast_generator import PodcastGenerator
+        
         # Initialize the podcast generator
         generator = PodcastGenerator()
         
         # Generate the podcast
-        success = generator.generate_podcast()
+        result = generator.generate_podcast()
         
-        if success:
+        if result['status'] == 'ok':
             logging.info("✅ Podcast generation completed successfully!")
             
             # Optional: Add upload logic here
@@ -41,11 +279,16 @@ def main():
             
         else:
             logging.error("❌ Podcast generation failed!")
-            sys.exit(1)
+        return result
             
     except Exception as e:
         logging.error(f"❌ Error during podcast generation: {e}")
-        sys.exit(1)
+        return {'status': 'failed', 'error': str(e)}
+
+def main():
+    """Main function for scheduled podcast generation"""
+    result = run_daemon() if "--daemon" in sys.argv else run_once()
+    sys.exit(0 if result['status'] == 'ok' else 1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main() 
@@ -0,0 +1,69 @@
+"""
+Script validation for Youth Lens Today segments
+Quick checks on each generated segment before it goes to text-to-speech:
+length, leftover formatting, citations, repetition, and the intro's welcome
+and the outro's sign-off
+"""
+
+import re
+
+from text_cleaner import MARKER, split_sentences
+
+# (minimum, maximum) characters per kind of segment: the prompts ask for one
+# paragraph for the intro and outro and 2,000+ characters per story
+LENGTH_LIMITS = {'intro': (200, 1500), 'story': (2000, 9000), 'outro': (200, 1500)}
+
+# Share of a segment's sentences that may repeat an earlier one
+MAX_REPEAT_RATIO = 0.1
+
+# Formatting the prompts forbid, by name
+FORMATTING = (
+    ('markdown', re.compile(r'\*\*|__|^\s*#+\s', re.MULTILINE)),
+    ('list items', re.compile(r'^\s*(?:[-*•]|\d+[.)])\s+', re.MULTILINE)),
+    ('headers', re.compile(r'^\s*[A-Z][A-Z0-9 ]{3,}:?\s*$', re.MULTILINE)),
+    ('section markers', MARKER),
+    ('speaker labels', re.compile(r'^\s*[A-Z][a-z]+(?: [A-Z][a-z]+)?:\s', re.MULTILINE)),
+    ('stage directions', re.compile(r'\[[^\]\n]*\]|\((?:music|laughs?|pause|sighs?|applause)[^)\n]*\)',
+                                    re.IGNORECASE)),
+)
+
+# Links and citation markers left in by web search
+CITATION = re.compile(r'https?://|www\.|\]\(|【')
+
+WELCOME = re.compile(r'\bwelcome\b|\byouth lens today\b', re.IGNORECASE)
+SIGN_OFF = re.compile(r"\b(?:thanks? (?:you )?for (?:listening|joining|tuning in)|until next time|see you|"
+                      r"signing off|goodbye|take care)\b", re.IGNORECASE)
+
+
+def repeat_ratio(text):
+    """Share of sentences that repeat an earlier one (ignoring case and spacing)"""
+    sentences = [sentence.lower() for sentence in split_sentences(text)]
+    if not sentences:
+        return 0.0
+    return (len(sentences) - len(set(sentences))) / len(sentences)
+
+
+def validate_segment(segment, text):
+    """Problems with a segment's text, as short descriptions (empty if it passes)"""
+    problems = []
+    low, high = LENGTH_LIMITS[segment['kind']]
+    if len(text) < low:
+        problems.append(f"is too short ({len(text):,} characters, at least {low:,} expected)")
+    elif len(text) > high:
+        problems.append(f"is too long ({len(text):,} characters, at most {high:,} expected)")
+
+    found = [name for name, pattern in FORMATTING if pattern.search(text)]
+    if found:
+        problems.append(f"has {', '.join(found)}")
+    if CITATION.search(text):
+        problems.append("has links or source citations")
+
+    ratio = repeat_ratio(text)
+    if ratio > MAX_REPEAT_RATIO:
+        problems.append(f"repeats itself ({ratio:.0%} of sentences)")
+
+    if segment['kind'] == 'intro' and not WELCOME.search(text):
+        problems.append("doesn't welcome listeners to the show")
+    elif segment['kind'] == 'outro' and not SIGN_OFF.search(text):
+        problems.append("doesn't sign off")
+    return problems
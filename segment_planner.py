@@ -0,0 +1,305 @@
+"""
+Segment planner for Youth Lens Today episodes
+Breaks an outline into intro, three stories and outro, assigns each segment
+to a host from the roster, and builds the segment prompts
+"""
+
+import json
+import re
+from datetime import date
+
+STORY_COUNT = 3
+ORDINALS = ['first', 'second', 'third']
+
+# "1. US Domestic Story: ..." style lines from the outline prompt
+STORY_HEADING = re.compile(r'^[ \t#*]*([1-3])[.):][^\n]*story', re.MULTILINE | re.IGNORECASE)
+# Any numbered line, used when the outline drops the word "Story"
+NUMBERED_LINE = re.compile(r'^[ \t#*]*([1-3])[.):]', re.MULTILINE)
+
+# The rules every segment follows, each said once
+RULES = """- Today is {date}
+- Write a first-person monologue in plain paragraphs: no dialogue, stage directions, section titles or headers
+- No markdown (no **bold** or *italic*), bullet points or lists (no "-" or "*" at the start of lines)
+- No source citations or links (no parentheses with URLs), weather reports or casual content
+- Serious, detailed news analysis in a natural, conversational tone
+- Every sentence is unique and adds to the story; never repeat a sentence or paragraph"""
+
+# Fields of each story in a structured outline: text fields, then lists of strings
+STORY_TEXT_FIELDS = ('kind', 'title', 'summary', 'implications', 'status')
+STORY_LIST_FIELDS = ('facts', 'players', 'dates')
+
+# Rough prompt size in tokens, for reporting savings without a tokenizer
+CHARS_PER_TOKEN = 4
+
+# OpenAI bills a repeated prompt prefix as cached only from this many tokens
+# on, in steps of CACHE_STEP_TOKENS
+CACHE_MIN_TOKENS = 1024
+CACHE_STEP_TOKENS = 128
+
+# Characters of fixed instructions (system and user messages, without the
+# outline) in each prompt of the old layout: two calls, HALF 1 and HALF 2,
+# each with the whole outline
+LEGACY_HALF_PROMPT_CHARS = (1393, 1399)
+
+
+def _strip_fence(text):
+    """The text inside a ```json ... ``` fence, if the whole reply is one"""
+    match = re.fullmatch(r'\s*```(?:json)?\s*(.*?)\s*```\s*', text, re.DOTALL)
+    return match.group(1) if match else text
+
+
+def validate_outline(data):
+    """Check and normalize a structured outline; raises ValueError if it's malformed.
+
+    Returns {'stories': [...]} with exactly three stories, each numbered by
+    position and holding only the known fields.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('stories'), list):
+        raise ValueError("expected an object with a \"stories\" list")
+    if len(data['stories']) != STORY_COUNT:
+        raise ValueError(f"expected {STORY_COUNT} stories, got {len(data['stories'])}")
+
+    stories = []
+    for number, story in enumerate(data['stories'], start=1):
+        if not isinstance(story, dict):
+            raise ValueError(f"story {number} is not an object")
+        clean = {'id': number}
+        for field in STORY_TEXT_FIELDS:
+            value = story.get(field) or ''
+            if not isinstance(value, str):
+                raise ValueError(f"story {number}: \"{field}\" must be a string")
+            if value.strip():
+                clean[field] = value.strip()
+        for field in STORY_LIST_FIELDS:
+            values = story.get(field) or []
+            if isinstance(values, str):
+                values = [values]
+            if not isinstance(values, list) or not all(isinstance(value, (str, int, float)) for value in values):
+                raise ValueError(f"story {number}: \"{field}\" must be a list of strings")
+            values = [str(value).strip() for value in values if str(value).strip()]
+            if values:
+                clean[field] = values
+        if 'title' not in clean:
+            raise ValueError(f"story {number} has no title")
+        if 'facts' not in clean and 'summary' not in clean:
+            raise ValueError(f"story {number} has neither facts nor a summary")
+        stories.append(clean)
+    return {'stories': stories}
+
+
+def parse_outline(text):
+    """The structured outline in an outline text, or None if it's free text.
+
+    Raises ValueError for JSON that doesn't match the outline schema.
+    """
+    text = _strip_fence(text or '').strip()
+    if not text.startswith('{'):
+        return None
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f"outline is not valid JSON: {e}")
+    return validate_outline(data)
+
+
+def format_story(story):
+    """One story of a structured outline as compact prompt text"""
+    kind = f" ({story['kind']})" if 'kind' in story else ''
+    lines = [f"Story {story['id']}{kind}: {story['title']}"]
+    if 'summary' in story:
+        lines.append(story['summary'])
+    for fact in story.get('facts', []):
+        lines.append(f"- {fact}")
+    if 'players' in story:
+        lines.append(f"Players: {'; '.join(story['players'])}")
+    if 'dates' in story:
+        lines.append(f"Dates: {'; '.join(story['dates'])}")
+    if 'implications' in story:
+        lines.append(f"Why it matters: {story['implications']}")
+    if 'status' in story:
+        lines.append(f"Status: {story['status']}")
+    return '\n'.join(lines)
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def cached_prefix_tokens(prefix_tokens):
+    """Tokens of a repeated prompt prefix that the API would bill as cached"""
+    if prefix_tokens < CACHE_MIN_TOKENS:
+        return 0
+    return prefix_tokens // CACHE_STEP_TOKENS * CACHE_STEP_TOKENS
+
+
+def split_outline_stories(outline):
+    """Split an outline into its three numbered stories, or None if it can't be parsed"""
+    for pattern in (STORY_HEADING, NUMBERED_LINE):
+        starts = []
+        for match in pattern.finditer(outline):
+            if int(match.group(1)) == len(starts) + 1:
+                starts.append(match.start())
+                if len(starts) == STORY_COUNT:
+                    break
+
+        if len(starts) == STORY_COUNT:
+            ends = starts[1:] + [len(outline)]
+            return [outline[start:end].strip() for start, end in zip(starts, ends)]
+
+    return None
+
+
+def story_host_index(story, host_count):
+    """Index of the host covering a story (0-based).
+
+    Stories are handed out in contiguous blocks with the later hosts taking
+    the extra ones, so two hosts split them 1/2 like the original HALF 1/HALF 2
+    layout and three hosts get one story each.
+    """
+    return host_count - 1 - ((STORY_COUNT - 1 - story) * host_count) // STORY_COUNT
+
+
+def plan_segments(outline, hosts):
+    """Plan the intro, story and outro segments for an episode.
+
+    Every segment carries the same compact outline (a structured outline is
+    reformatted, a free-text one is sent as it is), which goes in the shared
+    system prompt; the segments only differ in their task.
+    """
+    if not hosts:
+        raise ValueError("At least one host is required")
+
+    try:
+        structured = parse_outline(outline)
+    except ValueError as e:
+        print(f"⚠️  Warning: {e}, using the outline as free text")
+        structured = None
+
+    if structured:
+        outline = '\n\n'.join(format_story(story) for story in structured['stories'])
+    elif split_outline_stories(outline) is None:
+        print("⚠️  Warning: could not find 3 numbered stories in outline, the segments may not agree on them")
+
+    segments = [{'id': 'intro', 'kind': 'intro', 'host': hosts[0], 'outline': outline}]
+    for story in range(STORY_COUNT):
+        segments.append({
+            'id': f'story{story + 1}',
+            'kind': 'story',
+            'story': story + 1,
+            'host': hosts[story_host_index(story, len(hosts))],
+            'outline': outline,
+        })
+    segments.append({'id': 'outro', 'kind': 'outro', 'host': hosts[-1], 'outline': outline})
+
+    for index, segment in enumerate(segments):
+        segment['index'] = index
+    return segments
+
+
+def group_segments_by_host(segments):
+    """Group consecutive segments spoken by the same host into [(host, [segments])]"""
+    groups = []
+    for segment in segments:
+        if groups and groups[-1][0] is segment['host']:
+            groups[-1][1].append(segment)
+        else:
+            groups.append((segment['host'], [segment]))
+    return groups
+
+
+def _transition(segments, segment):
+    """Describe how a segment should hand off to the next one"""
+    following = segments[segment['index'] + 1]
+    if following['kind'] == 'outro':
+        if following['host'] is segment['host']:
+            return "End with a transition into your closing remarks."
+        return f"End with a transition handing off to {following['host']['name']} for the closing remarks."
+
+    topic = f"the {ORDINALS[following['story'] - 1]} story"
+    if following['host'] is segment['host']:
+        return f"End with a transition to {topic}."
+    return f"End with a transition handing off to {following['host']['name']}, who covers {topic}."
+
+
+def format_episode_date(episode_date=None):
+    """Spoken form of an episode's date, e.g. "July 23, 2025" (today if None)"""
+    episode_date = episode_date or date.today()
+    return f"{episode_date:%B} {episode_date.day}, {episode_date.year}"
+
+
+def _segment_task(segments, segment, hosts):
+    """What one segment should say, as a line of the run of show"""
+    host = segment['host']['name']
+    if segment['kind'] == 'intro':
+        return f"Intro, by {host}: welcome listeners, give the date, sum up the 3 stories. {_transition(segments, segment)}"
+    if segment['kind'] == 'story':
+        return f"Story {segment['story']}, by {host}. {_transition(segments, segment)}"
+    names = ', '.join(h['name'] for h in hosts)
+    return f"Outro, by {host}: reflect on all 3 stories, ask listeners to follow, and end with all hosts signing off ({names})."
+
+
+def shared_system_prompt(segments, hosts, episode_date=None):
+    """The system message every segment of an episode starts with.
+
+    It holds the whole episode (the show, the rules, the run of show and the
+    outline), which is the same for every segment, so the prompts share one
+    identical prefix. Once the outline is around 700 tokens the prefix is
+    past CACHE_MIN_TOKENS and OpenAI bills it as cached after the first
+    segment.
+    """
+    names = ', '.join(h['name'] for h in hosts)
+    rules = RULES.format(date=format_episode_date(episode_date))
+    run_of_show = '\n'.join(f"- {_segment_task(segments, segment, hosts)}" for segment in segments)
+    return f"""You are writing one segment of Youth Lens Today, a news podcast hosted by {names}. Each segment is written by one host in the first person; the user message says which one to write.
+
+RULES FOR EVERY SEGMENT:
+{rules}
+
+RUN OF SHOW (the intro and outro are one paragraph each; each story is covered in detail, 2,000+ characters with context, background and implications, and has no welcome or sign-off):
+{run_of_show}
+
+EPISODE OUTLINE:
+{segments[0]['outline']}"""
+
+
+def build_segment_prompt(segments, segment, hosts, episode_date=None):
+    """Build the (system, user) messages for one segment"""
+    label = f"story {segment['story']}" if segment['kind'] == 'story' else segment['kind']
+    task = f"Write the {label} segment as {segment['host']['name']}."
+    return shared_system_prompt(segments, hosts, episode_date), task
+
+
+def prompt_report(segments, hosts, outline, episode_date=None, cached_rate=0.5):
+    """Estimated prompt tokens of the planned segments, against the old layout.
+
+    The old layout sent the whole outline in two prompts (HALF 1 and HALF 2).
+    shared_tokens is the system prefix the segments have in common and
+    cached_tokens what the API would bill as cached for it across the
+    episode; billed_tokens counts those at cached_rate of the input price.
+    saved_tokens compares billed_tokens with the old prompts, which had no
+    common prefix to cache, and is negative when the segments cost more.
+    """
+    try:
+        structured = parse_outline(outline)
+    except ValueError:
+        structured = None
+    full_outline = '\n\n'.join(format_story(story) for story in structured['stories']) if structured else outline
+
+    sent = 0
+    for segment in segments:
+        system, user = build_segment_prompt(segments, segment, hosts, episode_date)
+        sent += estimate_tokens(system) + estimate_tokens(user)
+    baseline = sum((fixed + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN + estimate_tokens(full_outline)
+                   for fixed in LEGACY_HALF_PROMPT_CHARS)
+    shared = estimate_tokens(shared_system_prompt(segments, hosts, episode_date))
+    cached = cached_prefix_tokens(shared) * (len(segments) - 1)
+    billed = sent - cached + round(cached * cached_rate)
+    return {
+        'structured': structured is not None,
+        'prompt_tokens': sent,
+        'baseline_tokens': baseline,
+        'billed_tokens': billed,
+        'saved_tokens': baseline - billed,
+        'shared_tokens': shared,
+        'cached_tokens': cached,
+    }
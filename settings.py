@@ -0,0 +1,30 @@
+"""
+Optional settings for the podcast pipeline
+Looks a setting up in config_local.py first, then in environment variables
+"""
+
+import os
+
+
+def get_setting(name, default=None, cast=None):
+    """Return a setting from config_local.py or the environment.
+
+    Values from config_local.py are returned as-is. Environment values are
+    strings, so `cast` (e.g. int or json.loads) is applied to them.
+    """
+    try:
+        import config_local
+        if hasattr(config_local, name):
+            return getattr(config_local, name)
+    except ImportError:
+        pass
+
+    value = os.getenv(name)
+    if value is None or value == '':
+        return default
+    return cast(value) if cast else value
+
+
+def as_bool(value):
+    """Parse an environment string like "1", "true" or "no" as a boolean"""
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
@@ -0,0 +1,306 @@
+"""
+Text cleaning for audio synthesis
+Strips markdown, lists, citations and section markers from a script and
+drops repeated sentences. One precompiled tokenizer walks the text once,
+deciding each line and cutting sentences as it goes; contrived input where
+the original cleaner's passes would interact goes through those passes
+instead, so the output is always exactly the original's (checked by
+bench_clean_text.py)
+"""
+
+import re
+
+# A "-" bullet at the start of a line (asterisks are already gone by then)
+BULLET = re.compile(r'^\s*-\s*', re.MULTILINE)
+
+# Source citations: anything in parentheses or brackets containing https
+PAREN_CITATION = re.compile(r'\s*\([^)]*https[^)]*\)')
+BRACKET_CITATION = re.compile(r'\s*\[[^\]]*https[^\]]*\]')
+
+# Section markers and formatting artifacts, removed in this order
+MARKERS = (
+    'HALF 1:', 'HALF 2:',
+    'HOST 1:', 'HOST 2:',
+    'SEGMENT 1:', 'SEGMENT 2:', 'SEGMENT 3:',
+    'INTRO:', 'OUTRO:',
+    'Transition to Segment 2:', 'Transition to Segment 3:',
+    '===', '---',
+)
+MARKER = re.compile('|'.join(re.escape(marker) for marker in MARKERS))
+
+# Header lines made only of capitals and spaces
+ALL_CAPS = re.compile(r'[A-Z\s]+')
+
+SENTENCE_BREAK = re.compile(r'[.!?]+')
+
+# Lines starting with these are formatting, headers or leftover bullets
+SKIP_PREFIXES = ('===', '#', '-')
+
+# The tokenizer works on the text as it is, asterisks included, so "https"
+# matches with asterisks anywhere inside it, as it would once they were
+# dropped. A run of text goes up to the next line break, asterisk, stop or
+# bracket; markers are found inside it.
+_STARRED_HTTPS = r'\**'.join('https')
+TOKEN = re.compile(
+    r'(?P<text>[^\s*.!?(\[][^\n*.!?(\[]*)'
+    r'|(?P<space>[^\S\n]+)'
+    r'|(?P<newline>\n)'
+    r'|(?P<stop>[.!?][.!?*]*)'
+    r'|(?P<star>\*+)'
+    rf'|(?P<cite>\([^)]*{_STARRED_HTTPS}[^)]*\)|\[[^\]]*{_STARRED_HTTPS}[^\]]*\])'
+    r'|(?P<other>.)',
+    re.DOTALL,
+)
+BULLET_TOKEN = re.compile(r'-[\s*]*')
+
+# Characters that can be part of a marker, and the longest marker
+MARKER_CHARS = frozenset(''.join(MARKERS))
+MARKER_LENGTH = max(len(marker) for marker in MARKERS)
+
+
+class _Interaction(Exception):
+    """Raised by the tokenizer when one removal could change another"""
+
+
+def _remove_markers(text):
+    """Remove every marker in one scan.
+
+    The original chain of str.replace calls could, in contrived input, form a
+    new marker by removing another (e.g. "--===-"). A marker surviving the
+    scan is the only sign of that, so then the chain is replayed for an
+    identical result.
+    """
+    removed = MARKER.sub('', text)
+    if MARKER.search(removed) is None:
+        return removed
+    for marker in MARKERS:
+        text = text.replace(marker, '')
+    return text
+
+
+def split_sentences(text):
+    """Sentences of already-cleaned text, as clean_text_for_audio splits them"""
+    return [sentence for sentence in (' '.join(s.split()) for s in SENTENCE_BREAK.split(text))
+            if len(sentence) > 10]
+
+
+def clean_text_for_audio(text, dedup=None):
+    """Clean text to remove formatting artifacts and prepare for audio synthesis.
+
+    Repeated sentences are dropped when they match an earlier one exactly
+    (ignoring case and spacing), or, if a near_dedup.NearDuplicateFilter is
+    passed as dedup, when they are near-duplicates of any sentence it has seen.
+    """
+    return '. '.join(clean_sentences(text, dedup=dedup)) + '.'
+
+
+def _following(text, end):
+    """What follows text[end] on its line once cleaned, or at least the first
+    MARKER_LENGTH characters of it; None if that can't be told without
+    cleaning further"""
+    right = ''
+    limit = 4 * MARKER_LENGTH
+    while len(right) < MARKER_LENGTH:
+        window = text[end:end + limit]
+        stop = len(window)
+        for char in '([\n':
+            index = window.find(char, 0, stop)
+            if index >= 0:
+                stop = index
+        piece = window[:stop].replace('*', '')
+        if stop == len(window):
+            right += MARKER.sub('', piece)
+            # A marker cut off at the end of the window could hide what's next
+            return right if end + stop == len(text) or len(right) >= MARKER_LENGTH else None
+        if window[stop] == '\n':
+            return right + MARKER.sub('', piece)
+        cite = TOKEN.match(text, end + stop)
+        if cite.lastgroup != 'cite':
+            return right + MARKER.sub('', piece) + window[stop]
+        # The citation and the whitespace before it go, and the line goes on
+        right += MARKER.sub('', piece.rstrip())
+        end = cite.end()
+    return right
+
+
+def _joins_marker(left, text, end):
+    """Whether left (the line so far, once cleaned) and what follows text[end]
+    join into a marker, which the old cleaner would then treat differently"""
+    left = left[-(MARKER_LENGTH - 1):]
+    if not left or left[-1] not in MARKER_CHARS:
+        return False
+    right = _following(text, end)
+    if right is None:
+        return True
+    if not right or right[0] not in MARKER_CHARS:
+        return False
+    joined = left + right
+    for start in range(len(left)):
+        match = MARKER.match(joined, start)
+        if match and match.end() > len(left):
+            return True
+    return False
+
+
+def _scan_sentences(text):
+    """The substantial sentences of text, in one walk of the tokenizer.
+
+    Asterisks and bullets are dropped, citations taken out together with the
+    whitespace before them, and markers removed from each run of text as the
+    tokens come; a line is judged when it ends and its sentences are cut at
+    the stops it holds. Raises _Interaction for the contrived inputs where the
+    old cleaner's separate passes would see something this walk doesn't,
+    such as a marker formed by removing a citation.
+    """
+    sentences = []
+    sentence = []           # pieces of the sentence being read
+    lines_kept = False      # whether a line was kept yet (kept lines are joined by spaces)
+    line, stops = [], []    # pieces of the current line, and the indexes of its stops
+    gap = ''                # whitespace that a citation after it would take away
+    line_start = True       # whether a "-" here would be a bullet
+
+    def end_line():
+        nonlocal lines_kept
+        content = ''.join(line)
+        line.clear()
+        # A marker removed at the start can leave whitespace there
+        indent = len(content) - len(content.lstrip())
+        content = content.strip()
+        if not content or content.startswith(SKIP_PREFIXES) or ALL_CAPS.fullmatch(content):
+            stops.clear()
+            return
+        if lines_kept:
+            sentence.append(' ')
+        lines_kept = True
+        if not stops:
+            sentence.append(content)
+            return
+        start = 0
+        for stop, length in stops:
+            stop -= indent
+            sentence.append(content[start:stop])
+            piece = ''.join(sentence).strip()
+            if len(piece) > 10:
+                sentences.append(' '.join(piece.split()))
+            sentence.clear()
+            start = stop + length
+        sentence.append(content[start:])
+        stops.clear()
+
+    position, length = 0, len(text)
+    while position < length:
+        if line_start and text[position] == '-':
+            match = BULLET_TOKEN.match(text, position)
+            position = match.end()
+            line_start = match.group().rstrip('*').endswith('\n')
+            continue
+
+        match = TOKEN.match(text, position)
+        kind, start, position = match.lastgroup, position, match.end()
+        if kind == 'space':
+            gap += match.group()
+            continue
+        if kind == 'newline':
+            gap += '\n'
+            line_start = True
+            continue
+        if kind == 'star':
+            if _joins_marker(''.join(line) + gap, text, position):
+                raise _Interaction
+            continue
+        if kind == 'cite':
+            cite = match.group()
+            if cite[0] == '(' and ('[' in cite or ']' in cite) or cite[0] == '[' and ('(' in cite or ')' in cite):
+                raise _Interaction
+            # The whitespace before a citation goes with it, line breaks too
+            gap = ''
+            line_start = False
+            if _joins_marker(''.join(line), text, position):
+                raise _Interaction
+            continue
+
+        # Anything else keeps the whitespace before it
+        if gap:
+            if '\n' in gap:
+                end_line()
+            elif line:
+                line.append(gap)
+            gap = ''
+        line_start = False
+        if kind == 'stop':
+            stop = match.group().replace('*', '')
+            stops.append((sum(len(piece) for piece in line), len(stop)))
+            line.append(stop)
+        elif kind == 'text':
+            run = match.group()
+            body = run.rstrip()
+            gap = run[len(body):]
+            last = 0
+            for marker in MARKER.finditer(body):
+                if marker.start() > last:
+                    line.append(body[last:marker.start()])
+                last = marker.end()
+                if _joins_marker(''.join(line), text, start + last):
+                    raise _Interaction
+            if last < len(body):
+                line.append(body[last:])
+        else:
+            line.append(match.group())
+
+    end_line()
+    piece = ''.join(sentence).strip()
+    if len(piece) > 10:
+        sentences.append(' '.join(piece.split()))
+    return sentences
+
+
+def _staged_sentences(text):
+    """The substantial sentences of text, by the old cleaner's separate passes"""
+    text = text.replace('*', '')
+    text = BULLET.sub('', text)
+    if 'https' in text:
+        text = PAREN_CITATION.sub('', text)
+        text = BRACKET_CITATION.sub('', text)
+    text = _remove_markers(text)
+
+    kept = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if line and not line.startswith(SKIP_PREFIXES) and not ALL_CAPS.fullmatch(line):
+            kept.append(line)
+    sentences = []
+    for sentence in SENTENCE_BREAK.split(' '.join(kept)):
+        sentence = sentence.strip()
+        if len(sentence) > 10:
+            sentences.append(' '.join(sentence.split()))
+    return sentences
+
+
+def clean_sentences(text, dedup=None, seen=None):
+    """The sentences clean_text_for_audio keeps from text, as a list.
+
+    The text is read in one tokenizer pass (see _scan_sentences); only input
+    where the old cleaner's passes would interact goes through them instead.
+
+    seen is the set of normalized sentences already spoken; passing the same
+    set for consecutive pieces of a script drops exact repeats across them,
+    as if the pieces were cleaned as one text.
+    """
+    try:
+        sentences = _scan_sentences(text)
+    except _Interaction:
+        sentences = _staged_sentences(text)
+
+    unique_sentences = []
+    seen_sentences = set() if seen is None else seen
+    for sentence in sentences:
+        if dedup is not None:
+            if dedup.check(sentence):
+                unique_sentences.append(sentence)
+            continue
+        normalized = sentence.lower()
+        if normalized not in seen_sentences:
+            unique_sentences.append(sentence)
+            seen_sentences.add(normalized)
+
+    return unique_sentences
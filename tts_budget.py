@@ -0,0 +1,169 @@
+"""
+Text-to-speech character budget for Youth Lens Today
+ElevenLabs bills per character, so before synthesis the host scripts are
+rewritten with the shortest spoken forms of numbers, abbreviations and
+symbols, trimmed at sentence boundaries to per-host and per-episode budgets,
+and priced, so an over-budget episode is stopped before any request
+"""
+
+import re
+
+# Dotted abbreviations read the same without their periods, which also keeps
+# the cleaner from splitting sentences at them; one that ends a sentence
+# (before a capital or the end of the text) keeps a final "."
+ABBREVIATION = re.compile(r'\b(U\.S\.A|U\.S|U\.K|U\.N|E\.U|D\.C|a\.m|p\.m)\.(?!\w)(?=(\s+[A-Z]|\s*$)?)')
+
+# Symbols and spacing with shorter equivalents
+THOUSANDS = re.compile(r'(?<=\d),(?=\d{3}(?!\d))')
+PERCENT = re.compile(r'(?<=\d)\s*(?:percent|per cent)\b', re.IGNORECASE)
+DOLLARS = re.compile(r'\b(\d[\d.]*)((?: (?:thousand|million|billion|trillion))?) dollars\b', re.IGNORECASE)
+DASH = re.compile(r'\s*—\s*')
+SPACES = re.compile(r'[ \t]+')
+
+UNITS = ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten', 'eleven',
+         'twelve', 'thirteen', 'fourteen', 'fifteen', 'sixteen', 'seventeen', 'eighteen', 'nineteen']
+TENS = ['twenty', 'thirty', 'forty', 'fifty', 'sixty', 'seventy', 'eighty', 'ninety']
+SCALES = {'thousand': 10 ** 3, 'million': 10 ** 6, 'billion': 10 ** 9, 'trillion': 10 ** 12}
+_word = '|'.join(UNITS + TENS + ['hundred'] + list(SCALES))
+NUMBER_WORDS = re.compile(rf'\b(?:{_word})(?:(?:[ -]|\s+and\s+)(?:{_word}))*\b', re.IGNORECASE)
+
+# Sentences kept at the end of a trimmed host script (its hand-off or sign-off)
+KEEP_TAIL = 2
+
+
+def parse_number_words(words):
+    """Value of a spelled-out number ("twenty-five", "three hundred and two"), or None"""
+    total = current = 0
+    previous = None
+    for token in re.split(r'[\s-]+', words.lower()):
+        if token == 'and':
+            # Only "hundred and two" or "thousand and ten", never "two and three"
+            if previous != 'hundred' and previous not in SCALES:
+                return None
+            continue
+        if token in UNITS:
+            # A unit may only follow a tens word (twenty-five), hundred or a scale
+            if previous in UNITS or (previous in TENS and UNITS.index(token) >= 10) or \
+                    (previous in TENS and token == 'zero'):
+                return None
+            current += UNITS.index(token)
+        elif token in TENS:
+            if previous in UNITS or previous in TENS:
+                return None
+            current += 20 + 10 * TENS.index(token)
+        elif token == 'hundred':
+            if previous not in UNITS and previous not in TENS or current % 100 == 0 or current >= 100:
+                return None
+            current *= 100
+        else:
+            if previous is None or previous in SCALES or current == 0:
+                return None
+            total += current * SCALES[token]
+            current = 0
+        previous = token
+    return total + current
+
+
+def _in_name(match):
+    """Whether spelled-out number words are part of a compound ("nineteen-sixties")
+    or a title ("The Ten Commandments"), where digits would read differently"""
+    text, start, end = match.string, match.start(), match.end()
+    if text[start - 1:start] == '-' or re.match(r'-\w', text[end:end + 2]):
+        return True
+    words = re.split(r'[\s-]+', match.group(0))
+    if any(word[0].isupper() for word in words[1:]):
+        return True
+    if words[0][0].isupper():
+        # Capitalized at the start of a sentence is fine, unless a title follows
+        sentence_start = re.search(r'(?:^|[.!?]\s+|\n\s*)$', text[:start])
+        return not sentence_start or bool(re.match(r'\s+[A-Z]', text[end:]))
+    return False
+
+
+def _spoken_number(match):
+    """Digits for a spelled-out number when they read the same and are shorter"""
+    words = match.group(0)
+    value = parse_number_words(words)
+    # Lone "one" ... "nine" stay words: "no one" isn't "no 1", and four-digit
+    # amounts like "one thousand nine hundred ninety" would be read as years
+    if value is None or (value < 10 and words.lower() in UNITS) or _in_name(match) or \
+            (1000 <= value < 10000 and value % 1000):
+        return words
+    for scale_word, scale in sorted(SCALES.items(), key=lambda item: -item[1]):
+        if scale >= 10 ** 6 and value >= scale and (value * 1000) % scale == 0:
+            short = f"{value / scale:g} {scale_word}"
+            break
+    else:
+        short = str(value)
+    return short if len(short) < len(words) else words
+
+
+def normalize_for_speech(text):
+    """Rewrite text with the shortest forms that are read out the same.
+
+    "U.S." becomes "US", "twenty-five" "25", "3 percent" "3%", "5 million
+    dollars" "$5 million", and thousands separators and runs of spaces go.
+    Number words in compounds and titles are left alone, and paragraph
+    breaks are kept.
+    """
+    text = ABBREVIATION.sub(lambda match: match.group(1).replace('.', '').upper()
+                            + ('.' if match.group(2) is not None else ''), text)
+    text = NUMBER_WORDS.sub(_spoken_number, text)
+    text = THOUSANDS.sub('', text)
+    text = PERCENT.sub('%', text)
+    text = DOLLARS.sub(r'$\1\2', text)
+    # " — " is longer than ", " but "word—word" is shorter, so it stays
+    text = DASH.sub(lambda match: ', ' if len(match.group(0)) > 2 else match.group(0), text)
+    return SPACES.sub(' ', text)
+
+
+def trim_sentences(text, limit, keep_tail=KEEP_TAIL):
+    """Trim cleaned text (". "-joined sentences) to at most limit characters.
+
+    Sentences are dropped from the end of the body, keeping the last
+    keep_tail so the part still ends with its hand-off or sign-off.
+    """
+    if len(text) <= limit:
+        return text
+    sentences = text[:-1].split('. ') if text.endswith('.') else text.split('. ')
+    tail = sentences[-keep_tail:] if len(sentences) > keep_tail else []
+    head = sentences[:len(sentences) - len(tail)]
+    while head and len('. '.join(head + tail)) + 1 > limit:
+        head.pop()
+    return '. '.join(head + tail) + '.' if head or tail else ''
+
+
+def plan_budget(texts, host_budget=None, episode_budget=None, max_trim=0.25, price_per_1k=0.30,
+                chars_per_second=15.0):
+    """Fit cleaned host texts to the character budgets and predict what they cost.
+
+    Over an episode budget, each host gets a share in proportion to its
+    length. Returns the trimmed texts with per-host characters and trimmed
+    counts, the total characters, cost (USD) and seconds of audio, and
+    refused: why the episode shouldn't be synthesized (a host would lose more
+    than max_trim of its text), or None.
+    """
+    total = sum(len(text) for text in texts) or 1
+    planned, hosts, refused = [], [], None
+    for number, text in enumerate(texts, start=1):
+        limits = [budget for budget in (host_budget, episode_budget and int(episode_budget * len(text) / total))
+                  if budget]
+        limit = min(limits) if limits else len(text)
+        trimmed = trim_sentences(text, limit)
+        cut = len(text) - len(trimmed)
+        if text and cut / len(text) > max_trim and refused is None:
+            refused = (f"host {number}'s script ({len(text):,} characters) would lose {cut / len(text):.0%} "
+                       f"to fit its budget of {limit:,} (at most {max_trim:.0%} may be trimmed)")
+        planned.append(trimmed)
+        hosts.append({'characters': len(trimmed), 'trimmed': cut})
+
+    characters = sum(len(text) for text in planned)
+    return {
+        'texts': planned,
+        'hosts': hosts,
+        'characters': characters,
+        'trimmed': sum(host['trimmed'] for host in hosts),
+        'cost': round(characters * price_per_1k / 1000, 4),
+        'seconds': round(characters / chars_per_second, 1),
+        'refused': refused,
+    }
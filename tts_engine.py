@@ -0,0 +1,425 @@
+"""
+Chunked ElevenLabs synthesis for Youth Lens Today
+Splits each host's cleaned script into chunks, synthesizes every chunk for
+every host at once, and stitches each host's chunks back together in order,
+either for finished scripts or paragraph by paragraph as they are written
+"""
+
+import mmap
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+
+from mp3_tools import audio_range
+from text_cleaner import clean_sentences
+from tts_budget import normalize_for_speech
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+CLAUSE_END = re.compile(r'(?<=[,;:])\s+')
+
+
+def _pack(pieces, max_chars, joiner):
+    """Greedily pack pieces into strings no longer than max_chars"""
+    chunks = []
+    current = ''
+    for piece in pieces:
+        candidate = f"{current}{joiner}{piece}" if current else piece
+        if len(candidate) <= max_chars:
+            current = candidate
+        else:
+            if current:
+                chunks.append(current)
+            current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _split_long(text, max_chars):
+    """Split one over-long sentence at clause, then word boundaries"""
+    pieces = []
+    for clause in CLAUSE_END.split(text):
+        if len(clause) <= max_chars:
+            pieces.append(clause)
+            continue
+        for word in clause.split():
+            # A single word longer than the limit is cut as a last resort
+            pieces.extend(word[i:i + max_chars] for i in range(0, len(word), max_chars))
+    return _pack(pieces, max_chars, ' ')
+
+
+def split_text(text, max_chars):
+    """Split text into chunks of at most max_chars at paragraph or sentence boundaries"""
+    chunks = []
+    for paragraph in PARAGRAPH_BREAK.split(text.strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            chunks.append(paragraph)
+            continue
+
+        sentences = []
+        for sentence in SENTENCE_END.split(paragraph):
+            if len(sentence) <= max_chars:
+                sentences.append(sentence)
+            else:
+                sentences.extend(_split_long(sentence, max_chars))
+        chunks.extend(_pack(sentences, max_chars, ' '))
+
+    # Merge neighbouring small paragraphs so we don't pay a request per paragraph
+    return _pack(chunks, max_chars, '\n\n')
+
+
+class _Assembler:
+    """Appends a job's chunk files to its output, in order, as they finish.
+
+    Stitching runs while later chunks are still downloading, so a host's
+    file is complete moments after its last chunk lands. An unsealed
+    assembler takes more chunks with add() until seal() is called.
+    """
+
+    def __init__(self, chunk_files, filename, sealed=True):
+        self.chunk_files = list(chunk_files)
+        self.filename = filename
+        self.partial = f"{filename}.part"
+        self.finished = [False] * len(chunk_files)
+        self.next_index = 0
+        self.sealed = sealed
+        self.lock = threading.Lock()
+        self.output = open(self.partial, 'wb')
+        if sealed and not chunk_files:
+            self._close()
+
+    def add(self, chunk_file):
+        """Append a chunk to the order; returns its index"""
+        with self.lock:
+            self.chunk_files.append(chunk_file)
+            self.finished.append(False)
+            return len(self.chunk_files) - 1
+
+    def seal(self):
+        """No more chunks will be added; finish once the last one lands"""
+        with self.lock:
+            self.sealed = True
+            self._flush()
+
+    def complete(self, index):
+        """Mark a chunk finished and append every chunk that is now in order"""
+        with self.lock:
+            self.finished[index] = True
+            self._flush()
+
+    def _flush(self):
+        if self.output is None:
+            return
+        while self.next_index < len(self.chunk_files) and self.finished[self.next_index]:
+            chunk_file = self.chunk_files[self.next_index]
+            self._append(chunk_file)
+            os.remove(chunk_file)
+            self.next_index += 1
+        if self.sealed and self.next_index == len(self.chunk_files) and self.output:
+            self._close()
+
+    def _append(self, chunk_file):
+        """Append a chunk's audio frames, leaving out its ID3 and Xing/Info headers"""
+        with open(chunk_file, 'rb') as chunk:
+            if os.fstat(chunk.fileno()).st_size == 0:
+                return
+            with mmap.mmap(chunk.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                frames = audio_range(data) or (0, len(data))
+                with memoryview(data) as view:
+                    self.output.write(view[frames[0]:frames[1]])
+
+    def _close(self):
+        self.output.close()
+        self.output = None
+        os.replace(self.partial, self.filename)
+
+    def abort(self):
+        """Drop the partial output after a failed render"""
+        with self.lock:
+            if self.output:
+                self.output.close()
+                self.output = None
+                os.remove(self.partial)
+
+
+class TTSEngine:
+    """Renders host scripts through ElevenLabs in parallel chunks.
+
+    Each chunk goes to whichever key in the generator's key pool has room,
+    preferring its host's own key.
+    """
+
+    def __init__(self, generator, max_chars=2500):
+        self.generator = generator
+        self.max_chars = max_chars
+
+    def plan(self, jobs):
+        """Clean and split each job's text into chunk tasks"""
+        tasks = []
+        for job_index, job in enumerate(jobs):
+            if 'cleaned_text' in job:
+                cleaned_text = job['cleaned_text']
+            else:
+                cleaned_text = self.generator.clean_text_for_audio(job['text'])
+            chunks = split_text(cleaned_text, self.max_chars)
+            base = os.path.splitext(job['filename'])[0]
+            job['chunks'] = []
+            for chunk_index, chunk in enumerate(chunks):
+                task = {
+                    'job': job_index,
+                    'index': chunk_index,
+                    'text': chunk,
+                    'previous_text': chunks[chunk_index - 1] if chunk_index > 0 else None,
+                    'next_text': chunks[chunk_index + 1] if chunk_index + 1 < len(chunks) else None,
+                    'voice_id': job['voice_id'],
+                    'api_key': job['api_key'],
+                    'filename': f"{base}_part{chunk_index:03d}.mp3",
+                }
+                job['chunks'].append(task['filename'])
+                tasks.append(task)
+        return tasks
+
+    def _synthesize(self, task, cancelled, assembler):
+        """Synthesize one chunk on a key from the pool"""
+        if cancelled.is_set():
+            raise RuntimeError("cancelled")
+        success = self.generator.synthesize_speech(
+            task['text'],
+            task['voice_id'],
+            None,
+            task['filename'],
+            previous_text=task['previous_text'],
+            next_text=task['next_text'],
+            api_key=task['api_key'],
+        )
+        if not success:
+            raise RuntimeError(f"failed to synthesize {task['filename']}")
+        assembler.complete(task['index'])
+        return task['filename']
+
+    def render(self, jobs):
+        """Render every job to its filename; returns True if all succeeded.
+
+        Each job is a dict with text (or cleaned_text), voice_id, api_key and
+        filename. All chunks for all jobs are queued at once; the key pool
+        keeps each ElevenLabs account within its concurrency and rate limits.
+        """
+        tasks = self.plan(jobs)
+        assemblers = [_Assembler(job['chunks'], job['filename']) for job in jobs]
+        workers = self.generator.key_pool.capacity()
+        print(f"🎵 Synthesizing {len(tasks)} chunks for {len(jobs)} hosts ({workers} at a time)...")
+
+        cancelled = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=workers)
+        futures = [pool.submit(self._synthesize, task, cancelled, assemblers[task['job']]) for task in tasks]
+        done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+
+        failed = [future for future in done if future.exception()]
+        if failed:
+            # Cancel the queued chunks and wait for the ones in flight, so none
+            # lands after its assembler and chunk files are gone
+            cancelled.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+            print(f"❌ Audio synthesis failed: {failed[0].exception()} ({len(pending)} cancelled)")
+            for assembler in assemblers:
+                assembler.abort()
+            self._remove_chunks(jobs)
+            return False
+        pool.shutdown()
+        return True
+
+    def stream(self, jobs, dedup=None):
+        """Start a TTSStream for jobs; see TTSStream"""
+        return TTSStream(self, jobs, dedup=dedup)
+
+    def _remove_chunks(self, jobs):
+        """Delete chunk files left behind by a failed render"""
+        for job in jobs:
+            for chunk_file in job.get('chunks', []):
+                try:
+                    os.remove(chunk_file)
+                except OSError:
+                    pass
+
+
+class TTSStream:
+    """Synthesizes host parts paragraph by paragraph while they are written.
+
+    Each job is one host's part: segments (the ids of its segments in
+    speaking order), voice_id, api_key and filename. Segment text comes in
+    through feed() as the model writes it and finish() when it's done. Each
+    finished paragraph of the segment a host is currently on is cleaned and
+    sent for synthesis straight away if a worker is free; while all are busy
+    paragraphs queue up and go out together (up to max_chars), so a slow
+    API gets fewer, larger requests. Text of a host's later segments waits
+    until the ones before it are finished, so sentences are deduplicated in
+    speaking order. dedup is shared by all hosts (exact repeats are dropped
+    per host without one).
+    """
+
+    def __init__(self, engine, jobs, dedup=None):
+        self.engine = engine
+        self.jobs = jobs
+        self.dedup = dedup
+        # Reentrant: a done callback can run in the thread that submitted it
+        self.lock = threading.RLock()
+        self.cancelled = threading.Event()
+        self.error = None
+        self.futures = []
+        self.in_flight = 0
+        self.hosts = []
+        self.segments = {}
+        for job_index, job in enumerate(jobs):
+            job['chunks'] = []
+            host = {
+                'job': job_index,
+                'position': 0,
+                'paragraphs': [],
+                'pending': [],
+                'seen': set(),
+                'previous_text': None,
+                'assembler': _Assembler([], job['filename'], sealed=False),
+            }
+            self.hosts.append(host)
+            for segment_id in job['segments']:
+                self.segments[segment_id] = {'host': host, 'text': '', 'sent': 0, 'done': False}
+        self.workers = engine.generator.key_pool.capacity()
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        print(f"🎵 Streaming {len(jobs)} hosts to ElevenLabs as the script is written ({self.workers} at a time)...")
+
+    def feed(self, segment_id, text):
+        """Add newly written text of a segment; raises once synthesis has failed"""
+        if self.cancelled.is_set():
+            raise RuntimeError(f"audio synthesis failed: {self.error}")
+        with self.lock:
+            segment = self.segments[segment_id]
+            segment['text'] += text
+            self._advance(segment['host'])
+            self._dispatch()
+
+    def finish(self, segment_id, text):
+        """Mark a segment written; text is all of it (what was fed is a prefix)"""
+        if self.cancelled.is_set():
+            return
+        with self.lock:
+            segment = self.segments[segment_id]
+            segment['text'] = text
+            segment['done'] = True
+            self._advance(segment['host'])
+            self._dispatch()
+
+    def _advance(self, host):
+        """Clean the finished paragraphs of the host's current segment, moving on
+        to the next segment each time one is done"""
+        segment_ids = self.jobs[host['job']]['segments']
+        while host['position'] < len(segment_ids):
+            segment = self.segments[segment_ids[host['position']]]
+            pending = segment['text'][segment['sent']:]
+            if segment['done']:
+                ready, segment['sent'] = pending, len(segment['text'])
+            else:
+                breaks = list(PARAGRAPH_BREAK.finditer(pending))
+                if not breaks:
+                    return
+                ready = pending[:breaks[-1].start()]
+                segment['sent'] += breaks[-1].end()
+            for paragraph in PARAGRAPH_BREAK.split(ready):
+                if self.engine.generator.tts_normalize:
+                    paragraph = normalize_for_speech(paragraph)
+                sentences = clean_sentences(paragraph, dedup=self.dedup, seen=host['seen'])
+                if sentences:
+                    cleaned_text = '. '.join(sentences) + '.'
+                    host['paragraphs'].append(cleaned_text)
+                    host['pending'].extend(split_text(cleaned_text, self.engine.max_chars))
+            if not segment['done']:
+                return
+            host['position'] += 1
+
+    def _dispatch(self):
+        """Submit queued text while workers are free, oldest host first"""
+        while self.in_flight < self.workers and not self.cancelled.is_set():
+            waiting = [host for host in self.hosts if host['pending']]
+            if not waiting:
+                break
+            pending = waiting[0]['pending']
+            text, taken = pending[0], 1
+            while taken < len(pending) and len(text) + 1 + len(pending[taken]) <= self.engine.max_chars:
+                text = f"{text} {pending[taken]}"
+                taken += 1
+            del pending[:taken]
+            self._submit(waiting[0], text)
+        for host in self.hosts:
+            finished = host['position'] == len(self.jobs[host['job']]['segments'])
+            if finished and not host['pending'] and not host['assembler'].sealed:
+                host['assembler'].seal()
+
+    def _submit(self, host, text):
+        job = self.jobs[host['job']]
+        filename = f"{os.path.splitext(job['filename'])[0]}_part{len(job['chunks']):03d}.mp3"
+        task = {
+            'job': host['job'],
+            'index': host['assembler'].add(filename),
+            'text': text,
+            'previous_text': host['previous_text'],
+            'next_text': None,
+            'voice_id': job['voice_id'],
+            'api_key': job['api_key'],
+            'filename': filename,
+        }
+        host['previous_text'] = text
+        job['chunks'].append(filename)
+        self.in_flight += 1
+        future = self.pool.submit(self.engine._synthesize, task, self.cancelled, host['assembler'])
+        self.futures.append(future)
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        with self.lock:
+            self.in_flight -= 1
+            if not future.cancelled() and future.exception() and not self.cancelled.is_set():
+                self.error = future.exception()
+                self.cancelled.set()
+            self._dispatch()
+
+    def cleaned_texts(self):
+        """Each job's cleaned text, as cleaned so far"""
+        with self.lock:
+            return [' '.join(host['paragraphs']) for host in self.hosts]
+
+    def join(self):
+        """Wait for every chunk; returns True if every part rendered in full.
+
+        Call once every segment is finished.
+        """
+        with self.lock:
+            unfinished = [job['filename'] for job, host in zip(self.jobs, self.hosts)
+                          if host['position'] < len(job['segments'])]
+        if unfinished:
+            self.abort(f"script unfinished for {', '.join(map(os.path.basename, unfinished))}")
+            return False
+        while True:
+            with self.lock:
+                futures = list(self.futures)
+                idle = not self.in_flight and not any(host['pending'] for host in self.hosts)
+            if idle or self.cancelled.is_set():
+                break
+            wait(futures, return_when=FIRST_EXCEPTION, timeout=1)
+        if self.cancelled.is_set():
+            self.abort(self.error)
+            return False
+        self.pool.shutdown()
+        return True
+
+    def abort(self, reason=None):
+        """Stop synthesis and remove partial output"""
+        self.cancelled.set()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        print(f"❌ Audio synthesis failed: {reason or self.error or 'cancelled'}")
+        for host in self.hosts:
+            host['assembler'].abort()
+        self.engine._remove_chunks(self.jobs)